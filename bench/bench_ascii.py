@@ -0,0 +1,80 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+#Copyright (C) 2010 Fabricio Silva
+
+"""
+Reading of the text exports of Davis (.txt with decimal commas, Tecplot
+.dat) of a 3D vector field of 1000x1000 vectors: read_davis_txt and
+read_davis_dat against the former routes (str.replace then np.fromstring,
+np.loadtxt), with the time and the peak of memory allocated.
+Usage: python bench_ascii.py [repeat]
+"""
+
+import os, sys, time, shutil, tempfile, tracemalloc
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import numpy as np
+import libim7 as im7
+
+nx = ny = 1000
+
+def write_exports(directory):
+    " Text exports of a random field, as written by Davis."
+    x, y = np.meshgrid(np.arange(nx)*.25-9., 9.-np.arange(ny)*.25)
+    values = np.column_stack([x.ravel(), y.ravel()] \
+        + [np.random.randn(nx*ny)*10 for ind in range(3)])
+    txt = os.path.join(directory, 'B00001.txt')
+    with open(txt, 'w') as f:
+        f.write('#DaVis 7.2.2 3D-vector 16 %d %d "" "[mm]" "" "[mm]" ' \
+            '"velocity" "m/s"\n' % (ny, nx))
+        np.savetxt(f, values, fmt='%g', delimiter='\t')
+    with open(txt, 'rb') as f:
+        data = f.read()
+    with open(txt, 'wb') as f:
+        f.write(data.replace(b'.', b','))
+    dat = os.path.join(directory, 'B00001.dat')
+    with open(dat, 'w') as f:
+        f.write('TITLE = "B00001"\nVARIABLES = "x", "y", "z", "Vx", "Vy", "Vz"\n')
+        f.write('ZONE T="Frame 0", I=%d, J=%d, K=1\n' % (nx, ny))
+        np.savetxt(f, np.insert(values, 2, 8., axis=1), fmt='%f', delimiter=' ')
+    return txt, dat
+
+def replace_fromstring(filename):
+    with open(filename, 'r') as f:
+        f.readline()
+        string = f.read()
+    string = string.replace(',', '.')
+    return np.fromstring(string, sep='\t').reshape((ny, nx, 5))
+
+def loadtxt(filename):
+    return np.loadtxt(filename, delimiter=' ', skiprows=3).reshape((ny, nx, 6))
+
+def measure(fun, repeat):
+    lTimes = []
+    for ind in range(repeat):
+        t0 = time.perf_counter()
+        fun()
+        lTimes.append(time.perf_counter()-t0)
+    tracemalloc.start()
+    fun()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return min(lTimes), peak
+
+if __name__=='__main__':
+    repeat = int(sys.argv[1]) if len(sys.argv)>1 else 3
+    directory = tempfile.mkdtemp()
+    try:
+        txt, dat = write_exports(directory)
+        ref = replace_fromstring(txt)
+        field, att = im7.read_davis_txt(txt)
+        assert np.array_equal(field.vx, ref[::-1,:,2].T)
+        for name, fun in (
+                ('txt: replace+fromstring', lambda: replace_fromstring(txt)),
+                ('txt: read_davis_txt', lambda: im7.read_davis_txt(txt)),
+                ('dat: np.loadtxt', lambda: loadtxt(dat)),
+                ('dat: read_davis_dat', lambda: im7.read_davis_dat(dat))):
+            t, peak = measure(fun, repeat)
+            print('%-26s %8.0f ms %8.1f MB peak' % (name, 1e3*t, peak/1e6))
+    finally:
+        shutil.rmtree(directory)
@@ -0,0 +1,258 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+#Copyright (C) 2010 Fabricio Silva
+
+"""
+Benchmark suite of the readers on synthetic files of every pack type (IMG,
+IMX, ZLIB, FIXED_12_0) and buffer format (WORD and FLOAT images, vector
+formats 1 to 5), written by writeim7. For each file, measured in a separate
+process: throughput of readim7 (MB/s of decoded data), latency of
+get_blocks and get_components, cost of scan_im7 (header and attributes),
+and peak RSS increase of a read with its components.
+Results are stored in a JSON file to be compared across versions.
+Usage:
+  python bench_suite.py [-s size] [-v vectors] [-a attributes] [-r repeat]
+                        [-k filter] [-o results.json]
+  python bench_suite.py --compare old.json new.json [-t threshold]
+"""
+
+import os, sys, json, time, shutil, logging, platform, tempfile, subprocess
+import argparse
+here = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.join(here, '..'))
+import numpy as np
+import ctypes as ct
+import libim7 as im7
+from bench_unpack12 import pack12, best_time
+
+# Blocks of the vector formats
+nblocks = {1:9, 2:2, 3:10, 4:3, 5:14}
+
+# Metrics stored: (key, label, format, True if lower is better)
+metrics = [('read_ms', 'read ms', '%9.2f', True),
+           ('read_mbs', 'MB/s', '%8.1f', False),
+           ('blocks_us', 'blocks us', '%9.1f', True),
+           ('components_ms', 'comp. ms', '%9.2f', True),
+           ('scan_ms', 'scan ms', '%8.3f', True),
+           ('rss_mb', 'RSS MB', '%7.1f', True)]
+
+def cases():
+    " Names (pack-format), pack types and buffer formats of the cases."
+    lCases = [('%s-word' % pack, pack, 'word') \
+        for pack in ('img', 'imx', 'zlib', 'fixed12')]
+    lCases += [('%s-float' % pack, pack, 'float') for pack in ('img', 'zlib')]
+    lCases += [('%s-vector%d' % (pack, fmt), pack, fmt) \
+        for fmt in sorted(nblocks) for pack in ('img', 'zlib')]
+    return lCases
+
+def attributes(n):
+    " n attributes similar to those of Davis."
+    return dict(('Attribute%04d' % ind, 'value %d: %s' % (ind, 'x'*(ind%40))) \
+        for ind in range(n))
+
+def synthetic(fmt, size, vectors):
+    " Array of the buffer format fmt with a smooth field and noise."
+    rng = np.random.RandomState(0)
+    if fmt=='word':
+        return rng.randint(0, 4096, (size, size)).astype(np.uint16)
+    elif fmt=='float':
+        return rng.standard_normal((size, size)).astype(np.float32)
+    y, x = np.mgrid[0:vectors, 0:vectors]/float(vectors)
+    blocks = np.empty((nblocks[fmt], vectors, vectors), dtype=np.float32)
+    blocks[:] = np.sin(2*np.pi*x)+.1*rng.standard_normal(blocks.shape)
+    if fmt in (1, 3, 5):
+        # Peak selected for each vector (choice)
+        blocks[0] = rng.randint(0, 6, (vectors, vectors))
+    return blocks
+
+def write_fixed12(filename, frame, att):
+    """
+    FIXED_12 packed file: header, packed data, and the attributes written by
+    writeim7 after the data of an uncompressed file.
+    """
+    im7.writeim7(filename, frame, att=att, pack='img')
+    with open(filename, 'rb') as f:
+        data = f.read()
+    header = im7.libim7.ImageHeader7.from_buffer_copy(data)
+    header.pack_type = im7.libim7.PackTypes['IM7_PACKTYPE_FIXED_12_0']
+    with open(filename, 'wb') as f:
+        f.write(ct.string_at(ct.addressof(header), ct.sizeof(header)))
+        f.write(pack12(frame))
+        f.write(data[ct.sizeof(header)+frame.nbytes:])
+
+def writeim7(filename, array, att, pack):
+    if pack=='fixed12':
+        return write_fixed12(filename, array, att)
+    fmt = None
+    if array.ndim==3:
+        fmt = [k for k, v in nblocks.items() if v==array.shape[0]][0]
+    im7.writeim7(filename, array, att=att, pack=pack, buffer_format=fmt,
+        vector_grid=16 if fmt else 1)
+
+def _status(key):
+    " Value in MB of the memory key of /proc/self/status (Linux)."
+    with open('/proc/self/status') as f:
+        for line in f:
+            if line.startswith(key+':'):
+                return int(line.split()[1])/1024.
+
+def peak_rss():
+    " Peak resident memory of the process, in MB."
+    if os.path.exists('/proc/self/status'):
+        return _status('VmHWM')
+    try:
+        import resource
+    except ImportError:
+        return float('nan')
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss/1048576. if sys.platform=='darwin' else rss/1024.
+
+def reset_peak_rss():
+    """
+    Reset the peak resident memory to the current one where possible
+    (Linux), and return the reference for the increase of the peak.
+    """
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+        return _status('VmRSS')
+    except (IOError, OSError):
+        return peak_rss()
+
+def measure(filename, repeat):
+    " Measures on filename (in a child process)."
+    res = {}
+    vector = im7.probe_im7(filename).header.buffer_format>0
+    rss = reset_peak_rss()
+    buf, att = im7.readim7(filename)
+    if vector:
+        buf.get_components()
+    res['rss_mb'] = peak_rss()-rss
+    nbytes = buf.get_array().nbytes
+    del buf
+    res['read_ms'] = 1e3*best_time(lambda: im7.readim7(filename), repeat)
+    res['read_mbs'] = nbytes/1e3/res['read_ms']
+    buf, att = im7.readim7(filename)
+
+    def blocks():
+        del buf.blocks
+        buf.get_blocks()
+    res['blocks_us'] = 1e6*best_time(blocks, repeat)
+    if vector:
+        lTimes = []
+        for ind in range(repeat):
+            buf, att = im7.readim7(filename)
+            t0 = time.perf_counter()
+            buf.get_components()
+            lTimes.append(time.perf_counter()-t0)
+        res['components_ms'] = 1e3*min(lTimes)
+    res['scan_ms'] = 1e3*best_time(lambda: im7.scan_im7(filename), repeat)
+    res['attributes'] = len(att)
+    res['file_mb'] = os.path.getsize(filename)/1e6
+    res['data_mb'] = nbytes/1e6
+    return res
+
+def revision():
+    " Description of the git revision of the sources, if known."
+    try:
+        return subprocess.check_output(['git', 'describe', '--always',
+            '--dirty'], cwd=here, stderr=subprocess.STDOUT).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def run(options):
+    import info
+    results = {'version':info.version, 'revision':revision(),
+        'date':time.strftime('%Y-%m-%d %H:%M:%S'),
+        'python':platform.python_version(), 'numpy':np.__version__,
+        'platform':platform.platform(), 'size':options.size,
+        'vectors':options.vectors, 'nattributes':options.attributes,
+        'repeat':options.repeat, 'cases':{}}
+    att = attributes(options.attributes)
+    directory = tempfile.mkdtemp()
+    print('%-14s %8s' % ('case', 'file MB') \
+        +''.join(' %*s' % (len(f % 0), l) for k, l, f, tmp in metrics))
+    try:
+        for name, pack, fmt in cases():
+            if options.filter and options.filter not in name:
+                continue
+            filename = os.path.join(directory, name \
+                +('.vc7' if isinstance(fmt, int) else '.im7'))
+            writeim7(filename, synthetic(fmt, options.size, options.vectors),
+                att, pack)
+            out = subprocess.check_output([sys.executable, __file__,
+                '--child', filename, '-r', str(options.repeat)])
+            res = results['cases'][name] = json.loads(out.decode())
+            os.remove(filename)
+            print('%-14s %8.2f' % (name, res['file_mb']) \
+                +''.join(' '+(f % res[k] if k in res else ' '*len(f % 0)) \
+                    for k, l, f, tmp in metrics))
+    finally:
+        shutil.rmtree(directory)
+    output = options.output or os.path.join(os.getcwd(),
+        'bench_suite-%s.json' % (results['revision'] or results['version']))
+    with open(output, 'w') as f:
+        json.dump(results, f, indent=1, sort_keys=True)
+    print('Results saved in %s' % output)
+
+def compare(old, new, threshold):
+    """
+    Print the ratios new/old of the metrics of the cases of the results
+    files old and new, flagging the changes for the worse by more than
+    threshold. Returns the number of such regressions.
+    """
+    with open(old) as f:
+        old = json.load(f)
+    with open(new) as f:
+        new = json.load(f)
+    print('%s (%s) -> %s (%s)' % (old['revision'], old['date'],
+        new['revision'], new['date']))
+    for key in ('size', 'vectors', 'nattributes'):
+        if old.get(key)!=new.get(key):
+            print('Warning: %s differs (%s, %s)' % (key, old.get(key), new.get(key)))
+    print('%-14s' % 'case'+''.join(' %10s' % l for k, l, f, tmp in metrics))
+    regressions = 0
+    for name in sorted(set(old['cases']) & set(new['cases'])):
+        line = '%-14s' % name
+        for key, label, fmt, lower in metrics:
+            a, b = old['cases'][name].get(key), new['cases'][name].get(key)
+            if not a or b is None:
+                line += ' %10s' % '-'
+                continue
+            ratio = b/a
+            worse = ratio>1+threshold if lower else ratio<1./(1+threshold)
+            # RSS measures below a page are noise
+            if worse and not (key=='rss_mb' and abs(b-a)<1.):
+                regressions += 1
+                line += ' %9.2f!' % ratio
+            else:
+                line += ' %9.2f ' % ratio
+        print(line)
+    print('%d regression(s) beyond %g%%' % (regressions, 100*threshold))
+    return regressions
+
+if __name__=='__main__':
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('-s', '--size', type=int, default=1024,
+        help='size of the images (pixels, multiple of 4)')
+    parser.add_argument('-v', '--vectors', type=int, default=256,
+        help='size of the vector fields (vectors)')
+    parser.add_argument('-a', '--attributes', type=int, default=200,
+        help='number of attributes of the files')
+    parser.add_argument('-r', '--repeat', type=int, default=5)
+    parser.add_argument('-k', '--filter', help='run the cases containing FILTER')
+    parser.add_argument('-o', '--output', help='results file')
+    parser.add_argument('-t', '--threshold', type=float, default=.1,
+        help='relative change reported as regression')
+    parser.add_argument('--compare', nargs=2, metavar=('OLD', 'NEW'))
+    parser.add_argument('--child', help=argparse.SUPPRESS)
+    options = parser.parse_args()
+    logging.disable(logging.WARNING)
+    if options.child:
+        print(json.dumps(measure(options.child, options.repeat)))
+    elif options.compare:
+        sys.exit(1 if compare(options.compare[0], options.compare[1],
+            options.threshold) else 0)
+    else:
+        run(options)
@@ -0,0 +1,142 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+#Copyright (C) 2010 Fabricio Silva
+
+"""
+Throughput of the FIXED_12 unpacking, for a 2048x2048 (4 Mpx) 12 bits frame:
+decoding of an IM7 file by the C library, and unpacking of data already in
+memory by numpy (unpack12), against the former decoding of the library
+reading the file by 3 words for every 4 pixels (compiled with the C compiler
+$CC or cc, skipped if not available).
+Usage: python bench_unpack12.py [repeat]
+"""
+
+import os, sys, time, shutil, logging, tempfile, subprocess
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import numpy as np
+import ctypes as ct
+import libim7 as im7
+
+nx = ny = 2048
+
+def pack12(frame):
+    " FIXED_12 packing of the rows of frame."
+    n4 = frame.shape[1]//4
+    p = [frame[:,ind::4].astype(np.uint16) for ind in range(4)]
+    words = np.empty((frame.shape[0], 3*n4), dtype='<u2')
+    words[:,0::3] = p[0] | (p[1] << 12)
+    words[:,1::3] = (p[1] >> 4) | (p[2] << 8)
+    words[:,2::3] = (p[2] >> 8) | (p[3] << 4)
+    return words.tobytes()
+
+def write_fixed12(filename, frame):
+    header = im7.libim7.ImageHeader7()
+    header.pack_type = im7.libim7.PackTypes['IM7_PACKTYPE_FIXED_12_0']
+    header.buffer_format = im7.libim7.Formats['FormatsWORD']
+    header.sizeX, header.sizeY = frame.shape[1], frame.shape[0]
+    header.sizeZ = header.sizeF = header.vector_grid = 1
+    with open(filename, 'wb') as f:
+        f.write(ct.string_at(ct.addressof(header), ct.sizeof(header)))
+        f.write(pack12(frame))
+
+# Former SCPackFixedBits_Read (12 bits): one fread of 3 words for 4 pixels
+word_by_word = r"""
+#include <stdio.h>
+typedef unsigned short Word;
+int read_fixed12(const char* theFileName, long theOffset, Word* dataPtr, int theSizeX, int theSizeY)
+{
+	Word array[16];
+	FILE* theFile = fopen(theFileName, "rb");
+	if (theFile==NULL)
+		return 1;
+	fseek(theFile, theOffset, SEEK_SET);
+	for (int row=0; row<theSizeY; row++)
+	{
+		int nx = theSizeX;
+		while (nx>0)
+		{
+			if (nx<4)
+			{	// last pixel of a row
+				fread( dataPtr, sizeof(Word), nx, theFile );
+				dataPtr += nx;
+				nx = 0;
+			}
+			else
+			{	// decompress next 4 pixel
+				fread( array, sizeof(Word), 3, theFile );
+				*dataPtr = (array[0] & 0x0FFF);
+				dataPtr++;
+				*dataPtr = (array[0] >> 12) | ((array[1] & 0x00FF) << 4);
+				dataPtr++;
+				*dataPtr = ((array[1] & 0xFF00) >> 8) | ((array[2] & 0x000F) << 8);
+				dataPtr++;
+				*dataPtr = (array[2] >> 4);
+				dataPtr++;
+				nx -= 4;
+			}
+		}
+	}
+	fclose(theFile);
+	return 0;
+}
+"""
+
+def build_word_by_word(directory):
+    " Former decoding compiled in directory, None if it can't be built."
+    source = os.path.join(directory, 'word_by_word.c')
+    library = os.path.join(directory, 'word_by_word.so')
+    with open(source, 'w') as f:
+        f.write(word_by_word)
+    try:
+        subprocess.check_output([os.environ.get('CC', 'cc'), '-O2', '-shared',
+            '-fPIC', '-o', library, source], stderr=subprocess.STDOUT)
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    fun = ct.CDLL(library).read_fixed12
+    fun.argtypes = [ct.c_char_p, ct.c_long, ct.c_void_p, ct.c_int, ct.c_int]
+    fun.restype = ct.c_int
+    return fun
+
+def best_time(fun, repeat):
+    lTimes = []
+    for ind in range(repeat):
+        t0 = time.perf_counter()
+        fun()
+        lTimes.append(time.perf_counter()-t0)
+    return min(lTimes)
+
+if __name__=='__main__':
+    repeat = int(sys.argv[1]) if len(sys.argv)>1 else 10
+    logging.disable(logging.WARNING) # no scales in the attributes
+    frame = np.random.randint(0, 4096, (ny, nx)).astype(np.uint16)
+    data = pack12(frame)
+    directory = tempfile.mkdtemp()
+    filename = os.path.join(directory, 'fixed12.im7')
+    try:
+        write_fixed12(filename, frame)
+        buf, att = im7.readim7(filename)
+        assert np.array_equal(buf.blocks[0], frame)
+        assert np.array_equal(im7.unpack12(data, nx), frame)
+        lCases = [('readim7 (C library)', lambda: im7.readim7(filename)),
+                  ('unpack12 (numpy)', lambda: im7.unpack12(data, nx))]
+        former = build_word_by_word(directory)
+        if former is None:
+            print('No C compiler: former word by word decoding not timed.')
+        else:
+            out = np.empty_like(frame)
+            path = filename.encode(sys.getfilesystemencoding())
+            offset = ct.sizeof(im7.libim7.ImageHeader7)
+            read = lambda: former(path, offset, out.ctypes.data, nx, ny)
+            read()
+            assert np.array_equal(out, frame)
+            lCases.insert(0, ('word by word (former)', read))
+        lTimes = []
+        for name, fun in lCases:
+            t = best_time(fun, repeat)
+            lTimes.append(t)
+            print('%-22s %8.2f ms %8.1f Mpx/s' % (name, 1e3*t, nx*ny/t/1e6))
+        if former is not None:
+            print('Speedup of readim7: %.1fx' % (lTimes[0]/lTimes[1]))
+    finally:
+        shutil.rmtree(directory)
@@ -4,4 +4,16 @@ Particle Image Velocimetry (PIV) image and vector fields files created
 by LaVision Davis software.
 """
 
-from .libim7 import readim7, Buffer
+from .libim7 import readim7, readim7_into, readim7_series, probe_im7, \
+    scan_im7, scan_many, iter_frames, read_frame, unpack12, writeim7, \
+    writeim7_many, read_preview, contact_sheet, Buffer, Attributes
+from .index import ArchiveIndex
+from .export import export_series
+from .statistics import FieldStatistics, field_statistics
+from .cache import BufferCache
+from .aio import areadim7, aiter_im7
+from .watch import DirectoryWatcher
+from .ascii import read_davis_txt, read_davis_dat
+from .instrument import stats, enable_stats, disable_stats, reset_stats
+from .validation import validate_vectors
+from .derived import DerivedFields, derived_fields
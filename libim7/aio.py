@@ -0,0 +1,87 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+#Copyright (C) 2010 Fabricio Silva
+
+"""
+Reading of Davis files from asyncio applications. Files are decoded by
+readim7 in an executor (threads: the C library releases the GIL while
+decoding), so that the event loop is not blocked.
+"""
+import asyncio, functools
+from collections import deque
+from .libim7 import readim7
+
+async def areadim7(filename, executor=None, **kwargs):
+    """
+    Read filename with readim7 (with keyword arguments kwargs) in executor,
+    the default executor of the event loop if None.
+    Returns the Buffer and the dictionary of attributes.
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(executor,
+        functools.partial(readim7, filename, **kwargs))
+
+async def _aiter(paths):
+    for path in paths:
+        yield path
+
+async def _next(source):
+    " Next item of the asynchronous iterator source, with False at its end."
+    try:
+        return True, await source.__anext__()
+    except StopAsyncIteration:
+        return False, None
+
+async def aiter_im7(paths, concurrency=4, executor=None, return_exceptions=False,
+                    **kwargs):
+    """
+    Asynchronous iterator of the (path, Buffer, attributes) of the files of
+    paths (an iterable or an asynchronous iterable, e.g. fed by file
+    notifications), in the order of paths. The files are read by readim7
+    (with keyword arguments kwargs) in executor, at most concurrency at a
+    time: the following files are only read as the results are consumed.
+    If return_exceptions is True, a file that can't be read gives
+    (path, exception, None) instead of raising the exception.
+    """
+    loop = asyncio.get_running_loop()
+    if hasattr(paths, '__aiter__'):
+        source = paths.__aiter__()
+    else:
+        source = _aiter(paths)
+    pending = deque()
+    next_path = None
+    exhausted = False
+    try:
+        while True:
+            if next_path is None and not exhausted and len(pending)<concurrency:
+                next_path = asyncio.ensure_future(_next(source))
+            waits = [el for el in (next_path, pending and pending[0][1]) if el]
+            if not waits:
+                break
+            # The next path may be long to come: yield the files read meanwhile
+            done, tmp = await asyncio.wait(waits,
+                return_when=asyncio.FIRST_COMPLETED)
+            if next_path in done:
+                ok, path = next_path.result()
+                next_path = None
+                if ok:
+                    pending.append((path, loop.run_in_executor(executor,
+                        functools.partial(readim7, path, **kwargs))))
+                else:
+                    exhausted = True
+                continue
+            path, future = pending.popleft()
+            try:
+                buf, att = future.result()
+            except Exception as err:
+                if not return_exceptions:
+                    raise
+                yield path, err, None
+            else:
+                yield path, buf, att
+    finally:
+        if next_path is not None:
+            next_path.cancel()
+        for path, future in pending:
+            future.cancel()
@@ -0,0 +1,150 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+#Copyright (C) 2010 Fabricio Silva
+
+"""
+Readers of the text exports of vector fields by Davis: .txt files (tab
+separated, with the decimal separator of the locale of Davis) and Tecplot
+.dat files. The data of a file is read by chunks of a few MB ending at the
+end of a line, each parsed by the library with the decimal separator of the
+file into the array of the values.
+"""
+import re, shlex, locale
+import ctypes as ct
+import numpy as np
+from .libim7 import mylib, ImErr
+
+class VectorField(object):
+    """
+    Vector field read from a text export, with the attributes of a Buffer
+    holding a vector field: positions x and y (increasing) and z, components
+    vx, vy and vz of shape (nx, ny), and vmag computed on access. The
+    components are views of the array of the values read. units holds the
+    units of the positions ('x', 'y') and of the components ('v').
+    """
+    def __init__(self, x, y, vx, vy, vz=None, z=0., units=None, vectorGrid=1):
+        self.x, self.y, self.z = x, y, z
+        self.vx, self.vy = vx, vy
+        if vz is None:
+            vz = np.broadcast_to(vx.dtype.type(0), vx.shape)
+        self.vz = vz
+        self.units = dict(units or {})
+        self.vectorGrid = vectorGrid
+
+    @property
+    def vmag(self):
+        return np.sqrt(self.vx*self.vx+self.vy*self.vy+self.vz*self.vz)
+
+def _decimal(decimal, line):
+    " Decimal separator: given, of the locale, or guessed from a data line."
+    if decimal=='locale':
+        return locale.localeconv()['decimal_point']
+    elif decimal is None:
+        return ',' if b',' in line and len(line.split())>1 else '.'
+    return decimal
+
+def _parse(f, shape, decimal, dtype, chunk=1<<22):
+    """
+    Values of the lines of f (from its current position) in an array of the
+    given shape (ny, nx, ncol), parsed by the library by chunks of about
+    chunk bytes ending at the end of a line.
+    """
+    nrows, ncol = shape[0]*shape[1], shape[2]
+    if len(decimal)!=1:
+        raise ValueError("Incorrect decimal separator %r." % decimal)
+    decimal = decimal.encode('latin-1')
+    name = getattr(f, 'name', 'file')
+    data = np.empty(nrows*ncol, dtype=np.float64)
+    address = data.ctypes.data
+    count, rest = 0, b''
+    parsed = ct.c_size_t(0)
+    while True:
+        block = f.read(chunk)
+        text = rest+block
+        size = text.rfind(b'\n')+1 if block else len(text)
+        err = mylib.ParseDecimalText(text, size, decimal, ncol,
+            ct.cast(address+data.itemsize*count, ct.POINTER(ct.c_double)),
+            data.size-count, ct.byref(parsed))
+        count += parsed.value
+        if err==ImErr['IMREAD_ERR_DATA']:
+            raise ValueError("Incorrect value in %s." % name)
+        elif err:
+            break
+        rest = text[size:]
+        if not block:
+            break
+    if count!=data.size or err:
+        raise ValueError("Error while reading data in %s." % name)
+    return data.astype(dtype, copy=False).reshape(shape)
+
+def _field(data, icol, units, z=0., vectorGrid=1):
+    """
+    VectorField of the values data (ny, nx, ncol), whose columns icol hold
+    x, y, vx, vy and vz (None if missing).
+    """
+    x = data[0,:,icol[0]]
+    y = data[:,0,icol[1]]
+    comp = [None if ind is None else data[:,:,ind].T for ind in icol[2:]]
+    if len(y)>1 and y[0]>y[-1]:
+        y = y[::-1]
+        comp = [None if el is None else el[:,::-1] for el in comp]
+    return VectorField(x, y, comp[0], comp[1], comp[2], z, units, vectorGrid)
+
+def read_davis_txt(filename, decimal=None, dtype=np.float64):
+    """
+    Read a vector field exported by Davis as text (.txt), whose decimal
+    separator is decimal: ',' or '.', 'locale' for that of the current
+    locale, or guessed from the first data line if None.
+    Returns the VectorField and the dictionary of the header information.
+    """
+    with open(filename, 'rb') as f:
+        header = f.readline().decode('latin-1')
+        tokens = shlex.split(header.lstrip('#'))
+        if len(tokens)<6 or not tokens[2].endswith('-vector'):
+            raise ValueError("Incorrect header in file %s." % filename)
+        ncomp = 3 if tokens[2].startswith('3D') else 2
+        grid, ny, nx = [int(el) for el in tokens[3:6]]
+        labels = tokens[6:12]+['']*(12-len(tokens))
+        att = {'version':tokens[1], 'type':tokens[2], 'header':header.strip()}
+        units = {'x':labels[1].strip('[]'), 'y':labels[3].strip('[]'),
+            'v':labels[5].strip('[]')}
+        start = f.tell()
+        first = f.readline()
+        f.seek(start)
+        data = _parse(f, (ny, nx, 2+ncomp), _decimal(decimal, first), dtype)
+    icol = [0, 1, 2, 3, 4 if ncomp==3 else None]
+    return _field(data, icol, units, vectorGrid=grid), att
+
+def read_davis_dat(filename, decimal='.', dtype=np.float64):
+    """
+    Read a vector field exported by Davis in the Tecplot format (.dat), with
+    the decimal separator decimal (see read_davis_txt).
+    Returns the VectorField and the dictionary of the header information
+    (TITLE, VARIABLES, ZONE).
+    """
+    with open(filename, 'rb') as f:
+        att = {}
+        while True:
+            start = f.tell()
+            first = f.readline()
+            line = first.decode('latin-1').strip()
+            if not first or re.match(r'[-+.\d]', line):
+                break
+            # e.g. TITLE = "B00001" or ZONE T="Frame 0", I=118, J=78
+            key, value = re.match(r'(\w*)\s*=?\s*(.*)', line).groups()
+            att[key.upper()] = value
+        variables = re.findall(r'"([^"]*)"', att.get('VARIABLES', ''))
+        size = dict((k.upper(), int(v)) for k, v in \
+            re.findall(r'\b([IJK])\s*=\s*(\d+)', att.get('ZONE', '')))
+        names = [el.lower() for el in variables]
+        if 'I' not in size or not set(('x', 'y', 'vx', 'vy')) <= set(names):
+            raise ValueError("Incorrect header in file %s." % filename)
+        f.seek(start)
+        data = _parse(f, (size.get('J', 1)*size.get('K', 1), size['I'],
+            len(names)), _decimal(decimal, first), dtype)
+    att['VARIABLES'] = variables
+    icol = [names.index(el) if el in names else None \
+        for el in ('x', 'y', 'vx', 'vy', 'vz')]
+    z = data[0,0,names.index('z')] if 'z' in names else 0.
+    return _field(data, icol, {}, z), att
@@ -0,0 +1,215 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+#Copyright (C) 2010 Fabricio Silva
+
+"""
+Cache of decoded files for interactive tools going back and forth between
+the frames of a series, bounded by the memory used by the buffers.
+"""
+import os, threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from .libim7 import readim7
+
+def _root(arr):
+    " Array owning the memory of the view arr."
+    while isinstance(arr.base, np.ndarray):
+        arr = arr.base
+    return arr
+
+def _nbytes(buf):
+    """
+    Memory used by the data of buf and the arrays computed from it, the
+    views (components, peak) counted once with the array they belong to and
+    the broadcast arrays (constant vz) not at all.
+    """
+    sizes = {}
+    for value in [buf.get_array()]+list(buf.__dict__.values()):
+        if not isinstance(value, np.ndarray) or 0 in value.strides:
+            continue
+        root = _root(value)
+        address = root.__array_interface__['data'][0]
+        sizes[address] = max(sizes.get(address, 0), root.nbytes)
+    return sum(sizes.values())
+
+def _stamp(path):
+    st = os.stat(path)
+    return (st.st_mtime, st.st_size)
+
+class BufferCache(object):
+    """
+    Least recently used cache of the (Buffer, attributes) read by readim7,
+    keyed by file name and checked against the modification time and size
+    of the file. Least recently used buffers are evicted and released (see
+    Buffer.delete) as soon as the buffers held use more than max_bytes,
+    except the last one returned by get: a buffer obtained from the cache
+    must not be used once evicted (copy the arrays to keep).
+    With prefetch>0, the prefetch files following the one requested in its
+    series are read in advance by a pool of workers threads.
+    """
+    def __init__(self, max_bytes=256<<20, prefetch=0, workers=1):
+        self.max_bytes = max_bytes
+        self.prefetch = prefetch
+        self._entries = OrderedDict()
+        self._pending = {}
+        self._current = None
+        self._closed = False
+        self._lock = threading.RLock()
+        self._executor = None
+        if prefetch>0:
+            self._executor = ThreadPoolExecutor(workers)
+        self.hits = self.misses = self.prefetched = self.evictions = 0
+        self.bytes = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, path):
+        return os.path.abspath(path) in self._entries
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def get(self, path, series=None):
+        """
+        The Buffer and attributes of file path, read if not cached. series
+        is the sorted list of files of the series of path, used for the
+        prefetching (by default, the files of the directory of path having
+        its extension).
+        """
+        path = os.path.abspath(path)
+        stamp = _stamp(path)
+        future = None
+        while True:
+            with self._lock:
+                entry = self._lookup(path, stamp)
+                if entry is not None or future is not None:
+                    break
+                future = self._pending.get(path)
+                if future is None:
+                    break
+            # Being prefetched: wait for it (read errors are raised below)
+            future.exception()
+        if entry is None:
+            result = readim7(path)
+            with self._lock:
+                self.misses += 1
+                self._current = path
+                entry = self._insert(path, stamp, result)
+        if self.prefetch>0:
+            self._prefetch(path, series)
+        return entry[1]
+
+    def _lookup(self, path, stamp):
+        entry = self._entries.get(path)
+        if entry is None:
+            return None
+        if entry[0]!=stamp:
+            # Modified since read
+            self._release(path)
+            return None
+        self.hits += 1
+        if entry[3]:
+            self.prefetched += 1
+            entry[3] = False
+        self._entries.move_to_end(path)
+        self._current = path
+        self._resize(path)
+        return entry
+
+    def _insert(self, path, stamp, result, prefetched=False):
+        entry = self._entries.get(path)
+        if entry is not None and entry[0]==stamp:
+            # Read meanwhile by another thread, which may use it: kept
+            result[0].delete()
+            self._entries.move_to_end(path)
+            return entry
+        elif entry is not None:
+            # Older version of the file
+            self._release(path)
+        entry = self._entries[path] = [stamp, result, 0, prefetched]
+        self._resize(path)
+        return entry
+
+    def _resize(self, path):
+        " Update the size of the entry path and evict entries if needed."
+        entry = self._entries[path]
+        size = _nbytes(entry[1][0])
+        self.bytes += size-entry[2]
+        entry[2] = size
+        while self.bytes>self.max_bytes:
+            for oldest in self._entries:
+                if oldest not in (path, self._current):
+                    break
+            else:
+                break
+            self._release(oldest)
+            self.evictions += 1
+        if self.bytes>self.max_bytes and entry[3] and path!=self._current:
+            # Prefetched file not fitting in
+            self._release(path)
+
+    def _release(self, path):
+        stamp, (buf, att), size, prefetched = self._entries.pop(path)
+        self.bytes -= size
+        buf.delete()
+
+    def _prefetch(self, path, series):
+        if series is None:
+            directory, name = os.path.split(path)
+            ext = os.path.splitext(name)[1].lower()
+            series = sorted(os.path.join(directory, el) for el in \
+                os.listdir(directory) if os.path.splitext(el)[1].lower()==ext)
+        else:
+            series = [os.path.abspath(el) for el in series]
+        try:
+            ind = series.index(path)
+        except ValueError:
+            return
+        with self._lock:
+            for tmp in series[ind+1:ind+1+self.prefetch]:
+                if tmp not in self._entries and tmp not in self._pending:
+                    self._pending[tmp] = self._executor.submit(self._read, tmp)
+
+    def _read(self, path):
+        try:
+            stamp = _stamp(path)
+            result = readim7(path)
+        except Exception:
+            with self._lock:
+                del self._pending[path]
+            raise
+        with self._lock:
+            del self._pending[path]
+            if self._closed:
+                result[0].delete()
+            elif path not in self._entries:
+                self._insert(path, stamp, result, prefetched=True)
+
+    def clear(self):
+        " Release all the buffers held."
+        with self._lock:
+            for path in list(self._entries):
+                self._release(path)
+
+    def close(self):
+        " Stop prefetching and release all the buffers held."
+        self._closed = True
+        if self._executor is not None:
+            self._executor.shutdown()
+        self.clear()
+
+    def stats(self):
+        """
+        Number of hits (of which served by the prefetching), misses and
+        evictions, and number of entries and bytes held.
+        """
+        with self._lock:
+            return {'hits':self.hits, 'misses':self.misses,
+                'prefetched':self.prefetched, 'evictions':self.evictions,
+                'entries':len(self._entries), 'bytes':self.bytes}
@@ -0,0 +1,209 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+#Copyright (C) 2010 Fabricio Silva
+
+"""
+Quantities derived from the in-plane velocity gradients of vector fields:
+vorticity, divergence, strain rate, Q and lambda2 criteria, swirling
+strength. The gradients are computed once per field (or stack of fields) and
+shared by all the quantities, on the orientation and positions of the
+components of Buffers (vectorGrid, signs of the scales), in physical units
+when the units of the scales are known.
+"""
+import numpy as np
+from .libim7 import Buffer
+
+# Lengths known in the units of the scales, in m
+_lengths = {'m':1., 'cm':1e-2, 'mm':1e-3, 'um':1e-6, u'\xb5m':1e-6,
+            'micron':1e-6, 'nm':1e-9}
+
+def _dudx(g):
+    return g[0][0]
+
+def _dudy(g):
+    return g[0][1]
+
+def _dvdx(g):
+    return g[1][0]
+
+def _dvdy(g):
+    return g[1][1]
+
+def _vorticity(g):
+    return g[1][0]-g[0][1]
+
+def _divergence(g):
+    return g[0][0]+g[1][1]
+
+def _shear_strain(g):
+    return (g[0][1]+g[1][0])/2
+
+def _strain_rate(g):
+    (ux, uy), (vx, vy) = g[0], g[1]
+    s = uy+vx
+    return np.sqrt(2*(ux*ux+vy*vy)+s*s)
+
+def _q(g):
+    (ux, uy), (vx, vy) = g[0], g[1]
+    return -(ux*ux+vy*vy)/2-uy*vx
+
+def _lambda2(g):
+    (ux, uy), (vx, vy) = g[0], g[1]
+    # S^2+Omega^2 = [[a, b], [b, c]], largest eigenvalue
+    s, w = (uy+vx)/2, (vx-uy)/2
+    w *= w
+    a = ux*ux+s*s-w
+    c = vy*vy+s*s-w
+    b = s*(ux+vy)
+    d = (a-c)/2
+    return (a+c)/2+np.sqrt(d*d+b*b)
+
+def _swirling_strength(g):
+    (ux, uy), (vx, vy) = g[0], g[1]
+    d = (ux-vy)/2
+    return np.sqrt(np.maximum(-(d*d+uy*vx), 0))
+
+# Quantities: function of the gradients, power of the unit of the gradients
+quantities = {'dudx':(_dudx, 1), 'dudy':(_dudy, 1),
+              'dvdx':(_dvdx, 1), 'dvdy':(_dvdy, 1),
+              'vorticity':(_vorticity, 1), 'divergence':(_divergence, 1),
+              'shear_strain':(_shear_strain, 1), 'strain_rate':(_strain_rate, 1),
+              'Q':(_q, 2), 'lambda2':(_lambda2, 2),
+              'swirling_strength':(_swirling_strength, 1)}
+
+def _decode(unit):
+    if isinstance(unit, bytes):
+        unit = unit.decode('latin-1')
+    return unit.strip().strip('[]').strip()
+
+def gradient_unit(scaleX, scaleI):
+    """
+    Factor converting the gradients of the components (scaleI) along the
+    positions (scaleX) to SI units, and the unit of the result: 1/s for
+    velocities, 1 for displacements, the ratio of the units of the scales
+    if unknown (factor 1).
+    """
+    length, comp = _decode(scaleX.unit), _decode(scaleI.unit)
+    if length in _lengths:
+        if comp.endswith('/s') and comp[:-2].strip() in _lengths:
+            return _lengths[comp[:-2].strip()]/_lengths[length], '1/s'
+        elif comp in _lengths:
+            return _lengths[comp]/_lengths[length], '1'
+    return 1., '%s/%s' % (comp or '1', length or 'pixel')
+
+def _spacing(positions):
+    " Step of the evenly spaced positions (1 if a single one)."
+    if len(positions)<2:
+        return 1.
+    return float(positions[-1]-positions[0])/(len(positions)-1)
+
+class DerivedFields(object):
+    """
+    Quantities derived from the velocity gradients of a field or a stack of
+    fields, computed on first access (as items or attributes, see
+    quantities) and kept, sharing the gradients of the components.
+    source is a Buffer, a sequence of Buffers of the same grid (a series),
+    or the array of the components (ncomp, nx, ny) or (ncomp, nt, nx, ny)
+    of which spacing gives the steps (dx, dy) of the positions.
+    components replaces the components of the Buffers, e.g. as returned by
+    validate_vectors. The computations are done in dtype. With SI=True,
+    the gradients of Buffers are converted to SI units (see units).
+    For the in-plane gradients of planar fields:
+      vorticity = dvy/dx-dvx/dy, divergence = dvx/dx+dvy/dy,
+      shear_strain = (dvx/dy+dvy/dx)/2, strain_rate = sqrt(2 S:S),
+      Q = (|Omega|^2-|S|^2)/2, lambda2 the largest eigenvalue of
+      S^2+Omega^2 (negative in vortices), swirling_strength the imaginary
+      part of the complex eigenvalues of the gradient tensor.
+    """
+    def __init__(self, source, spacing=None, components=None,
+                 dtype=np.float32, SI=True):
+        self.dtype = np.dtype(dtype)
+        self.factor, self.unit = 1., None
+        if isinstance(source, Buffer):
+            source = [source]
+            self.stack = False
+        elif len(source) and isinstance(source[0], Buffer):
+            self.stack = True
+        else:
+            if spacing is None:
+                raise ValueError("spacing of the positions is required for arrays.")
+            self._set_components(source)
+            self.spacing = tuple(float(el) for el in spacing)
+            self._cache = {}
+            return
+        buf = source[0]
+        self.spacing = (_spacing(buf.x), _spacing(buf.y))
+        for other in source[1:]:
+            if other.vx.shape!=buf.vx.shape or not np.allclose(
+              (_spacing(other.x), _spacing(other.y)), self.spacing):
+                raise ValueError("Buffers are not on the same grid.")
+        if SI:
+            self.factor, self.unit = gradient_unit(buf.scaleX, buf.scaleI)
+        if components is None:
+            components = np.stack([el.stack_components() for el in source],
+                axis=1)
+            if not self.stack:
+                components = components[:, 0]
+        self._set_components(components)
+        self._cache = {}
+
+    def _set_components(self, components):
+        comps = np.asarray(components)
+        if comps.ndim not in (3, 4) or comps.shape[0]<2:
+            raise ValueError("Components must be (ncomp, nx, ny) or (ncomp, nt, nx, ny).")
+        self.stack = comps.ndim==4
+        self.components = comps.astype(self.dtype, copy=False)
+
+    def gradient(self, ind):
+        """
+        Gradient (d/dx, d/dy) of the component ind (0 for vx, 1 for vy, 2
+        for vz), second order accurate inside and first order on the edges.
+        """
+        key = ('gradient', ind)
+        if key not in self._cache:
+            dx, dy = (self.dtype.type(el/self.factor) for el in self.spacing)
+            self._cache[key] = np.gradient(self.components[ind], dx, dy,
+                axis=(-2, -1))
+        return self._cache[key]
+
+    def gradients(self):
+        " In-plane gradient tensor ((dvx/dx, dvx/dy), (dvy/dx, dvy/dy))."
+        return (self.gradient(0), self.gradient(1))
+
+    def units(self, key):
+        " Unit of the quantity key (None for arrays)."
+        if self.unit is None:
+            return None
+        power = quantities[key][1]
+        if power==1 or self.unit=='1':
+            return self.unit
+        elif self.unit=='1/s':
+            return '1/s^%d' % power
+        return '(%s)^%d' % (self.unit, power)
+
+    def __getitem__(self, key):
+        if key not in quantities:
+            raise KeyError("Unknown quantity %s (%s)." % (key,
+                ', '.join(sorted(quantities))))
+        if key not in self._cache:
+            self._cache[key] = quantities[key][0](self.gradients())
+        return self._cache[key]
+
+    def __getattr__(self, key):
+        if key in quantities:
+            return self[key]
+        raise AttributeError("Does not have %s atribute" % key)
+
+    def clear(self):
+        " Forget the gradients and quantities computed."
+        self._cache.clear()
+
+def derived_fields(source, keys=('vorticity', 'divergence', 'Q'), **kwargs):
+    """
+    Dictionary of the quantities keys derived from the velocity gradients
+    of source (see DerivedFields for the arguments), of shape (nx, ny) or
+    (nt, nx, ny), computing the gradients once for all.
+    """
+    fields = DerivedFields(source, **kwargs)
+    return dict((key, fields[key]) for key in keys)
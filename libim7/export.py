@@ -0,0 +1,180 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+#Copyright (C) 2010 Fabricio Silva
+
+"""
+Export of a whole series of Davis files (e.g. the B%05d.VC7 files of a PIV
+run) to a single chunked and compressed HDF5 or Zarr store, so that the
+series can be sliced in time without reading the original files again.
+
+Vector fields are stored as datasets vx, vy, vz (and choice, peak when the
+format holds them) of shape (t, nx, ny), with the orientation of
+Buffer.vx; images as a dataset images of shape (t,)+Buffer.blocks.shape.
+The positions are stored as x and y, the attributes of the first file as
+attributes of the store, and those of every file as JSON strings in the
+dataset attributes.
+
+Files are read chunk_time at a time, so that memory use does not depend on
+the length of the series. A dataset done flags the frames written: an
+interrupted export is resumed by calling export_series again with the same
+files and store.
+"""
+import os, json
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from .libim7 import readim7, _ExtendedBlocks, _PeakBlock
+from .index import extensions, parse_time, _decode
+
+def _list_files(source):
+    " Sorted Davis files of a directory, or the given sequence of files."
+    if isinstance(source, str):
+        return [os.path.join(source, el) for el in sorted(os.listdir(source)) \
+            if os.path.splitext(el)[1].lower() in extensions]
+    return list(source)
+
+def _open_store(store, format, overwrite):
+    mode = 'w' if overwrite else 'a'
+    if format=='hdf5':
+        import h5py
+        return h5py.File(store, mode)
+    elif format=='zarr':
+        import zarr
+        return zarr.open_group(store, mode=mode)
+    raise ValueError("Unknown store format %s." % format)
+
+def _require(group, name, shape, dtype, chunks, compression):
+    " Dataset name of the store, created if missing."
+    if name in group:
+        arr = group[name]
+        if tuple(arr.shape)!=tuple(shape):
+            raise ValueError("Dataset %s of the store has shape %s, not %s." \
+                % (name, arr.shape, shape))
+        return arr
+    if hasattr(group, 'id'):
+        # HDF5 (h5py)
+        if dtype is str:
+            import h5py
+            dtype = h5py.string_dtype()
+        return group.create_dataset(name, shape=shape, dtype=dtype,
+            chunks=chunks, compression=compression or 'gzip', shuffle=True)
+    kwargs = {}
+    if compression is not None:
+        kwargs['compressors'] = compression
+    create = getattr(group, 'create_array', None) or group.create_dataset
+    return create(name, shape=shape, dtype=dtype, chunks=chunks, **kwargs)
+
+def _layout(buf, dtype):
+    " Name, shape of a frame and type of the datasets of the files like buf."
+    fmt = buf.header.buffer_format if buf.reader=='ReadIM7' else 0
+    if fmt<1 or fmt>5:
+        return [('images', buf.blocks.shape, buf.blocks.dtype)]
+    shape = buf.vx.shape
+    layout = [(key, shape, dtype) for key in ('vx', 'vy', 'vz')]
+    if fmt in _ExtendedBlocks:
+        layout.append(('choice', shape, np.int8))
+    if fmt in _PeakBlock:
+        layout.append(('peak', shape, dtype))
+    return layout
+
+def _frame(buf, name):
+    if name=='images':
+        return buf.blocks
+    elif name=='choice':
+        return buf._orient(buf._get_choice())
+    return getattr(buf, name)
+
+def _init_store(group, buf, att, files, layout, chunk_time, compression):
+    n = len(files)
+    for name, shape, dtype in layout:
+        _require(group, name, (n,)+shape, dtype, (chunk_time,)+shape,
+            compression)
+    for name, dtype in (('files', str), ('attributes', str),
+                        ('time', np.float64)):
+        _require(group, name, (n,), dtype, (chunk_time,), compression)
+    for name, scale in (('x', buf.scaleX), ('y', buf.scaleY)):
+        arr = np.asarray(getattr(buf, name), dtype=np.float64)
+        pos = _require(group, name, arr.shape, np.float64, arr.shape,
+            compression)
+        pos[...] = arr
+        group[name].attrs['unit'] = _decode(scale.unit)
+        group[name].attrs['description'] = _decode(scale.description)
+    for name, shape, dtype in layout:
+        if name!='choice':
+            group[name].attrs['unit'] = _decode(buf.scaleI.unit)
+    for key, value in att.items():
+        group.attrs[key] = _decode(value)
+    group['files'][...] = np.array([os.path.basename(el) for el in files],
+        dtype=object)
+    # Created last: a store holding done is complete but for the data
+    _require(group, 'done', (n,), np.uint8, (chunk_time,), compression)
+
+def export_series(source, store, format='hdf5', chunk_time=16, dtype=np.float32,
+                  compression=None, overwrite=False, workers=None):
+    """
+    Export the files of source (a directory or a sequence of files) sharing
+    the same size and format to the store (a file name for HDF5, a directory
+    or a zarr store for Zarr), chunked by chunk_time frames.
+    The components of vector fields are stored with type dtype.
+    compression is given to h5py (gzip by default) or as the compressors of
+    zarr (its default otherwise).
+    Files are decoded by a pool of workers threads. Frames already flagged as
+    done in the store are skipped, unless overwrite is True.
+    Returns the number of files read.
+    """
+    files = _list_files(source)
+    if not files:
+        raise ValueError("No file to export.")
+    chunk_time = max(1, min(chunk_time, len(files)))
+    names = [os.path.basename(el) for el in files]
+    group = _open_store(store, format, overwrite)
+    try:
+        if 'done' in group:
+            stored = [_decode(el) for el in group['files'][...]]
+            if stored!=names:
+                raise ValueError("Store %s holds another series." % store)
+            done = np.asarray(group['done'][...], dtype=bool)
+        else:
+            done = np.zeros(len(files), dtype=bool)
+        count = 0
+        with ThreadPoolExecutor(workers) as executor:
+            layout = None
+            for start in range(0, len(files), chunk_time):
+                stop = min(start+chunk_time, len(files))
+                if done[start:stop].all():
+                    continue
+                results = list(executor.map(readim7, files[start:stop]))
+                if layout is None:
+                    buf, att = results[0]
+                    layout = _layout(buf, dtype)
+                    if 'done' not in group:
+                        _init_store(group, buf, att, files, layout,
+                            chunk_time, compression)
+                slabs = dict((name, np.empty((stop-start,)+shape, dtype=dt)) \
+                    for name, shape, dt in layout)
+                slabs['time'] = np.empty(stop-start, dtype=np.float64)
+                slabs['attributes'] = np.empty(stop-start, dtype=object)
+                for ind, (buf, att) in enumerate(results):
+                    for name, shape, dt in layout:
+                        arr = _frame(buf, name)
+                        if arr.shape!=shape:
+                            raise ValueError("%s does not match the shape %s " \
+                                "of the series." % (files[start+ind], shape))
+                        slabs[name][ind] = arr
+                    att = dict((k, _decode(v)) for k, v in att.items())
+                    t = parse_time(att.get('_TIME'))
+                    slabs['time'][ind] = np.nan if t is None else t
+                    slabs['attributes'][ind] = json.dumps(att)
+                    buf.delete()
+                for name in slabs:
+                    group[name][start:stop] = slabs[name]
+                # Flagged once the data is written, for resuming
+                group['done'][start:stop] = 1
+                if hasattr(group, 'flush'):
+                    group.flush()
+                count += stop-start
+                del results, slabs
+        return count
+    finally:
+        if hasattr(group, 'close'):
+            group.close()
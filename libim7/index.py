@@ -0,0 +1,178 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+#Copyright (C) 2010 Fabricio Silva
+
+"""
+Persistent index of the headers, scales and attributes of the Davis files of
+a directory, stored in a SQLite sidecar file. Entries are keyed by file name,
+modification time and size, so that modified files are scanned again and
+removed files forgotten when the index is updated.
+"""
+import os, json, logging, sqlite3
+from concurrent.futures import ThreadPoolExecutor
+from .libim7 import scan_im7
+
+extensions = ('.im7', '.vc7', '.imx', '.img', '.vec')
+
+_columns = [('path', 'TEXT PRIMARY KEY'), ('mtime', 'REAL'), ('size', 'INTEGER'),
+    ('reader', 'TEXT'), ('pack_type', 'INTEGER'), ('image_type', 'INTEGER'),
+    ('buffer_format', 'INTEGER'),
+    ('is_float', 'INTEGER'), ('nx', 'INTEGER'), ('ny', 'INTEGER'),
+    ('nz', 'INTEGER'), ('nf', 'INTEGER'), ('vector_grid', 'INTEGER')]
+for el in 'xyi':
+    _columns += [('scale_%s_factor' % el, 'REAL'), ('scale_%s_offset' % el, 'REAL'),
+        ('scale_%s_unit' % el, 'TEXT'), ('scale_%s_description' % el, 'TEXT')]
+_columns += [('time', 'REAL'), ('date', 'TEXT'), ('attributes', 'TEXT')]
+_names = [el[0] for el in _columns]
+
+def _decode(value):
+    " Attribute values which are not ascii are stored decoded as latin-1."
+    if isinstance(value, bytes):
+        return value.decode('latin-1')
+    return value
+
+def parse_time(value):
+    """
+    Convert a _TIME attribute (e.g. '19:04:23.234') to seconds since
+    midnight, or None.
+    """
+    try:
+        h, m, sec = _decode(value).strip().split(':')
+        return 3600.*int(h) + 60.*int(m) + float(sec)
+    except (AttributeError, ValueError):
+        return None
+
+def _make_row(relpath, st, buf, att):
+    h = buf.header
+    row = [relpath, st.st_mtime, st.st_size, buf.reader,
+        # Pack type of IM7/VC7 files, image type (ImageTypes) of IMX files
+        h.pack_type if buf.reader=='ReadIM7' else None,
+        h.imagetype if buf.reader=='ReadIMX' else None,
+        buf.image_sub_type, buf.isFloat, buf.nx, buf.get_shape()[1],
+        buf.nz, buf.nf, buf.vectorGrid]
+    for el in 'XYI':
+        scale = getattr(buf, 'scale%s' % el)
+        row += [scale.factor, scale.offset, _decode(scale.unit),
+            _decode(scale.description)]
+    att = dict((k, _decode(v)) for k, v in att.items())
+    row += [parse_time(att.get('_TIME')), att.get('_DATE'), json.dumps(att)]
+    return row
+
+
+class ArchiveIndex(object):
+    """
+    Index of the Davis files of a directory, kept in the SQLite file
+    `filename` of that directory. The index is brought up to date when
+    created (unless update=False): only new or modified files are scanned.
+    The column pack_type holds the pack type (PackTypes) of the files read
+    by ReadIM7, image_type the image type (ImageTypes) of those read by
+    ReadIMX, the other being NULL.
+    """
+    def __init__(self, directory, filename='.libim7_index.sqlite',
+                 update=True, workers=None):
+        self.directory = os.path.abspath(directory)
+        self.filename = os.path.join(self.directory, filename)
+        self.db = sqlite3.connect(self.filename)
+        columns = [el[1] for el in self.db.execute('PRAGMA table_info(files)')]
+        if columns and columns!=_names:
+            # Index written by another version: built again
+            self.db.execute('DROP TABLE files')
+        self.db.execute('CREATE TABLE IF NOT EXISTS files (%s)' \
+            % ', '.join('%s %s' % el for el in _columns))
+        self.db.execute('CREATE INDEX IF NOT EXISTS files_time ON files (time)')
+        self.db.commit()
+        self.failed = []
+        if update:
+            self.update(workers)
+
+    def close(self):
+        self.db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def __len__(self):
+        return self.db.execute('SELECT COUNT(*) FROM files').fetchone()[0]
+
+    def update(self, workers=None):
+        """
+        Scan the files added or modified since the last update (using a pool
+        of workers threads), and forget the removed files. The files which
+        can't be scanned (e.g. truncated) are logged, left out of the index
+        and listed in the attribute failed, to be scanned again at the next
+        update.
+        Returns the list of the scanned files.
+        """
+        known = dict((el[0], el[1:]) for el in \
+            self.db.execute('SELECT path, mtime, size FROM files'))
+        stats = {}
+        for entry in os.listdir(self.directory):
+            if os.path.splitext(entry)[1].lower() not in extensions:
+                continue
+            st = os.stat(os.path.join(self.directory, entry))
+            stats[entry] = st
+        removed = [(el,) for el in known if el not in stats]
+        todo = sorted(el for el, st in stats.items() \
+            if known.get(el) != (st.st_mtime, st.st_size))
+        with ThreadPoolExecutor(workers) as executor:
+            results = list(executor.map(self._scan, todo))
+        self.failed = [el for el, res in zip(todo, results) if res is None]
+        scanned = [(el, res) for el, res in zip(todo, results) if res is not None]
+        rows = [_make_row(el, stats[el], buf, att) \
+            for el, (buf, att) in scanned]
+        removed += [(el,) for el in self.failed if el in known]
+        self.db.executemany('DELETE FROM files WHERE path=?', removed)
+        self.db.executemany('INSERT OR REPLACE INTO files VALUES (%s)' \
+            % ', '.join('?'*len(_names)), rows)
+        self.db.commit()
+        return [el for el, res in scanned]
+
+    def _scan(self, entry):
+        " scan_im7 of file entry of the directory, None if it fails."
+        path = os.path.join(self.directory, entry)
+        try:
+            return scan_im7(path)
+        except (IOError, OSError, ValueError, MemoryError) as err:
+            logging.warning("im7: can't scan %s: %s" % (path, err))
+            return None
+
+    def entry(self, path):
+        """
+        Indexed information of file path (relative to the directory) as a
+        dictionary, with the attributes as a dictionary.
+        """
+        row = self.db.execute('SELECT * FROM files WHERE path=?',
+            (os.path.basename(path),)).fetchone()
+        if row is None:
+            raise KeyError(path)
+        d = dict(zip(_names, row))
+        d['attributes'] = json.loads(d['attributes'])
+        return d
+
+    def query(self, buffer_format=None, time=None, where=None, params=()):
+        """
+        Sorted list of the full paths of the indexed files matching all the
+        given criteria: buffer_format (a value of Formats), time as a
+        (min, max) range of seconds since midnight (see parse_time), and
+        where, a SQL condition on the columns of the index using params.
+        """
+        cond, args = [], []
+        if buffer_format is not None:
+            cond.append('buffer_format=?')
+            args.append(buffer_format)
+        if time is not None:
+            cond.append('time BETWEEN ? AND ?')
+            args += list(time)
+        if where is not None:
+            cond.append('(%s)' % where)
+            args += list(params)
+        sql = 'SELECT path FROM files'
+        if cond:
+            sql += ' WHERE ' + ' AND '.join(cond)
+        sql += ' ORDER BY path'
+        return [os.path.join(self.directory, el[0]) \
+            for el in self.db.execute(sql, args)]
@@ -0,0 +1,75 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+#Copyright (C) 2010 Fabricio Silva
+
+"""
+Opt-in instrumentation of the read pipeline. When enabled, the stages of the
+reads (C library: 'open', 'data', 'inflate', 'attributes'; Python:
+'attribute_list', 'scales', 'readim7', 'get_components', and 'lazy.<name>'
+for the attributes of Buffer computed on access) record their time and
+counters, aggregated in the snapshot returned by stats and handed to the
+callbacks. When disabled, the only cost is a test of the flag enabled.
+"""
+import logging, threading
+
+enabled = False
+_callbacks = []
+_totals = {}
+_lock = threading.Lock()
+
+def enable_stats(callback=None):
+    """
+    Enable the instrumentation. callback, if given, is called for each
+    record with the stage name, the time spent (s) and the dictionary of
+    counters (e.g. bytes_read), in the thread of the read.
+    """
+    global enabled
+    if callback is not None and callback not in _callbacks:
+        _callbacks.append(callback)
+    enabled = True
+
+def disable_stats(callback=None):
+    """
+    Disable the instrumentation, or only remove callback if given. The
+    statistics gathered are kept (see reset_stats).
+    """
+    global enabled
+    if callback is not None:
+        if callback in _callbacks:
+            _callbacks.remove(callback)
+        return
+    enabled = False
+
+def reset_stats():
+    " Forget the statistics gathered."
+    with _lock:
+        _totals.clear()
+
+def stats():
+    """
+    Snapshot of the statistics: dictionary indexed by stage of dictionaries
+    of the number of records ('count'), the total and maximum time spent
+    ('seconds', 'max') and the totals of the counters.
+    """
+    with _lock:
+        return dict((stage, dict(value)) for stage, value in _totals.items())
+
+def record(stage, seconds, **counters):
+    " Add a record of stage (no-op if the instrumentation is disabled)."
+    if not enabled:
+        return
+    with _lock:
+        total = _totals.get(stage)
+        if total is None:
+            total = _totals[stage] = {'count':0, 'seconds':0., 'max':0.}
+        total['count'] += 1
+        total['seconds'] += seconds
+        total['max'] = max(total['max'], seconds)
+        for key, value in counters.items():
+            total[key] = total.get(key, 0)+value
+    for callback in list(_callbacks):
+        try:
+            callback(stage, seconds, counters)
+        except Exception:
+            logging.exception("im7: error in statistics callback")
@@ -9,10 +9,13 @@ Particle Image Velocimetry (PIV) image and vector fields files created
 by LaVision Davis software.
 It bases on ctypes to build an object-oriented interface to their C library.
 """
-import os, sys, logging
+import os, sys, time, logging, struct, zlib, shutil, tempfile
+from collections.abc import MutableMapping
+from concurrent.futures import ThreadPoolExecutor
 import numpy as np
 import ctypes as ct
 import numpy.ctypeslib as nct
+from . import instrument
 
 # Some magics to find the compiled library
 try:
@@ -32,7 +35,8 @@ byte = ct.c_ubyte
 ImErr = {
     'IMREAD_ERR_NO':0,     'IMREAD_ERR_FILEOPEN':1, \
     'IMREAD_ERR_HEADER':2, 'IMREAD_ERR_FORMAT':3, \
-    'IMREAD_ERR_DATA':4,   'IMREAD_ERR_MEMORY':5}
+    'IMREAD_ERR_DATA':4,   'IMREAD_ERR_MEMORY':5, \
+    'IMREAD_ERR_SIZE':6}
 
 # Code for the buffer format
 Formats = {
@@ -45,6 +49,38 @@ Formats = {
     'FormatsCOLOR':-10,   'FormatsRGB_MATRIX':-10, \
     'FormatsRGB_32':-11}
     
+# Code for the packing of the data in IM7 files (header.pack_type)
+PackTypes = {
+    'IM7_PACKTYPE_IMG':0,  'IM7_PACKTYPE_IMX':1, \
+    'IM7_PACKTYPE_ZLIB':2, 'IM7_PACKTYPE_FIXED_12_0':3}
+
+# Code for the image type in IMX files (header.imagetype)
+ImageTypes = {
+    'IMAGE_IMG':18,          'IMAGE_IMX':19, \
+    'IMAGE_FLOAT':20,        'IMAGE_SPARSE_WORD':21, \
+    'IMAGE_SPARSE_FLOAT':22, 'IMAGE_PACKED_WORD':23}
+
+# Blocks holding the velocity components of the extended vector formats,
+# indexed by the choice stored in block 0 (0: no vector, 1-4: correlation
+# peak, 5: post-processed vector)
+_ExtendedBlocks = {
+    Formats['FormatsVECTOR_2D_EXTENDED']: \
+        {'vx':(0, 1, 3, 5, 7, 7), 'vy':(0, 2, 4, 6, 8, 8)},
+    Formats['FormatsVECTOR_2D_EXTENDED_PEAK']: \
+        {'vx':(0, 1, 3, 5, 7, 7), 'vy':(0, 2, 4, 6, 8, 8)},
+    Formats['FormatsVECTOR_3D_EXTENDED_PEAK']: \
+        {'vx':(0, 1, 4, 7, 10, 10), 'vy':(0, 2, 5, 8, 11, 11), \
+         'vz':(0, 3, 6, 9, 12, 12)}}
+
+# Blocks holding the velocity components of the simple vector formats
+_SimpleBlocks = {
+    Formats['FormatsVECTOR_2D']: {'vx':0, 'vy':1},
+    Formats['FormatsVECTOR_3D']: {'vx':0, 'vy':1, 'vz':2}}
+# Block holding the peak ratio
+_PeakBlock = {
+    Formats['FormatsVECTOR_2D_EXTENDED_PEAK']: 9,
+    Formats['FormatsVECTOR_3D_EXTENDED_PEAK']: 13}
+    
 class BufferScale(ct.Structure):
     " Linear scaling tranform. "
     _fields_ = [("factor", ct.c_float),
@@ -178,6 +214,9 @@ class Buffer(ct.Structure):
         ("scaleX", BufferScale), \
         ("scaleY", BufferScale), \
         ("scaleI", BufferScale)]
+
+    # Type of the velocity components
+    components_dtype = np.float64
     
     def __repr__(self):
         tmp = object.__repr__(self)
@@ -235,39 +274,52 @@ class Buffer(ct.Structure):
     
     def get_array(self):
         """ 
-        Prepare data pointer to behave as a numpy array.
-        rem: Should become obsolete with nct.prep_pointer.
+        Data as a (totalLines, nx) numpy array, without copy.
         """
-        try:
-            self.array.__array_interface__
-            return np.array(self.array, copy=False)
-        except AttributeError:
-            pass
-            
+        if '_memory' in self.__dict__:
+            # Decoded into a numpy array (see readim7_into)
+            return self._memory.reshape((self.totalLines, self.nx))
+        # Memory allocated by the C library
         if self.isFloat==1:
             arr = self.floatArray
         else:
             arr = self.wordArray
-        # Constructing array interface
-        arr.__array_interface__ = {'version': 3, \
-            'shape':(self.totalLines, self.nx), \
-            'data': (ct.addressof(arr.contents), False),\
-            'typestr' : nct._dtype(type(arr.contents)).str}
-        return np.array(arr, copy=False)
+        return nct.as_array(arr, (self.totalLines, self.nx))
+
+    def get_dtype(self):
+        " Type of the data, known from the header."
+        if self.isFloat==1:
+            return np.dtype(np.float32)
+        return np.dtype(np.uint16)
 
     def __getattr__(self, key):
-        if key=='header':
+        if not instrument.enabled or key.startswith('__'):
+            return self._lazy(key)
+        start = time.perf_counter()
+        value = self._lazy(key)
+        instrument.record('lazy.%s' % key, time.perf_counter()-start)
+        return value
+
+    def _lazy(self, key):
+        " Attributes computed on first access."
+        if key in ('header', 'reader'):
             self.read_header()
-            return self.header
+            return self.__dict__[key]
         elif key=='blocks':
             self.get_blocks()
             return self.blocks
         elif key in ('x', 'y', 'z'):
             self.get_positions()
             return self.__dict__[key]
-        elif key in ('vx', 'vy', 'vz', 'vmag'):
-            self.get_components()
+        elif key in ('vx', 'vy', 'vz', 'vmag', 'peak'):
+            self.__dict__[key] = self.get_component(key)
             return self.__dict__[key]
+        elif key=='components':
+            return self.stack_components()
+        elif key=='derived':
+            from .derived import DerivedFields
+            self.derived = DerivedFields(self)
+            return self.derived
         else:
             raise AttributeError("Does not have %s atribute" % key)
     
@@ -278,22 +330,37 @@ class Buffer(ct.Structure):
             self.y = self.y[::-1]
         self.z = 0
         
-    def get_blocks(self):
-        " Transforms the concatenated blocks into arrays."
+    def is_uncompressed(self):
+        " True if the data is stored as is in the file, just after the header."
         h = self.header
-        arr = self.get_array()
-        if (self.reader is "ReadIMX") \
+        if self.reader=="ReadIMX":
+            return h.imagetype in (ImageTypes['IMAGE_IMG'], ImageTypes['IMAGE_FLOAT'])
+        return h.pack_type==PackTypes['IM7_PACKTYPE_IMG'] \
+            and h.buffer_format!=Formats['FormatsMEMPACKWORD']
+
+    def get_shape(self):
+        " Shape of the blocks array, known from the header."
+        h = self.header
+        if (self.reader=="ReadIMX") \
           or (h.buffer_format==Formats['FormatsIMAGE']):
-            self.blocks = arr.reshape((self.nf, self.ny, self.nx))
+            return (self.nf, self.ny, self.nx)
         elif h.buffer_format>=1 and h.buffer_format<=5:
             nblocks = (9, 2, 10, 3, 14)
             nblocks = nblocks[h.buffer_format-1]
-            self.blocks = arr.reshape((nblocks, -1, self.nx))
+            return (nblocks, self.totalLines//nblocks, self.nx)
+        else:
+            return (self.nf*self.nz, self.ny, self.nx)
+
+    def get_blocks(self):
+        " Transforms the concatenated blocks into arrays."
+        h = self.header
+        arr = self.get_array()
+        self.blocks = arr.reshape(self.get_shape())
+        if (self.reader!="ReadIMX") \
+          and h.buffer_format>=1 and h.buffer_format<=5:
             self.ny = self.blocks.shape[1]
             if hasattr(self, 'x'): del self.x
             if hasattr(self, 'y'): del self.y
-        else:
-            self.blocks = arr.reshape((self.nf*self.nz, self.ny, self.nx))
         #else:
         #    raise TypeError(u"Can't get blocks from this buffer format.")
     
@@ -307,97 +374,122 @@ class Buffer(ct.Structure):
         else:
             raise ValueError('Buffer has no more than %d frames.' % self.nf)
     
-    def get_components(self):
+    def get_component(self, key):
         """
-        Extract the velocity components from the various blocks stored in
-        Davis files according to values in the header.
+        Compute a single velocity component ('vx', 'vy', 'vz', 'vmag') or the
+        peak ratio ('peak') of the vector field, with the orientation of the
+        positions x and y. Components have the components_dtype type.
+        The vz component of 2D formats is a read-only constant array using
+        no memory.
+        peak is oriented as the components, (nx, ny) with y reversed if
+        scaleY.factor<=0 (see _orient), no longer with the (ny, nx)
+        indexing of the blocks: use peak[:, ::-1].T (or peak.T if
+        scaleY.factor>0) for the former layout.
         """
-        h = self.header
-        b = self.blocks
-        ## TODO: check if there is still some magic behind choice.
-        choice = np.array(b[0,:,:], dtype=int)
-        if h.buffer_format==Formats['FormatsVECTOR_2D']:
-            vx = b[0,:,:]
-            vy = b[1,:,:]
-            vz = np.zeros_like(vx)
-        elif h.buffer_format==Formats['FormatsVECTOR_2D_EXTENDED']:
-            vx = np.zeros(choice.shape, dtype=float)
-            vy = np.zeros(choice.shape, dtype=float)
-            vz = np.zeros(choice.shape, dtype=float)
-            vx[choice==1] = b[1,:,:][choice==1]
-            vx[choice==2] = b[3,:,:][choice==2]
-            vx[choice==3] = b[5,:,:][choice==3]
-            vx[choice==4] = b[7,:,:][choice==4]
-            vx[choice==5] = b[7,:,:][choice==5] # post-processed
-            vy[choice==1] = b[2,:,:][choice==1]
-            vy[choice==2] = b[4,:,:][choice==2]
-            vy[choice==3] = b[6,:,:][choice==3]
-            vy[choice==4] = b[8,:,:][choice==4]
-            vy[choice==5] = b[8,:,:][choice==5] # post-processed
-        elif  h.buffer_format==Formats['FormatsVECTOR_2D_EXTENDED_PEAK']:
-            vx = np.zeros(choice.shape, dtype=float)
-            vy = np.zeros(choice.shape, dtype=float)
-            vz = np.zeros(choice.shape, dtype=float)
-            vx[choice==1] = b[1,:,:][choice==1]
-            vx[choice==2] = b[3,:,:][choice==2]
-            vx[choice==3] = b[5,:,:][choice==3]
-            vx[choice==4] = b[7,:,:][choice==4]
-            vx[choice==5] = b[7,:,:][choice==5] # post-processed
-            vy[choice==1] = b[2,:,:][choice==1]
-            vy[choice==2] = b[4,:,:][choice==2]
-            vy[choice==3] = b[6,:,:][choice==3]
-            vy[choice==4] = b[8,:,:][choice==4]
-            vy[choice==5] = b[8,:,:][choice==5] # post-processed
-            self.peak = b[9,:,:]
-        elif h.buffer_format==Formats['FormatsVECTOR_3D']:
-            vx = b[0,:,:]
-            vy = b[1,:,:]
-            vz = b[2,:,:]
-        elif  h.buffer_format==Formats['FormatsVECTOR_3D_EXTENDED_PEAK']:
-            vx = np.zeros(choice.shape, dtype=float)
-            vy = np.zeros(choice.shape, dtype=float)
-            vz = np.zeros(choice.shape, dtype=float)
-            vx[choice==1] = b[1,:,:][choice==1]
-            vx[choice==2] = b[4,:,:][choice==2]
-            vx[choice==3] = b[7,:,:][choice==3]
-            vx[choice==4] = b[10,:,:][choice==4]
-            vx[choice==5] = b[10,:,:][choice==5] # post-processed
-            vy[choice==1] = b[2,:,:][choice==1]
-            vy[choice==2] = b[5,:,:][choice==2]
-            vy[choice==3] = b[8,:,:][choice==3]
-            vy[choice==4] = b[11,:,:][choice==4]
-            vy[choice==5] = b[11,:,:][choice==5] # post-processed
-            vz[choice==1] = b[3,:,:][choice==1]
-            vz[choice==2] = b[6,:,:][choice==2]
-            vz[choice==3] = b[9,:,:][choice==3]
-            vz[choice==4] = b[12,:,:][choice==4]
-            vz[choice==5] = b[12,:,:][choice==5] # post-processed
-            self.peak = b[13,:,:]
+        fmt = self.header.buffer_format
+        dtype = np.dtype(self.components_dtype)
+        if key=='vmag':
+            vx, vy = self.vx, self.vy
+            vz = self.vz if self._is_3d() else self.vz[0,0]
+            return np.sqrt(vx*vx+vy*vy+vz*vz)
+        elif key=='vz' and (fmt in _ExtendedBlocks or fmt in _SimpleBlocks) \
+          and not self._is_3d():
+            # No out-of-plane component: constant vz (the intensity offset)
+            return np.broadcast_to(dtype.type(self.scaleI.offset),
+                self.blocks.shape[:0:-1])
+        elif key=='peak':
+            if fmt not in _PeakBlock:
+                raise TypeError("Object has no peak ratio.")
+            return self._orient(self.blocks[_PeakBlock[fmt],:,:])
+        elif fmt in _ExtendedBlocks:
+            table = _ExtendedBlocks[fmt].get(key, None)
+            if table is None:
+                arr = np.zeros(self.blocks.shape[1:], dtype=dtype)
+            else:
+                # Gather the blocks selected by choice in a single pass
+                choice = self._get_choice()
+                idx = np.asarray(table, dtype=np.intp)[choice]
+                arr = np.take_along_axis(self.blocks, idx[np.newaxis], 0)[0]
+                arr = arr.astype(dtype, copy=False)
+                arr[choice==0] = 0
+        elif fmt in _SimpleBlocks:
+            table = _SimpleBlocks[fmt]
+            if key in table:
+                arr = np.array(self.blocks[table[key],:,:], dtype=dtype)
+            else:
+                arr = np.zeros(self.blocks.shape[1:], dtype=dtype)
         else:
             raise TypeError("Object does not have a vector field format.")
-        
-        # Davis indexing (y,x) => tranpose
-        vx, vy, vz = vx.T, vy.T, vz.T
-        
+
         # Davis conception of reversed y-axis
-        if self.scaleY.factor>0:
-            sl = [slice(None), slice(None)]
-        else:
+        if key=='vy' and self.scaleY.factor<=0:
             logging.info("im7: inverting axes y and z.")
-            sl = [slice(None), slice(None,None, -1)]
-            vy *= -1
-            #vz *= -1
-            
-        self.vx = self.scaleI(vx, 1.)[sl]
-        self.vy = self.scaleI(vy, 1.)[sl]
-        self.vz = self.scaleI(vz, 1.)[sl]
-        self.vmag = np.sqrt(self.vx**2+self.vy**2+self.vz**2)
+            arr *= -1
+        # Intensity scale, in place
+        arr *= dtype.type(self.scaleI.factor)
+        arr += dtype.type(self.scaleI.offset)
+        return self._orient(arr)
+
+    def _is_3d(self):
+        " True if the vector format holds the vz component."
+        fmt = self.header.buffer_format
+        return 'vz' in _ExtendedBlocks.get(fmt, _SimpleBlocks.get(fmt, {}))
+
+    def stack_components(self):
+        """
+        Velocity components in a single (ncomp, nx, ny) array (vx, vy and,
+        for 3D formats, vz), of which vx, vy and vz become views.
+        """
+        if 'components' not in self.__dict__:
+            keys = ('vx', 'vy', 'vz') if self._is_3d() else ('vx', 'vy')
+            shape = self.blocks.shape[:0:-1]
+            stack = np.empty((len(keys),)+shape, dtype=self.components_dtype)
+            for ind, key in enumerate(keys):
+                stack[ind] = self.get_component(key)
+                self.__dict__[key] = stack[ind]
+            self.components = stack
+        return self.components
+
+    def _get_choice(self):
+        " Index of the peak selected for each vector (0 for no vector)."
+        if '_choice' not in self.__dict__:
+            choice = self.blocks[0,:,:].astype(np.intp)
+            choice[(choice<0) | (choice>5)] = 0
+            self._choice = choice
+        return self._choice
+
+    def _orient(self, arr):
+        " Davis indexing (y,x) => transpose, and y-axis reversed if needed."
+        arr = arr.T
+        if self.scaleY.factor<=0:
+            arr = arr[:, ::-1]
+        return arr
+
+    def get_components(self):
+        """
+        Extract the velocity components from the various blocks stored in
+        Davis files according to values in the header, in a single array (see
+        stack_components). vmag is computed when accessed.
+        """
+        start = time.perf_counter() if instrument.enabled else None
+        self.stack_components()
+        if not self._is_3d():
+            self.vz = self.get_component('vz')
+        if self.header.buffer_format in _PeakBlock:
+            self.peak = self.get_component('peak')
+        if start is not None:
+            instrument.record('get_components', time.perf_counter()-start)
     
     def delete(self):
-        for key in ('x','y','z','vx','vy','vz','vmag','blocks'):
-            if hasattr(self, key):
+        for key in ('x','y','z','vx','vy','vz','vmag','peak','components',
+                    '_choice','blocks','derived'):
+            if key in self.__dict__:
                 setattr(self, key, None)
-        mylib.DestroyBuffer(ct.byref(self))
+        if '_memory' in self.__dict__:
+            # Memory is owned by numpy, not by the C library
+            self._memory = None
+        else:
+            mylib.DestroyBuffer(ct.byref(self))
     
     def filter(self, fun=None, arrays=[]):
         """
@@ -427,26 +519,139 @@ AttributeNode._fields_ = [ \
     ("value", ct.c_char_p), \
     ("next", ct.POINTER(AttributeNode))]
 
-def AttributeNodes2AttributeList(att0, delete=False):
-    att = att0[0]
-    d = {}
-    logging.debug("In AttributeNodes2AttributeList")
-    while att is not None and att.name is not None:
-        logging.debug(len(d), att.name, att.value)
+class IM7Stats(ct.Structure):
+    " Time spent (s) and bytes handled by the stages of a read (C library)."
+    _fields_ = [("t_open", ct.c_double), ("t_data", ct.c_double), \
+        ("t_inflate", ct.c_double), ("t_attributes", ct.c_double), \
+        ("bytes_read", ct.c_size_t), ("bytes_packed", ct.c_size_t), \
+        ("bytes_decoded", ct.c_size_t), ("nattributes", ct.c_int)]
+
+    def record(self):
+        " Add the stages of the read to the statistics (see instrument)."
+        instrument.record('open', self.t_open)
+        instrument.record('data', self.t_data, bytes_read=self.bytes_read,
+            bytes_decoded=self.bytes_decoded)
+        if self.bytes_packed:
+            instrument.record('inflate', self.t_inflate,
+                bytes_packed=self.bytes_packed)
+        instrument.record('attributes', self.t_attributes,
+            attributes=self.nattributes)
+
+def _parse_attribute(key, value):
+    """
+    Value of the attribute key: (factor, offset, unit, description) for the
+    _SCALE_ attributes, a number or a tuple of numbers if value holds
+    numbers, value otherwise.
+    """
+    if isinstance(value, bytes):
+        return value
+    if key.startswith('_SCALE_'):
+        lines = value.split('\n')+['', '']
+        factor, offset = lines[0].split()[:2]
+        return (float(factor), float(offset), lines[1].strip(), lines[2].strip())
+    numbers = []
+    for el in value.split():
         try:
-            value = att.value.decode('ascii')
-        except UnicodeDecodeError:
-            value = att.value
-        d[att.name.decode('ascii')] = value
-        att = att.next[0]
+            numbers.append(int(el))
+        except ValueError:
+            try:
+                numbers.append(float(el))
+            except ValueError:
+                return value
+    if len(numbers)==1:
+        return numbers[0]
+    return tuple(numbers) if numbers else value
+
+class Attributes(MutableMapping):
+    """
+    Dictionary of the attributes of a file, in the order of the attribute
+    list of the C library. Values read are strings, or bytes when not ascii
+    (converted on access). The value method gives them parsed (numbers,
+    tuples of numbers, scales as tuples) on first access.
+    """
+    def __init__(self, items=()):
+        self._raw = {}
+        self._set = set()
+        self._parsed = {}
+        self.update(items)
+
+    @classmethod
+    def from_bytes(cls, data):
+        " Attributes of the name\\0value\\0 pairs of data, read from a file."
+        parts = data.decode('latin-1').split('\0')
+        self = cls()
+        self._raw = dict(zip(parts[0:-1:2], parts[1::2]))
+        return self
+
+    def __getitem__(self, key):
+        value = self._raw[key]
+        if key not in self._set and not value.isascii():
+            return value.encode('latin-1')
+        return value
+
+    def __setitem__(self, key, value):
+        self._raw[key] = value
+        self._set.add(key)
+        self._parsed.pop(key, None)
+
+    def __delitem__(self, key):
+        del self._raw[key]
+        self._set.discard(key)
+        self._parsed.pop(key, None)
+
+    def __iter__(self):
+        return iter(self._raw)
+
+    def __len__(self):
+        return len(self._raw)
+
+    def __contains__(self, key):
+        return key in self._raw
+
+    def __repr__(self):
+        return 'Attributes(%r)' % dict(self.items())
+
+    def copy(self):
+        return Attributes(self.items())
+
+    def value(self, key, default=None):
+        " Parsed value of the attribute key (default if missing)."
+        if key not in self._parsed:
+            if key not in self._raw:
+                return default
+            self._parsed[key] = _parse_attribute(key, self[key])
+        return self._parsed[key]
+
+def AttributeNodes2AttributeList(att0, delete=False, names=None):
+    """
+    Attributes of the attribute list att0 (released if delete is True),
+    transferred at once by the C library. names restricts them to the
+    given names (a final * matching any suffix), and to the _SCALE_
+    attributes.
+    """
+    start = time.perf_counter() if instrument.enabled else None
+    filt = None
+    if names is not None:
+        filt = b''.join(_encode(el)+b'\0' for el in list(names)+['_SCALE_*'])+b'\0'
+    size = mylib.SerializeAttributeList(att0, filt, None, 0)
+    data = ct.create_string_buffer(size)
+    mylib.SerializeAttributeList(att0, filt, data, size)
     if delete:
-        mylib.DestroyAttributeList(ct.byref(ct.pointer(att0)))
-    return d
+        mylib.DestroyAttributeList(ct.byref(att0))
+    att = Attributes.from_bytes(data.raw)
+    if start is not None:
+        instrument.record('attribute_list', time.perf_counter()-start,
+            attributes=len(att))
+    return att
 
 def imread_errcheck(retval, func, args):
-    arg0 = ct.string_at(args[0])
-    if func.__name__!="ReadIM7":
+    if func.__name__ not in ("ReadIM7", "ReadIM7Into", "ReadIM7Stats",
+                             "ProbeIM7", "ScanIM7", "WriteIM7Attr"):
         raise ValueError("Wrong function passed: %s." % func.__name__)
+    _check_imread(retval, ct.string_at(args[0]))
+
+def _check_imread(retval, arg0):
+    " Raise the exception corresponding to the error code of file arg0."
     if retval==ImErr['IMREAD_ERR_FILEOPEN']:
         raise IOError("Can't open file %s." % arg0)
     elif retval==ImErr['IMREAD_ERR_HEADER']:
@@ -457,6 +662,8 @@ def imread_errcheck(retval, func, args):
         raise ValueError("Error while reading data in %s." % arg0)
     elif retval==ImErr['IMREAD_ERR_MEMORY']:
         raise MemoryError("Out of memory while reading %s." % arg0)
+    elif retval==ImErr['IMREAD_ERR_SIZE']:
+        raise ValueError("Destination array does not match the size of %s." % arg0)
     else:
         pass
 
@@ -469,27 +676,728 @@ mylib.ReadIM7.argtypes = [ct.c_char_p, ct.POINTER(Buffer), \
 mylib.ReadIM7.restype = ct.c_int
 mylib.ReadIM7.errcheck = imread_errcheck
 
+mylib.ReadIM7Into.argtypes = [ct.c_char_p, ct.POINTER(Buffer), \
+    ct.POINTER(ct.POINTER(AttributeNode)), ct.c_void_p, ct.c_size_t]
+mylib.ReadIM7Into.restype = ct.c_int
+mylib.ReadIM7Into.errcheck = imread_errcheck
+
+mylib.ReadIM7Stats.argtypes = [ct.c_char_p, ct.POINTER(Buffer), \
+    ct.POINTER(ct.POINTER(AttributeNode)), ct.c_void_p, ct.c_size_t, \
+    ct.POINTER(IM7Stats)]
+mylib.ReadIM7Stats.restype = ct.c_int
+mylib.ReadIM7Stats.errcheck = imread_errcheck
+
+mylib.ProbeIM7.argtypes = [ct.c_char_p, ct.POINTER(Buffer)]
+mylib.ProbeIM7.restype = ct.c_int
+mylib.ProbeIM7.errcheck = imread_errcheck
+
+mylib.ScanIM7.argtypes = [ct.c_char_p, ct.POINTER(Buffer), \
+    ct.POINTER(ct.POINTER(AttributeNode))]
+mylib.ScanIM7.restype = ct.c_int
+mylib.ScanIM7.errcheck = imread_errcheck
+
+mylib.ProbeIM7Header.argtypes = [ct.POINTER(ImageHeader7), ct.POINTER(Buffer)]
+mylib.ProbeIM7Header.restype = ct.c_int
+
+mylib.ParseImgAttributes.argtypes = [ct.c_char_p, ct.c_size_t, \
+    ct.POINTER(ct.POINTER(AttributeNode))]
+mylib.ParseImgAttributes.restype = ct.c_int
+
+mylib.SerializeAttributeList.argtypes = [ct.POINTER(AttributeNode), \
+    ct.c_char_p, ct.c_char_p, ct.c_size_t]
+mylib.SerializeAttributeList.restype = ct.c_size_t
+
+mylib.ParseDecimalText.argtypes = [ct.c_char_p, ct.c_size_t, ct.c_char, \
+    ct.c_int, ct.POINTER(ct.c_double), ct.c_size_t, ct.POINTER(ct.c_size_t)]
+mylib.ParseDecimalText.restype = ct.c_int
+
+mylib.WriteIM7Attr.argtypes = [ct.c_char_p, ct.c_int, ct.c_int, \
+    ct.POINTER(Buffer), ct.POINTER(AttributeNode)]
+mylib.WriteIM7Attr.restype = ct.c_int
+mylib.WriteIM7Attr.errcheck = imread_errcheck
+
 mylib.DestroyBuffer.argtypes = [ct.POINTER(Buffer),]
 mylib.DestroyBuffer.restype = None
 mylib.DestroyAttributeList.argtypes = [ct.POINTER(ct.POINTER(AttributeNode)),]
 mylib.DestroyAttributeList.restype = None
 
-def readim7(filename, scale_warn= False):
+def _set_scales(mybuffer, att):
+    start = time.perf_counter() if instrument.enabled else None
+    if mybuffer.reader=='ReadIMX':
+        mybuffer.set_scales_from_header()
+    else:
+        mybuffer.set_scales_from_attributelist(att)
+    if start is not None:
+        instrument.record('scales', time.perf_counter()-start)
+
+def readim7(filename, scale_warn= False, mmap=False, roi=None, step=None,
+            frames=None, dtype=None, attributes=None):
+    """
+    Read a Davis file (IM7, VC7, IMX, IMG, VEC), given by its name or as a
+    file-like object (see readim7_into).
+    With mmap=True, the data of uncompressed files is not read but memory
+    mapped (read-only), so that it is loaded from disk only when accessed.
+    Packed files are decoded in any case.
+    A part of the data may be read: the columns x0:x1:sx and rows y0:y1:sy
+    of the blocks with roi=(x0, x1, y0, y1) (None for the bounds) and
+    step=(sx, sy) (or a single step for both), and the frames given as an
+    index, a slice or a sequence of indices (images only). Uncompressed and
+    FIXED_12 packed data of the other rows is not read, zlib packed data is
+    inflated a few rows at a time keeping only the selected samples, IMX
+    packed data is decoded at once. The scales and the _SCALE_ attributes
+    give the positions of the selected columns and rows.
+    dtype sets the type of the velocity components (e.g. np.float32 or
+    np.float16, see Buffer.components_dtype).
+    attributes restricts the attributes returned to the given names (a
+    final * matching any suffix) and the _SCALE_ attributes, the others
+    being dropped by the C library.
+    Returns the Buffer and the Attributes.
+    """
+    start = time.perf_counter() if instrument.enabled else None
+    if roi is not None or step is not None or frames is not None:
+        mybuffer, att = _readim7_selection(filename, roi, step, frames,
+            attributes)
+    elif mmap and not hasattr(filename, 'read') \
+      and probe_im7(filename).is_uncompressed():
+        mybuffer, att = scan_im7(filename, attributes)
+        mybuffer._memory = np.memmap(filename, mode='r', \
+            dtype=mybuffer.get_dtype().newbyteorder('<'), \
+            offset=ct.sizeof(ImageHeader7), shape=mybuffer.get_shape())
+        mybuffer.get_blocks()
+    else:
+        mybuffer, att = readim7_into(filename, attributes=attributes)
+    if dtype is not None:
+        mybuffer.components_dtype = np.dtype(dtype)
+    if start is not None:
+        instrument.record('readim7', time.perf_counter()-start)
+    return mybuffer, att
+
+def probe_im7(filename):
+    """
+    Read only the header of a file. Returns a Buffer holding no data, but
+    describing the size, type and format of the file: its get_shape and
+    get_dtype methods give the array needed by readim7_into.
+    """
+    mybuffer = Buffer()
+    mylib.ProbeIM7(ct.c_char_p(filename.encode(sys.getfilesystemencoding())),
+                   ct.byref(mybuffer))
+    mybuffer.file = filename
+    return mybuffer
+
+def scan_im7(filename, attributes=None):
+    """
+    Read the header and the attributes of a file, skipping its data: zlib
+    packed data is jumped over thanks to its stored length, uncompressed
+    data thanks to its computed size (IMX packed data still has to be
+    decoded). Meant to build catalogues of large archives.
+    Returns a Buffer holding no data (as probe_im7) but with its scales set,
+    and the Attributes (restricted to attributes, see readim7).
+    """
     mybuffer = Buffer()
     att_pp = ct.pointer(AttributeNode())
-    mylib.ReadIM7(ct.c_char_p(filename.encode(sys.getfilesystemencoding())),
+    mylib.ScanIM7(ct.c_char_p(filename.encode(sys.getfilesystemencoding())),
                   ct.byref(mybuffer), ct.byref(att_pp))
+    att = AttributeNodes2AttributeList(att_pp, delete=True, names=attributes)
+    mybuffer.file = filename
+    _set_scales(mybuffer, att)
+    return mybuffer, att
+
+def scan_many(paths, workers=None, attributes=None):
+    """
+    Apply scan_im7 to many files using a pool of workers threads.
+    Returns the list of (Buffer, attributes) in the order of paths.
+    """
+    with ThreadPoolExecutor(workers) as executor:
+        return list(executor.map(lambda path: scan_im7(path, attributes), paths))
+
+def readim7_into(filename, out=None, attributes=None):
+    """
+    Decode file directly into the numpy array out, which must be
+    C-contiguous and have the size and type of the data (see probe_im7).
+    A new array is allocated if out is not given. The returned Buffer uses
+    this array as memory, so that no copy is made and the memory is
+    released by numpy when no longer referenced.
+    filename may also be a file-like object opened in binary mode (e.g. an
+    io.BytesIO or a member of a zip archive), read sequentially.
+    attributes restricts the attributes returned (see readim7).
+    Returns the Buffer and the Attributes.
+    """
+    if hasattr(filename, 'read'):
+        return _readim7_fileobj(filename, out, attributes=attributes)
+    # Checked against the header before decoding anything into out
+    probe = probe_im7(filename)
+    if out is None:
+        out = np.empty(probe.get_shape(), dtype=probe.get_dtype())
+    if not out.flags.c_contiguous:
+        raise ValueError("Destination array must be C-contiguous.")
+    if out.dtype != probe.get_dtype():
+        raise ValueError("Destination array has type %s, incompatible with %s." \
+            % (out.dtype, filename))
+    if out.size != probe.totalLines*probe.nx:
+        raise ValueError("Destination array does not match the size of %s." % filename)
+    mybuffer = Buffer()
+    att_pp = ct.pointer(AttributeNode())
+    if instrument.enabled:
+        stats = IM7Stats()
+        mylib.ReadIM7Stats(ct.c_char_p(filename.encode(sys.getfilesystemencoding())),
+                           ct.byref(mybuffer), ct.byref(att_pp),
+                           out.ctypes.data_as(ct.c_void_p), out.nbytes,
+                           ct.byref(stats))
+        stats.record()
+    else:
+        mylib.ReadIM7Into(ct.c_char_p(filename.encode(sys.getfilesystemencoding())),
+                          ct.byref(mybuffer), ct.byref(att_pp),
+                          out.ctypes.data_as(ct.c_void_p), out.nbytes)
+    att = AttributeNodes2AttributeList(att_pp, delete=True, names=attributes)
     mybuffer.file = filename
+    mybuffer._memory = out
     mybuffer.get_blocks()
-            
-    att = AttributeNodes2AttributeList(att_pp)
-    if mybuffer.reader is 'ReadIMX':
-        mybuffer.set_scales_from_header()
+    _set_scales(mybuffer, att)
+    return mybuffer, att
+
+def unpack12(data, nx):
+    """
+    Unpack FIXED_12 packed data (12 bits pixels, as stored in IM7 files),
+    given as bytes or as an array of words, into a (nrows, nx) uint16 array.
+    Each group of 4 pixels of a row is stored in 3 words, the remaining
+    pixels of a row as plain words.
+    """
+    if isinstance(data, np.ndarray):
+        words = data.astype('<u2', copy=False)
     else:
-        mybuffer.set_scales_from_attributelist(att)
-        
+        words = np.frombuffer(data, dtype='<u2')
+    n4 = nx//4
+    words = words.reshape((-1, 3*n4+nx%4))
+    a, b, c = words[:,0:3*n4:3], words[:,1:3*n4:3], words[:,2:3*n4:3]
+    out = np.empty((words.shape[0], nx), dtype=np.uint16)
+    out[:,0:4*n4:4] = a & 0x0FFF
+    out[:,1:4*n4:4] = (a >> 12) | ((b & 0x00FF) << 4)
+    out[:,2:4*n4:4] = (b >> 8) | ((c & 0x000F) << 8)
+    out[:,3:4*n4:4] = c >> 4
+    out[:,4*n4:] = words[:,3*n4:]
+    return out
+
+def _readim7_fileobj(f, out=None, chunk_size=1<<16, attributes=None):
+    """
+    Read IM7 and VC7 files from the file-like object f. Zlib packed data is
+    inflated while being read through a window of chunk_size bytes. Files
+    with IMX packed data or read by ReadIMX are copied to a temporary file.
+    """
+    name = getattr(f, 'name', '<%s>' % type(f).__name__)
+    data = f.read(ct.sizeof(ImageHeader7))
+    if len(data)<ct.sizeof(ImageHeader7):
+        raise ValueError("Incorrect header in file %s." % name)
+    header = ImageHeader7.from_buffer_copy(data)
+    if header.version in ImageTypes.values() \
+      or header.pack_type==PackTypes['IM7_PACKTYPE_IMX']:
+        fd, tmp = tempfile.mkstemp()
+        try:
+            with os.fdopen(fd, 'wb') as g:
+                g.write(data)
+                shutil.copyfileobj(f, g)
+            mybuffer, att = readim7_into(tmp, out, attributes)
+            mybuffer.read_header()
+        finally:
+            os.remove(tmp)
+        mybuffer.file = name
+        return mybuffer, att
+
+    mybuffer = Buffer()
+    _check_imread(mylib.ProbeIM7Header(ct.byref(header), ct.byref(mybuffer)), name)
+    mybuffer.file = name
+    mybuffer.header = header
+    mybuffer.reader = 'ReadIM7'
+    if out is None:
+        out = np.empty(mybuffer.get_shape(), dtype=mybuffer.get_dtype())
+    if not out.flags.c_contiguous:
+        raise ValueError("Destination array must be C-contiguous.")
+    if out.dtype != mybuffer.get_dtype():
+        raise ValueError("Destination array has type %s, incompatible with %s." \
+            % (out.dtype, name))
+    if out.size != mybuffer.totalLines*mybuffer.nx:
+        raise ValueError("Destination array does not match the size of %s." % name)
+
+    dest = memoryview(out.reshape(-1).view(np.uint8))
+    if header.pack_type==PackTypes['IM7_PACKTYPE_IMG']:
+        if header.buffer_format==Formats['FormatsMEMPACKWORD']:
+            data = f.read(out.size)
+            if len(data)<out.size:
+                raise ValueError("Error while reading data in %s." % name)
+            out.reshape(-1)[:] = np.frombuffer(data, dtype=np.uint8)
+        else:
+            pos = 0
+            while pos<len(dest):
+                data = f.read(min(chunk_size, len(dest)-pos))
+                if not data:
+                    raise ValueError("Error while reading data in %s." % name)
+                dest[pos:pos+len(data)] = data
+                pos += len(data)
+    elif header.pack_type==PackTypes['IM7_PACKTYPE_ZLIB']:
+        remaining, = struct.unpack('<i', f.read(4))
+        stream = zlib.decompressobj()
+        pos, pending = 0, b''
+        while not stream.eof:
+            if not pending:
+                pending = f.read(min(chunk_size, max(remaining, 0)))
+                if not pending:
+                    raise ValueError("Error while reading data in %s." % name)
+                remaining -= len(pending)
+            data = stream.decompress(pending, len(dest)-pos+1)
+            pending = stream.unconsumed_tail
+            if pos+len(data)>len(dest):
+                raise ValueError("Packed data of %s exceeds the %d bytes of the data." \
+                    % (name, len(dest)))
+            dest[pos:pos+len(data)] = data
+            pos += len(data)
+        if pos<len(dest):
+            raise IOError("Packed data of %s ends after %d of %d bytes." \
+                % (name, pos, len(dest)))
+        # skip what remains of the packed data
+        while remaining>0:
+            data = f.read(min(chunk_size, remaining))
+            if not data:
+                break
+            remaining -= len(data)
+    elif header.pack_type==PackTypes['IM7_PACKTYPE_FIXED_12_0']:
+        nwords = (mybuffer.nx//4)*3 + mybuffer.nx%4
+        data = f.read(2*nwords*mybuffer.totalLines)
+        if len(data)<2*nwords*mybuffer.totalLines:
+            raise ValueError("Error while reading data in %s." % name)
+        out.reshape((mybuffer.totalLines, mybuffer.nx))[:] = unpack12(data, mybuffer.nx)
+    else:
+        raise IOError("Incorrect format in file %s." % name)
+
+    data = f.read()
+    att_pp = ct.pointer(AttributeNode())
+    if mylib.ParseImgAttributes(data, len(data), ct.byref(att_pp))!=0:
+        mylib.DestroyAttributeList(ct.byref(att_pp))
+        raise ValueError("Error while reading attributes in %s." % name)
+    att = AttributeNodes2AttributeList(att_pp, delete=True, names=attributes)
+    mybuffer._memory = out
+    mybuffer.get_blocks()
+    _set_scales(mybuffer, att)
     return mybuffer, att
 
+def readim7_series(paths, workers=None):
+    """
+    Read a series of files sharing the same size and format (e.g. the
+    B%05d.VC7 files of a PIV run) into one array of shape
+    (nfiles,)+blocks.shape. Files are decoded concurrently by a pool of
+    workers threads, directly into their slice of the array.
+    Returns the stack, the list of (scaleX, scaleY, scaleI) and the list of
+    attribute dictionaries of the files.
+    """
+    paths = list(paths)
+    first = probe_im7(paths[0])
+    stack = np.empty((len(paths),)+first.get_shape(), dtype=first.get_dtype())
+    scales = [None]*len(paths)
+    atts = [None]*len(paths)
+
+    def work(ind):
+        buf, att = readim7_into(paths[ind], stack[ind])
+        scales[ind] = (buf.scaleX, buf.scaleY, buf.scaleI)
+        atts[ind] = att
+    with ThreadPoolExecutor(workers) as executor:
+        for tmp in executor.map(work, range(len(paths))):
+            pass
+    return stack, scales, atts
+
+def _probe_frames(filename):
+    buf = probe_im7(filename)
+    h = buf.header
+    if buf.reader=='ReadIM7' and h.buffer_format>=1 and h.buffer_format<=5:
+        raise TypeError('%s holds vector fields, not images.' % filename)
+    return buf
+
+def _inflate(f, name, sizes, chunk_size=1<<16):
+    """
+    Generator inflating the zlib packed data of file f (positioned at the
+    length of the packed data) in pieces of the given sizes, reading through
+    a window of chunk_size bytes.
+    """
+    remaining, = struct.unpack('<i', f.read(4))
+    stream = zlib.decompressobj()
+    pending = b''
+    for size in sizes:
+        data = bytearray()
+        while len(data)<size:
+            if not pending:
+                pending = f.read(min(chunk_size, max(remaining, 0)))
+                if not pending:
+                    raise ValueError("Error while reading data in %s." % name)
+                remaining -= len(pending)
+            data += stream.decompress(pending, size-len(data))
+            pending = stream.unconsumed_tail
+        yield data
+
+def _read_frames(buf, start=0, chunk_size=1<<16):
+    " Generator of the frames of probed buffer buf, from index start."
+    nframes, ny, nx = buf.get_shape()
+    dtype = buf.get_dtype().newbyteorder('<')
+    offset = ct.sizeof(ImageHeader7)
+    pack = buf.header.pack_type if buf.reader=='ReadIM7' else None
+    if buf.is_uncompressed() or pack==PackTypes['IM7_PACKTYPE_FIXED_12_0']:
+        if buf.is_uncompressed():
+            count = ny*nx
+        else:
+            dtype = np.dtype('<u2')
+            count = ny*((nx//4)*3+nx%4)
+        with open(buf.file, 'rb') as f:
+            f.seek(offset+start*count*dtype.itemsize)
+            for ind in range(start, nframes):
+                arr = np.fromfile(f, dtype=dtype, count=count)
+                if arr.size<count:
+                    raise ValueError("Error while reading data in %s." % buf.file)
+                if count==ny*nx:
+                    yield arr.reshape((ny, nx))
+                else:
+                    yield unpack12(arr, nx)
+    elif pack==PackTypes['IM7_PACKTYPE_ZLIB']:
+        size = ny*nx*dtype.itemsize
+        with open(buf.file, 'rb') as f:
+            f.seek(offset)
+            # Inflate no more than one frame at a time
+            frames = _inflate(f, buf.file, [size]*nframes, chunk_size)
+            for ind, frame in enumerate(frames):
+                if ind>=start:
+                    yield np.frombuffer(frame, dtype=dtype).reshape((ny, nx))
+    else:
+        # IMX packed data can only be decoded at once
+        mybuffer, att = readim7(buf.file)
+        for ind in range(start, nframes):
+            yield mybuffer.blocks[ind]
+
+def iter_frames(filename):
+    """
+    Iterate over the frames of an image file, as (ny, nx) arrays, reading a
+    single frame at a time: uncompressed and FIXED_12 packed data is read
+    frame by frame, zlib packed data is inflated incrementally so that about
+    one frame is held in memory. IMX packed data is decoded at once.
+    """
+    return _read_frames(_probe_frames(filename))
+
+def read_frame(filename, idx=0):
+    """
+    Read the specified frame (index starting from 0) of an image file,
+    seeking to it when the data is uncompressed or FIXED_12 packed.
+    """
+    buf = _probe_frames(filename)
+    nframes = buf.get_shape()[0]
+    if idx<0 or idx>=nframes:
+        raise ValueError('%s has no more than %d frames.' % (filename, nframes))
+    return next(_read_frames(buf, idx))
+
+def _is_selectable(buf):
+    " True if a part of the data of the probed buffer buf can be read alone."
+    return buf.is_uncompressed() or (buf.reader=='ReadIM7' \
+        and buf.header.pack_type in (PackTypes['IM7_PACKTYPE_ZLIB'],
+                                     PackTypes['IM7_PACKTYPE_FIXED_12_0']))
+
+def _read_selection(buf, planes, rows, cols, chunk_size=1<<16):
+    """
+    Read the given rows and columns of the planes (frames of images, blocks
+    of vector fields) of the file of buf (see _is_selectable) into an array
+    of shape (len(planes), len(rows), len(cols)). Uncompressed and FIXED_12
+    packed data is memory mapped so that only the selected rows are read,
+    zlib packed data is inflated a few rows at a time up to the last
+    selected row.
+    """
+    nplanes, ny, nx = buf.get_shape()
+    dtype = buf.get_dtype().newbyteorder('<')
+    offset = ct.sizeof(ImageHeader7)
+    out = np.empty((len(planes), len(rows), len(cols)), dtype=buf.get_dtype())
+    if buf.is_uncompressed():
+        data = np.memmap(buf.file, mode='r', dtype=dtype, offset=offset,
+            shape=(nplanes, ny, nx))
+        for ind, plane in enumerate(planes):
+            out[ind] = data[plane][np.ix_(rows, cols)]
+    elif buf.header.pack_type==PackTypes['IM7_PACKTYPE_FIXED_12_0']:
+        data = np.memmap(buf.file, mode='r', dtype='<u2', offset=offset,
+            shape=(nplanes, ny, (nx//4)*3+nx%4))
+        for ind, plane in enumerate(planes):
+            out[ind] = unpack12(data[plane][rows], nx)[:,cols]
+    else:
+        rowsize = nx*dtype.itemsize
+        nrows = max(1, chunk_size//rowsize)
+        # Index in out of the rows of a plane (-1 if not selected)
+        rowmap = np.full(ny, -1, dtype=np.intp)
+        rowmap[rows] = np.arange(len(rows))
+        sizes = [min(nrows, ny-el)*rowsize for el in range(0, ny, nrows)]
+        with open(buf.file, 'rb') as f:
+            f.seek(offset)
+            pieces = _inflate(f, buf.file, sizes*(max(planes)+1), chunk_size)
+            for plane in range(max(planes)+1):
+                dest = np.nonzero(planes==plane)[0]
+                for row in range(0, ny, nrows):
+                    if plane==max(planes) and row>rows[-1]:
+                        break
+                    data = next(pieces)
+                    idx = rowmap[row:row+nrows]
+                    sel = idx>=0
+                    if len(dest) and sel.any():
+                        data = np.frombuffer(data, dtype=dtype).reshape((-1, nx))
+                        out[dest[:,np.newaxis], idx[sel]] = data[sel][:,cols]
+    return out
+
+def _readim7_selection(filename, roi=None, step=None, frames=None,
+                       attributes=None):
+    " readim7 of a part of the data (see readim7)."
+    if hasattr(filename, 'read'):
+        mybuffer, att = readim7_into(filename, attributes=attributes)
+    else:
+        mybuffer = probe_im7(filename)
+        if _is_selectable(mybuffer):
+            mybuffer, att = scan_im7(filename, attributes)
+        else:
+            # IMX packed data can only be decoded at once
+            mybuffer, att = readim7_into(filename, attributes=attributes)
+    h = mybuffer.header
+    vector = mybuffer.reader=='ReadIM7' and h.buffer_format>=1 \
+        and h.buffer_format<=5
+    if vector and frames is not None:
+        raise TypeError('%s holds vector fields, not frames.' % mybuffer.file)
+    nplanes, ny, nx = mybuffer.get_shape()
+    x0, x1, y0, y1 = roi if roi is not None else (None,)*4
+    sx, sy = step if isinstance(step, (tuple, list)) else (step, step)
+    if (sx or 1)<1 or (sy or 1)<1:
+        raise ValueError("Steps must be positive.")
+    cols = np.arange(nx)[x0:x1:sx]
+    rows = np.arange(ny)[y0:y1:sy]
+    planes = np.arange(nplanes)
+    if frames is not None:
+        planes = np.atleast_1d(planes[frames])
+    if not (len(cols) and len(rows) and len(planes)):
+        raise ValueError("Empty selection of the data of %s." % mybuffer.file)
+
+    if '_memory' in mybuffer.__dict__:
+        out = mybuffer.blocks[np.ix_(planes, rows, cols)]
+    else:
+        out = _read_selection(mybuffer, planes, rows, cols)
+    for key in ('blocks', 'x', 'y', 'z'):
+        mybuffer.__dict__.pop(key, None)
+    mybuffer._memory = out
+    mybuffer.nx, mybuffer.ny = len(cols), len(rows)
+    mybuffer.totalLines = len(planes)*len(rows)
+    if frames is not None:
+        mybuffer.nf, mybuffer.nz = len(planes), 1
+    mybuffer.get_blocks()
+    # Scales of the positions of the selected columns and rows
+    for el, first, inc in (('X', cols[0], sx or 1), ('Y', rows[0], sy or 1)):
+        scale = getattr(mybuffer, 'scale%s' % el)
+        scale.offset += scale.factor*mybuffer.vectorGrid*(first+.5-.5*inc)
+        scale.factor *= inc
+        if '_SCALE_%s' % el in att:
+            att['_SCALE_%s' % el] = _scale_attribute(scale).decode('latin-1')
+    return mybuffer, att
+
+def _preview_step(nx, ny):
+    " Sampling step of the preview of IMX packed images (as Davis)."
+    return max(nx//100+1, ny//100+1)
+
+def _preview_scale(arr):
+    " Values of preview arr shifted (integers) or scaled (floats) below 64."
+    if arr.dtype.kind=='f':
+        top = np.nanmax(np.abs(arr)) if arr.size else 0
+        if not top>0:
+            return np.zeros(arr.shape, dtype=np.uint8)
+        return np.nan_to_num(np.abs(arr)*(63/top)).astype(np.uint8)
+    shift, top = 0, int(arr.max())
+    while shift<10 and top>=(64 << shift):
+        shift += 1
+    return (arr >> shift).astype(np.uint8)
+
+def read_preview(filename):
+    """
+    Preview image of a file as a small uint8 array, of values below 64.
+    IMX packed images hold such a preview (their pixels sampled every few
+    rows and columns, shifted right), which is read without decoding the
+    image. Other files are read with the same sampling (see readim7 step
+    argument): the first frame of images, or the magnitude of vector fields
+    (in the order of the blocks rows and columns).
+    """
+    probe = probe_im7(filename)
+    h = probe.header
+    if probe.reader=='ReadIMX':
+        stored = h.imagetype==ImageTypes['IMAGE_IMX']
+        offset = ct.sizeof(ImageHeaderX)
+    else:
+        stored = h.pack_type==PackTypes['IM7_PACKTYPE_IMX']
+        offset = ct.sizeof(ImageHeader7)
+    if stored:
+        with open(filename, 'rb') as f:
+            f.seek(offset)
+            size = bytearray(f.read(2))
+            if len(size)<2:
+                raise ValueError("Error while reading data in %s." % filename)
+            nx, ny = size
+            data = f.read(nx*ny)
+        if len(data)<nx*ny:
+            raise ValueError("Error while reading data in %s." % filename)
+        if nx*ny>0:
+            return np.frombuffer(data, dtype=np.uint8).reshape((ny, nx))
+    nplanes, ny, nx = probe.get_shape()
+    step = _preview_step(nx, ny)
+    if probe.reader=='ReadIM7' and h.buffer_format>=1 and h.buffer_format<=5:
+        buf, att = readim7(filename, step=step, dtype=np.float32)
+        arr = buf.vmag
+        if buf.scaleY.factor<=0:
+            arr = arr[:, ::-1]
+        arr = arr.T
+    else:
+        buf, att = readim7(filename, step=step, frames=0)
+        arr = buf.blocks[0]
+    return _preview_scale(arr)
+
+def contact_sheet(paths, columns=None, workers=None):
+    """
+    Contact sheet of the previews (see read_preview) of the files paths,
+    read by a pool of workers threads, as a uint8 array: previews are laid
+    out row by row in a grid of columns cells (about square by default),
+    each cell having the size of the largest preview. The cells of files
+    that can't be read are left blank (0).
+    """
+    paths = list(paths)
+
+    def work(path):
+        try:
+            return read_preview(path)
+        except (IOError, ValueError, TypeError) as err:
+            logging.warning("im7: no preview of %s: %s" % (path, err))
+            return None
+    with ThreadPoolExecutor(workers) as executor:
+        previews = list(executor.map(work, paths))
+    if columns is None:
+        columns = max(1, int(np.ceil(np.sqrt(len(paths)))))
+    rows = max(1, -(-len(paths)//columns))
+    shapes = [el.shape for el in previews if el is not None] or [(0, 0)]
+    h, w = max(el[0] for el in shapes), max(el[1] for el in shapes)
+    sheet = np.zeros((rows*h, columns*w), dtype=np.uint8)
+    for ind, arr in enumerate(previews):
+        if arr is not None:
+            row, col = divmod(ind, columns)
+            sheet[row*h:row*h+arr.shape[0], col*w:col*w+arr.shape[1]] = arr
+    return sheet
+
+# Pack types accepted by writeim7
+_WritePackTypes = {'img': PackTypes['IM7_PACKTYPE_IMG'],
+    'imx': PackTypes['IM7_PACKTYPE_IMX'], 'zlib': PackTypes['IM7_PACKTYPE_ZLIB']}
+
+def _encode(value):
+    if isinstance(value, bytes):
+        return value
+    return str(value).encode('latin-1')
+
+def _scale_attribute(scale):
+    " Attribute value of a BufferScale or a (factor, offset, unit, description)."
+    if isinstance(scale, BufferScale):
+        scale = (scale.factor, scale.offset, scale.unit, scale.description)
+    factor, offset, unit, description = scale
+    return b'%s %s\n%s\n%s\n' % (_encode(repr(float(factor))),
+        _encode(repr(float(offset))), _encode(unit), _encode(description))
+
+def _attribute_nodes(att):
+    " Chained AttributeNodes (or None) holding the dictionary att."
+    head = None
+    for key, value in reversed(list(att.items())):
+        node = AttributeNode()
+        node.name = _encode(key)
+        node.value = _encode(value)
+        if head is not None:
+            node.next = ct.pointer(head)
+        head = node
+    if head is None:
+        return None
+    return ct.pointer(head)
+
+def writeim7(filename, array, scales=None, att=None, pack='zlib', level=6,
+             buffer_format=None, vector_grid=1):
+    """
+    Write an image or a vector field in a Davis file (IM7, VC7).
+    array is an image (ny, nx), a stack of frames (nf, ny, nx), or the blocks
+    (nblocks, ny, nx) of a vector field when buffer_format is one of the
+    vector Formats (with vector_grid). Images of floats are stored as
+    float32, other images as uint16: the memory of C-contiguous arrays of
+    these types is used without copy. array may also be a Buffer, whose
+    blocks, format, vector grid and scales are used.
+    scales is a sequence of 3 BufferScale or (factor, offset, unit,
+    description) for the x, y and intensity axes (taken from the _SCALE_
+    attributes of att, or unit scales, if not given), and att a dictionary
+    of attributes. pack is 'zlib' (with compression level from 0 to 9), 'img'
+    (uncompressed) or 'imx' (old Davis compression, uint16 images only).
+    """
+    if isinstance(array, Buffer):
+        if buffer_format is None and array.reader=='ReadIM7' \
+          and array.header.buffer_format>0:
+            buffer_format = array.header.buffer_format
+            vector_grid = array.vectorGrid
+        if scales is None:
+            scales = (array.scaleX, array.scaleY, array.scaleI)
+        array = array.blocks
+    if pack not in _WritePackTypes:
+        raise ValueError("Unknown pack type %s." % pack)
+    array = np.asarray(array)
+    dtype = np.float32 if array.dtype.kind=='f' else np.uint16
+    if buffer_format is not None and buffer_format>0:
+        dtype = np.float32
+    array = np.ascontiguousarray(array, dtype=dtype)
+    if array.ndim==2:
+        array = array[np.newaxis]
+    elif array.ndim!=3:
+        raise ValueError("Can't write arrays of %d dimensions." % array.ndim)
+
+    mybuffer = Buffer()
+    mybuffer.isFloat = int(dtype==np.float32)
+    nblocks, ny, nx = array.shape
+    mybuffer.nx, mybuffer.ny, mybuffer.nz, mybuffer.nf = nx, ny, 1, nblocks
+    mybuffer.totalLines = nblocks*ny
+    mybuffer.vectorGrid = 1
+    mybuffer.image_sub_type = Formats['FormatsFLOAT'] if mybuffer.isFloat \
+        else Formats['FormatsWORD']
+    if buffer_format is not None and buffer_format>0:
+        expected = (9, 2, 10, 3, 14)[buffer_format-1]
+        if nblocks!=expected:
+            raise ValueError("Format %d needs %d blocks, not %d." \
+                % (buffer_format, expected, nblocks))
+        mybuffer.ny, mybuffer.nf = nblocks*ny, 1
+        mybuffer.vectorGrid = vector_grid
+        mybuffer.image_sub_type = buffer_format
+    if mybuffer.isFloat:
+        mybuffer.floatArray = array.ctypes.data_as(ct.POINTER(ct.c_float))
+    else:
+        mybuffer.wordArray = array.ctypes.data_as(ct.POINTER(ct.c_ushort))
+
+    att = dict(att or {})
+    if scales is None:
+        # unit scales where missing
+        scales = [att.get('_SCALE_%s' % el, (1., 0., unit, '')) \
+            for el, unit in zip('XYI', ('pixel', 'pixel', 'counts'))]
+    for el, scale in zip('XYI', scales):
+        if not isinstance(scale, (str, bytes)):
+            scale = _scale_attribute(scale)
+        att['_SCALE_%s' % el] = scale
+    nodes = _attribute_nodes(att)
+    mylib.WriteIM7Attr(ct.c_char_p(filename.encode(sys.getfilesystemencoding())),
+                       _WritePackTypes[pack], level, ct.byref(mybuffer), nodes)
+
+def writeim7_many(paths, arrays, scales=None, atts=None, workers=None, **kwargs):
+    """
+    Write a series of files using a pool of workers threads, e.g. the
+    stack, scales and attributes returned by readim7_series. arrays,
+    scales and atts are sequences indexed as paths (scales and atts may be
+    None). Packing is done by the C library, which releases the GIL, so
+    that writing scales with the number of cores. Other keyword arguments
+    are passed to writeim7.
+    """
+    paths = list(paths)
+
+    def work(ind):
+        writeim7(paths[ind], arrays[ind],
+            None if scales is None else scales[ind],
+            None if atts is None else atts[ind], **kwargs)
+    with ThreadPoolExecutor(workers) as executor:
+        for tmp in executor.map(work, range(len(paths))):
+            pass
+
 
 def save_as_pivmat(filename, buf, att=None):
     """
@@ -0,0 +1,162 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+#Copyright (C) 2010 Fabricio Silva
+
+"""
+One pass statistics of series of vector fields: mean, standard deviation
+and covariances (Reynolds stresses) of the velocity components, computed
+without keeping the fields in memory.
+
+The accumulators are updated with the algorithm of Welford and merged with
+that of Chan et al., in float64, so that partial results computed on parts
+of a series (e.g. by parallel workers) can be combined. Vectors with no
+peak selected (choice==0) are left out of the statistics of their position.
+"""
+import os
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from .libim7 import readim7, _ExtendedBlocks
+
+class FieldStatistics(object):
+    """
+    Accumulator of the statistics of the given components of vector fields
+    (any key of Buffer.get_component). Fields are added by add (or
+    update) and the results are arrays oriented as Buffer.vx.
+    """
+    def __init__(self, components=('vx', 'vy', 'vz')):
+        self.components = tuple(components)
+        self.nfields = 0
+        self.count = None
+        self._mean = None
+        self._comoment = None
+
+    def _pairs(self):
+        n = len(self.components)
+        return [(i, j) for i in range(n) for j in range(i, n)]
+
+    def _start(self, shape):
+        n = len(self.components)
+        self.count = np.zeros(shape, dtype=np.int64)
+        self._mean = np.zeros((n,)+shape, dtype=np.float64)
+        self._comoment = np.zeros((len(self._pairs()),)+shape,
+            dtype=np.float64)
+
+    def add(self, buf):
+        " Add the vector field of the Buffer buf."
+        values = np.array([buf.get_component(key) for key in self.components],
+            dtype=np.float64)
+        if buf.header.buffer_format in _ExtendedBlocks:
+            valid = buf._orient(buf._get_choice())!=0
+        else:
+            valid = np.ones(values.shape[1:], dtype=bool)
+        self.add_arrays(values, valid)
+
+    def add_arrays(self, values, valid=None):
+        """
+        Add a field given as an array of the components stacked along the
+        first axis, with the boolean array valid of the vectors to take
+        into account (all by default).
+        """
+        values = np.asarray(values, dtype=np.float64)
+        if values.shape[0]!=len(self.components):
+            raise ValueError("Expected %d components." % len(self.components))
+        if self.count is None:
+            self._start(values.shape[1:])
+        elif values.shape[1:]!=self.count.shape:
+            raise ValueError("Field of shape %s added to statistics of shape " \
+                "%s." % (values.shape[1:], self.count.shape))
+        if valid is None:
+            valid = np.ones(self.count.shape, dtype=bool)
+        self.count += valid
+        delta = np.where(valid, values-self._mean, 0.)
+        # Positions with no valid vector yet have count 0 and delta 0
+        self._mean += delta/np.maximum(self.count, 1)
+        delta2 = np.where(valid, values-self._mean, 0.)
+        for ind, (i, j) in enumerate(self._pairs()):
+            self._comoment[ind] += delta[i]*delta2[j]
+        self.nfields += 1
+
+    def update(self, paths, workers=None):
+        """
+        Add the vector fields of the files paths, read one after the other
+        or, if workers is given, workers at a time by a pool of threads.
+        Buffers are released once added.
+        """
+        paths = list(paths)
+        if not workers:
+            results = (readim7(el) for el in paths)
+        else:
+            executor = ThreadPoolExecutor(workers)
+            results = (res for start in range(0, len(paths), workers) \
+                for res in executor.map(readim7, paths[start:start+workers]))
+        try:
+            for buf, att in results:
+                self.add(buf)
+                buf.delete()
+        finally:
+            if workers:
+                executor.shutdown()
+        return self
+
+    def merge(self, other):
+        " Add the statistics of other, computed on other fields."
+        if other.components!=self.components:
+            raise ValueError("Statistics of other components.")
+        if other.count is None:
+            return self
+        if self.count is None:
+            self._start(other.count.shape)
+        elif other.count.shape!=self.count.shape:
+            raise ValueError("Statistics of fields of another shape.")
+        na, nb = self.count, other.count
+        n = na+nb
+        delta = other._mean-self._mean
+        ratio = np.divide(nb, n, out=np.zeros(n.shape), where=n>0)
+        for ind, (i, j) in enumerate(self._pairs()):
+            self._comoment[ind] += other._comoment[ind] \
+                + delta[i]*delta[j]*na*ratio
+        self._mean += delta*ratio
+        self.count = n
+        self.nfields += other.nfields
+        return self
+
+    def _index(self, key):
+        try:
+            return self.components.index(key)
+        except ValueError:
+            raise KeyError(key)
+
+    def mean(self, key):
+        " Mean of the component key (NaN where no vector is valid)."
+        return np.where(self.count>0, self._mean[self._index(key)], np.nan)
+
+    def covariance(self, key1, key2, ddof=0):
+        """
+        Covariance <key1'key2'> of the fluctuations of two components (NaN
+        where less than ddof+1 vectors are valid).
+        """
+        i, j = sorted((self._index(key1), self._index(key2)))
+        arr = self._comoment[self._pairs().index((i, j))]
+        n = self.count-ddof
+        return np.divide(arr, n, out=np.full(n.shape, np.nan), where=n>0)
+
+    def std(self, key, ddof=0):
+        " Standard deviation (RMS of the fluctuations) of the component key."
+        return np.sqrt(self.covariance(key, key, ddof))
+
+def field_statistics(paths, components=('vx', 'vy', 'vz'), workers=None):
+    """
+    FieldStatistics of the vector fields of the files paths, computed by
+    workers threads on parts of the series and merged.
+    """
+    paths = list(paths)
+    nparts = max(1, min(workers or os.cpu_count() or 1, len(paths)))
+    parts = [paths[ind::nparts] for ind in range(nparts)]
+    with ThreadPoolExecutor(nparts) as executor:
+        stats = list(executor.map(lambda part: \
+            FieldStatistics(components).update(part), parts))
+    result = FieldStatistics(components)
+    for tmp in stats:
+        result.merge(tmp)
+    return result
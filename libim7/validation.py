@@ -0,0 +1,161 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+#Copyright (C) 2010 Fabricio Silva
+
+"""
+Validation of vector fields by the normalized median test (Westerweel and
+Scarano, Exp. Fluids 39, 2005), with replacement of the rejected vectors by
+the mean of their valid neighbours. Fields and stacks of fields are handled
+by array operations over all the vectors at once, stacks being split into
+chunks of fields processed by a pool of threads.
+"""
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from .libim7 import Buffer, _ExtendedBlocks
+
+def _offsets(radius):
+    " Offsets of the neighbours of a point in a (2*radius+1)**2 window."
+    return [(i, j) for i in range(-radius, radius+1) \
+        for j in range(-radius, radius+1) if (i, j)!=(0, 0)]
+
+def _pad(arr, radius):
+    " arr (..., nx, ny) padded with radius NaN on the last two axes."
+    return np.pad(arr, [(0, 0)]*(arr.ndim-2)+[(radius, radius)]*2,
+        mode='constant', constant_values=np.nan)
+
+def _neighbours(arr, radius):
+    """
+    Values of the neighbours of the points of arr (..., nx, ny) along a
+    first axis, NaN beyond the edges.
+    """
+    nx, ny = arr.shape[-2:]
+    pad = _pad(arr, radius)
+    return np.stack([pad[..., radius+i:radius+i+nx, radius+j:radius+j+ny] \
+        for i, j in _offsets(radius)])
+
+def _nanmedian(arr):
+    " Median along the first axis ignoring NaN (NaN if all are)."
+    arr = np.sort(arr, axis=0)
+    n = arr.shape[0]-np.isnan(arr).sum(axis=0)
+    low = np.take_along_axis(arr, (np.maximum(n-1, 0)//2)[np.newaxis], 0)
+    high = np.take_along_axis(arr, (n//2)[np.newaxis], 0)
+    return (low[0]+high[0])/2
+
+def _fill(comps, missing, radius, iterations):
+    """
+    Replace the missing vectors of comps (ncomp, nt, nx, ny) by the mean of
+    their valid neighbours, repeatedly to fill the holes from their edges.
+    """
+    missing = missing.copy()
+    for ind in range(iterations):
+        idx = np.nonzero(missing)
+        if not len(idx[0]):
+            break
+        lMeans = []
+        for comp in comps:
+            pad = _pad(comp, radius)
+            values = np.stack([pad[idx[:-2]+(idx[-2]+radius+i, idx[-1]+radius+j)] \
+                for i, j in _offsets(radius)])
+            valid = ~np.isnan(values)
+            n = valid.sum(axis=0)
+            with np.errstate(invalid='ignore', divide='ignore'):
+                lMeans.append(np.where(valid, values, 0).sum(axis=0)/n)
+        filled = n>0
+        if not filled.any():
+            break
+        idx = tuple(el[filled] for el in idx)
+        for comp, mean in zip(comps, lMeans):
+            comp[idx] = mean[filled]
+        missing[idx] = False
+
+def _validate(comps, valid, threshold, epsilon, radius, replace, iterations):
+    """
+    Normalized median test of the components comps (ncomp, nt, nx, ny),
+    NaN being ignored, and replacement of the rejected vectors in place.
+    Returns the mask of the rejected vectors (or invalid, as NaN).
+    """
+    valid = valid & ~np.isnan(comps).any(axis=0)
+    comps[:, ~valid] = np.nan
+    residual = np.zeros(comps.shape[1:], dtype=comps.dtype)
+    for comp in comps:
+        neighbours = _neighbours(comp, radius)
+        median = _nanmedian(neighbours)
+        neighbours -= median
+        fluctuation = _nanmedian(np.abs(neighbours, out=neighbours))
+        residual += ((comp-median)/(fluctuation+epsilon))**2
+    with np.errstate(invalid='ignore'):
+        mask = ~valid | (residual>threshold*threshold)
+    comps[:, mask] = np.nan
+    if replace:
+        _fill(comps, mask, radius, iterations)
+    return mask
+
+def _fields(source, valid):
+    """
+    Components (ncomp, nt, nx, ny), validity mask, True if a stack, and
+    units of the components per pixel of displacement (1 for arrays).
+    """
+    if isinstance(source, Buffer):
+        source = [source]
+        stack = False
+    elif len(source) and isinstance(source[0], Buffer):
+        stack = True
+    else:
+        comps = np.asarray(source)
+        if comps.ndim not in (3, 4):
+            raise ValueError("Components must be (ncomp, nx, ny) or (ncomp, nt, nx, ny).")
+        stack = comps.ndim==4
+        if not stack:
+            comps = comps[:, np.newaxis]
+        if valid is None:
+            valid = np.ones(comps.shape[1:], dtype=bool)
+        return comps, np.broadcast_to(valid, comps.shape[1:]), stack, 1.
+    comps = np.stack([buf.stack_components() for buf in source], axis=1)
+    if valid is None:
+        valid = np.ones(comps.shape[1:], dtype=bool)
+        for ind, buf in enumerate(source):
+            if buf.header.buffer_format in _ExtendedBlocks:
+                valid[ind] = buf._orient(buf._get_choice())!=0
+    return comps, np.broadcast_to(valid, comps.shape[1:]), stack, \
+        abs(source[0].scaleI.factor) or 1.
+
+def validate_vectors(source, threshold=2., epsilon=.1, radius=1, valid=None,
+                     replace=True, iterations=10, chunk=8, workers=None):
+    """
+    Normalized median test of vector fields: the residual of a vector is
+    the difference of its components to the median of its valid neighbours
+    (in a (2*radius+1)**2 window), normalized by the median of the
+    residuals of the neighbours plus epsilon (in pixels of displacement for
+    Buffers, converted by their intensity scale, in the units of the
+    components for arrays), and the vector is rejected if the norm of the residuals
+    of its components exceeds threshold.
+    source is a Buffer, a sequence of Buffers (a series), or the array of
+    the components of a field (ncomp, nx, ny) or of a stack of fields
+    (ncomp, nt, nx, ny), e.g. (vx, vy). The vectors with no peak selected
+    (choice==0) of Buffers, those not valid (boolean array broadcastable to
+    (nx, ny) or (nt, nx, ny)) and NaN are ignored and replaced.
+    With replace=True, the rejected vectors are replaced by the mean of
+    their valid neighbours, iterations times at most to fill the larger
+    holes; they are NaN otherwise (as the vectors with no valid
+    neighbours). Stacks are processed by chunks of chunk fields on a pool
+    of workers threads.
+    Returns the mask of the rejected or invalid vectors (nx, ny) or (nt, nx,
+    ny), and the components (ncomp, nx, ny) or (ncomp, nt, nx, ny).
+    """
+    comps, valid, stack, scale = _fields(source, valid)
+    dtype = comps.dtype if comps.dtype in (np.float32, np.float64) \
+        else np.float64
+    out = np.array(comps, dtype=dtype)
+    mask = np.empty(out.shape[1:], dtype=bool)
+
+    def work(start):
+        sl = slice(start, start+chunk)
+        mask[sl] = _validate(out[:, sl], valid[sl], threshold, epsilon*scale,
+            radius, replace, iterations)
+    with ThreadPoolExecutor(workers) as executor:
+        for tmp in executor.map(work, range(0, out.shape[1], chunk)):
+            pass
+    if not stack:
+        return mask[0], out[:, 0]
+    return mask, out
@@ -0,0 +1,146 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+#Copyright (C) 2010 Fabricio Silva
+
+"""
+Watcher of the output directory of Davis during an acquisition: the files
+written in the directory (e.g. B00001.VC7, B00002.VC7...) are read once
+completely written, and handed in sequence to callbacks, a queue and
+aggregates such as FieldStatistics.
+"""
+import os, time, logging, threading
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from .libim7 import readim7
+from .index import extensions
+
+class DirectoryWatcher(object):
+    """
+    Watch directory for new Davis files (with the given extensions), polled
+    every interval seconds by start or by explicit calls to poll.
+    A file is considered completely written when its size and modification
+    time did not change for settle seconds. It is then read by readim7
+    (with keyword arguments kwargs) on a pool of workers threads.
+    The files read are handed in the order in which they were found (sorted
+    by name when found at once) to the callbacks, called with the path, the
+    Buffer and the attributes, to queue (put (path, Buffer, attributes))
+    and to the add method of the aggregates.
+    Files present at start are handled too if existing is True.
+    The latency of each file (from its last modification to the end of its
+    handling) is kept in latency.
+    """
+    def __init__(self, directory, callbacks=(), queue=None, aggregates=(),
+                 extensions=extensions, settle=.5, interval=.2, workers=2,
+                 existing=True, **kwargs):
+        self.directory = os.path.abspath(directory)
+        self.callbacks = list(callbacks)
+        self.queue = queue
+        self.aggregates = list(aggregates)
+        self.extensions = tuple(extensions)
+        self.settle = settle
+        self.interval = interval
+        self.kwargs = kwargs
+        self.latency = OrderedDict()
+        self.errors = OrderedDict()
+        self._executor = ThreadPoolExecutor(workers)
+        self._candidates = {}
+        self._pending = deque()
+        self._known = set()
+        self._thread = None
+        self._stop = threading.Event()
+        if not existing:
+            self._known.update(self._listdir())
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *args):
+        self.stop()
+
+    def _listdir(self):
+        return sorted(os.path.join(self.directory, el) \
+            for el in os.listdir(self.directory) \
+            if os.path.splitext(el)[1].lower() in self.extensions)
+
+    def poll(self, wait=False):
+        """
+        Look for new files, read those completely written and hand the
+        files read in sequence. With wait=True, waits for all the files
+        being read. Returns the list of the files handled.
+        """
+        now = time.time()
+        for path in self._listdir():
+            if path in self._known:
+                continue
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            state = (st.st_size, st.st_mtime)
+            if path not in self._candidates \
+              or self._candidates[path][0]!=state:
+                self._candidates[path] = (state, now)
+            elif st.st_size>0 and now-self._candidates[path][1]>=self.settle:
+                del self._candidates[path]
+                self._known.add(path)
+                self._pending.append((path, st.st_mtime,
+                    self._executor.submit(readim7, path, **self.kwargs)))
+        handled = []
+        while self._pending and (wait or self._pending[0][2].done()):
+            path, mtime, future = self._pending.popleft()
+            try:
+                buf, att = future.result()
+            except Exception as err:
+                logging.warning("im7: can't read %s: %s" % (path, err))
+                self.errors[path] = err
+                continue
+            for aggregate in self.aggregates:
+                aggregate.add(buf)
+            for callback in self.callbacks:
+                callback(path, buf, att)
+            if self.queue is not None:
+                self.queue.put((path, buf, att))
+            self.latency[path] = time.time()-mtime
+            handled.append(path)
+        return handled
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.poll()
+            except Exception:
+                logging.exception("im7: error while watching %s" % self.directory)
+
+    def start(self):
+        " Poll the directory in a background thread."
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run)
+            self._thread.daemon = True
+            self._thread.start()
+        return self
+
+    def stop(self, wait=True):
+        """
+        Stop polling the directory, handling the files being read if wait is
+        True.
+        """
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+        if wait:
+            self.poll(wait=True)
+
+    def close(self):
+        self.stop(wait=False)
+        self._executor.shutdown()
+
+    def stats(self):
+        " Number of files handled, being read and failed, and their latency."
+        latency = list(self.latency.values())
+        return {'handled':len(latency), 'pending':len(self._pending),
+            'errors':len(self.errors),
+            'latency_mean':sum(latency)/len(latency) if latency else None,
+            'latency_max':max(latency) if latency else None}
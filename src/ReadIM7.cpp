@@ -14,6 +14,7 @@
 #include "ReadIMX.h"
 #include "ReadIM7.h"
 #include<zlib.h>
+#include<time.h>
 
 enum IM7PackType_t
 {
@@ -57,29 +58,104 @@ ImReadError_t SCPackUncompressed_Read( FILE* theFile, BufferType* myBuffer, bool
 
 
 
-ImReadError_t SCPackZlib_Read( FILE* theFile, BufferType* myBuffer )
+// Monotonic clock (s) for the statistics of the reads
+static double IM7_Clock()
+{
+#ifdef _WIN32
+	LARGE_INTEGER count, frequency;
+	QueryPerformanceCounter(&count);
+	QueryPerformanceFrequency(&frequency);
+	return (double)count.QuadPart/(double)frequency.QuadPart;
+#else
+	struct timespec ts;
+	clock_gettime(CLOCK_MONOTONIC, &ts);
+	return ts.tv_sec + 1e-9*ts.tv_nsec;
+#endif
+}
+
+// Time elapsed since *theTime, which is set to now
+static double IM7_Lap( double* theTime )
+{
+	double now = IM7_Clock(), dt = now-*theTime;
+	*theTime = now;
+	return dt;
+}
+
+static int IM7_CountAttributes( AttributeList* ptr )
+{
+	int n = 0;
+	for (; ptr!=NULL && ptr->name!=NULL; ptr=ptr->next)
+		n++;
+	return n;
+}
+
+
+// Size of the window through which zlib packed data is read
+#define IM7_ZLIB_WINDOW 32768
+
+ImReadError_t SCPackZlib_Read( FILE* theFile, BufferType* myBuffer, IM7Stats* theStats )
 {
 	int sourceLen = 0;
-	Bytef *source = NULL;
+	Bytef source[IM7_ZLIB_WINDOW];
+
+	if (fread( &sourceLen, sizeof(sourceLen), 1, theFile )!=1 || sourceLen<0)
+		return IMREAD_ERR_DATA;
 
-	fread( &sourceLen, sizeof(sourceLen), 1, theFile );
-	source = (Byte*)malloc(sourceLen);
-	if (source==NULL)
-	{
-		return IMREAD_ERR_MEMORY;
-	}
-	fread( source, 1, sourceLen, theFile );
-	
 	uLongf destLen = 0;
 	Bytef *dest = Buffer_GetRowAddrAndSize(myBuffer,0,destLen);
 	destLen *= myBuffer->totalLines;
 
-	int err = uncompress( dest, &destLen, source, sourceLen );
+	z_stream stream;
+	stream.zalloc = Z_NULL;
+	stream.zfree = Z_NULL;
+	stream.opaque = Z_NULL;
+	stream.next_in = Z_NULL;
+	stream.avail_in = 0;
+	if (inflateInit(&stream)!=Z_OK)
+		return IMREAD_ERR_MEMORY;
+	stream.next_out = dest;
+	stream.avail_out = (uInt)destLen;
+
+	// Inflate the data while reading it, window by window
+	int err = Z_OK;
+	while (err==Z_OK)
+	{
+		if (stream.avail_in==0)
+		{
+			size_t n = (sourceLen<IM7_ZLIB_WINDOW ? sourceLen : IM7_ZLIB_WINDOW);
+			n = (n>0 ? fread( source, 1, n, theFile ) : 0);
+			if (n==0)
+			{	// "Compressed data is truncated!"
+				err = Z_DATA_ERROR;
+				break;
+			}
+			sourceLen -= n;
+			stream.next_in = source;
+			stream.avail_in = n;
+			if (theStats)
+				theStats->bytes_packed += n;
+		}
+		if (theStats)
+		{
+			double t = IM7_Clock();
+			err = inflate( &stream, Z_NO_FLUSH );
+			theStats->t_inflate += IM7_Lap(&t);
+		}
+		else
+			err = inflate( &stream, Z_NO_FLUSH );
+	}
+	inflateEnd(&stream);
+	// skip what remains of the packed data
+	if (sourceLen>0)
+		fseek( theFile, sourceLen, SEEK_CUR );
 
 	ImReadError_t errret = IMREAD_ERR_NO;
 	switch (err)
 	{
-		case Z_OK:
+		case Z_STREAM_END:
+			if (stream.avail_out>0)
+				// "Compressed data is shorter than the buffer!"
+				errret = IMREAD_ERR_DATA;
 			break;
 		case Z_MEM_ERROR:
 			errret = IMREAD_ERR_MEMORY;
@@ -88,13 +164,11 @@ ImReadError_t SCPackZlib_Read( FILE* theFile, BufferType* myBuffer )
 			//"Output buffer too small for uncompressed data!"
 			errret = IMREAD_ERR_MEMORY;
 			break;
-		case Z_DATA_ERROR:
+		default:
 			// "Compressed data is corrupt!"
 			errret = IMREAD_ERR_DATA;
 			break;
 	}
-
-	free(source);
 	return errret;
 }
 
@@ -116,68 +190,64 @@ ImReadError_t SCPackFixedBits_Read( FILE* theFile, BufferType* myBuffer, int the
 	else
 		theValidBits = 16;
 
-	Word *dataPtr;
-	Word array[16];
+	// number of packed words in a row
+	const int nx = myBuffer->nx;
+	size_t rowWords;
+	switch (theValidBits)
+	{
+		case 8:		rowWords = (nx+1)/2;			break;
+		case 12:	rowWords = (nx/4)*3 + nx%4;	break;
+		default:	rowWords = nx;
+	}
+	Word *packed = (Word*)malloc(rowWords*sizeof(Word));
+	if (packed==NULL)
+		return IMREAD_ERR_MEMORY;
 
+	ImReadError_t errret = IMREAD_ERR_NO;
 	for (int row=0; row<myBuffer->totalLines; row++)
 	{
 		unsigned long destLen = 0;
-		dataPtr = (Word*) Buffer_GetRowAddrAndSize(myBuffer,row,destLen);
-		int nx = myBuffer->nx;
-		while (nx>0)
+		Word *dataPtr = (Word*) Buffer_GetRowAddrAndSize(myBuffer,row,destLen);
+		// read complete row in one step
+		Word *src = (theValidBits==16 ? dataPtr : packed);
+		if (fread( src, sizeof(Word), rowWords, theFile )!=rowWords)
 		{
-			switch (theValidBits)
-			{
-				case 8:
-					fread( array, sizeof(Word), 1, theFile );
-					if (nx<2)
-					{	// last pixel of a row
-						*dataPtr = (array[0] & 0x00FF);
-						dataPtr++;
-						nx = 0;
-					}
-					else
-					{
-						*dataPtr =  (array[0] & 0x00FF);
-						dataPtr++;
-						*dataPtr = ((array[0] & 0xFF00) >> 8);
-						dataPtr++;
-						nx -= 2;
-					}
-					break;
-				case 10:
-					break;
-				case 12:
-					if (nx<4)
-					{	// last pixel of a row
-						fread( dataPtr, sizeof(Word), nx, theFile );
-						nx = 0;
-					}
-					else
-					{	// decompress next 4 pixel
-						fread( array, sizeof(Word), 3, theFile );
-						*dataPtr = (array[0] & 0x0FFF);
-						dataPtr++;
-						*dataPtr = (array[0] >> 12) | ((array[1] & 0x00FF) << 4);
-						dataPtr++;
-						*dataPtr = ((array[1] & 0xFF00) >> 8) | ((array[2] & 0x000F) << 8);
-						dataPtr++;
-						*dataPtr = (array[2] >> 4);
-						dataPtr++;
-						nx -= 4;
-					}
-					break;
-				case 14:
-					break;
-				case 16:
-					// read complete line in one step
-					fread( dataPtr, sizeof(Word), nx, theFile );
-					nx = 0;
-					break;
-			}
+			errret = IMREAD_ERR_DATA;
+			break;
+		}
+		int i, n;
+		switch (theValidBits)
+		{
+			case 8:
+				n = nx/2;
+				for (i=0; i<n; i++)
+				{
+					dataPtr[2*i]   = (src[i] & 0x00FF);
+					dataPtr[2*i+1] = (src[i] >> 8);
+				}
+				if (nx%2)
+				{	// last pixel of a row
+					dataPtr[nx-1] = (src[n] & 0x00FF);
+				}
+				break;
+			case 12:
+				n = nx/4;
+				for (i=0; i<n; i++)
+				{	// decompress 4 pixels from 3 words
+					const Word a = src[3*i], b = src[3*i+1], c = src[3*i+2];
+					dataPtr[4*i]   = (a & 0x0FFF);
+					dataPtr[4*i+1] = (a >> 12) | ((b & 0x00FF) << 4);
+					dataPtr[4*i+2] = (b >> 8) | ((c & 0x000F) << 8);
+					dataPtr[4*i+3] = (c >> 4);
+				}
+				// last pixels of a row, stored as words
+				for (i=4*n; i<nx; i++)
+					dataPtr[i] = src[3*n+i-4*n];
+				break;
 		}
 	}
-	return IMREAD_ERR_NO;
+	free(packed);
+	return errret;
 }
 
 
@@ -210,15 +280,116 @@ void Scale_Read( const char*theData, BufferScaleType* theScale )
 }
 
 
+// Files with these versions are IMX, IMG or VEC files to be read by ReadIMX
+static bool IM7_IsIMX( const Image_Header_7& header )
+{
+	switch (header.version)
+	{
+	    case IMAGE_IMG:
+		case IMAGE_IMX:
+		case IMAGE_FLOAT:
+		case IMAGE_SPARSE_WORD:
+		case IMAGE_SPARSE_FLOAT:
+		case IMAGE_PACKED_WORD:
+			return true;
+	}
+	return false;
+}
+
+
+// Describe the buffer according to the header, without allocating memory
+static void IM7_SetBufferInfo( const Image_Header_7& header, BufferType* myBuffer )
+{
+	int theNX,theNY,theNZ,theNF;
+	theNX = header.sizeX;
+	theNY = header.sizeY;
+	theNZ = header.sizeZ;
+	theNF = header.sizeF;
+	if (header.buffer_format > 0)
+	{	// vector
+		const int compN[] = { 1, 9, 2, 10, 3, 14 };
+		theNY *= compN[header.buffer_format];
+	}
+	bool bFloat = header.buffer_format!=BUFFER_FORMAT_WORD && header.buffer_format!=BUFFER_FORMAT_MEMPACKWORD;
+	SetBufferInfo(myBuffer,theNX,theNY,theNZ,theNF,bFloat,header.vector_grid,(BufferFormat_t)header.buffer_format);
+}
+
+
+// Read the attributes following the data, and set the scales of the buffer
+static void IM7_ReadAttributes( FILE* theFile, BufferType* myBuffer, AttributeList** myList )
+{
+	AttributeList* tmpAttrList = NULL;
+	AttributeList** useList = (myList!=NULL ? myList : &tmpAttrList);
+    ReadImgAttributes(theFile, useList);
+	AttributeList* ptr = *useList;
+	/*while (ptr!=NULL)*/
+	while (ptr!=NULL && ptr->name!=NULL)
+	{
+		//fprintf(stderr,"%s: %s\n",ptr->name,ptr->value);
+		if (strncmp(ptr->name,"_SCALE_",7)==0)
+		{
+			switch (ptr->name[7])
+			{
+				case 'X':	Scale_Read( ptr->value, &myBuffer->scaleX );	break;
+				case 'Y':	Scale_Read( ptr->value, &myBuffer->scaleY );	break;
+				case 'I':	Scale_Read( ptr->value, &myBuffer->scaleI );	break;
+			}
+		}
+		ptr = ptr->next;
+	}
+}
+
+
+extern "C" int EXPORT ProbeIM7 ( const char* theFileName, BufferType* myBuffer )
+{
+	FILE* theFile = fopen(theFileName, "rb");
+	// open for binary read
+	if (theFile==NULL)
+	    return IMREAD_ERR_FILEOPEN;
+
+	Image_Header_7 header;
+	size_t n = fread ((char*)&header, sizeof(header), 1, theFile);
+	fclose(theFile);
+	if (!n)
+        return IMREAD_ERR_HEADER;
+	if (IM7_IsIMX(header))
+		return ProbeIMX(theFileName,myBuffer);
+	return ProbeIM7Header(&header,myBuffer);
+}
+
+
+extern "C" int EXPORT ProbeIM7Header ( const Image_Header_7* theHeader, BufferType* myBuffer )
+{
+	if (IM7_IsIMX(*theHeader))
+		return IMREAD_ERR_HEADER;
+	if (theHeader->isSparse)
+        return IMREAD_ERR_FORMAT;
+	IM7_SetBufferInfo(*theHeader,myBuffer);
+	return IMREAD_ERR_NO;
+}
+
+
 extern "C" int EXPORT ReadIM7 ( const char* theFileName, BufferType* myBuffer, AttributeList** myList )
 {
+	return ReadIM7Into( theFileName, myBuffer, myList, NULL, 0 );
+}
+
+
+extern "C" int EXPORT ReadIM7Into ( const char* theFileName, BufferType* myBuffer, AttributeList** myList, void* theArray, size_t theArraySize )
+{
+	return ReadIM7Stats( theFileName, myBuffer, myList, theArray, theArraySize, NULL );
+}
+
+
+extern "C" int EXPORT ReadIM7Stats ( const char* theFileName, BufferType* myBuffer, AttributeList** myList, void* theArray, size_t theArraySize, IM7Stats* theStats )
+{
+	double t = (theStats ? IM7_Clock() : 0.);
 	FILE* theFile = fopen(theFileName, "rb");
 	// open for binary read
 	if (theFile==NULL)
 	    return IMREAD_ERR_FILEOPEN;
 
 	// Read an image in our own IMX or IMG or VEC or VOL format
-	int theNX,theNY,theNZ,theNF;
 	// read and store file header contents
 	Image_Header_7 header;
 	if (!fread ((char*)&header, sizeof(header), 1, theFile))
@@ -227,16 +398,21 @@ extern "C" int EXPORT ReadIM7 ( const char* theFileName, BufferType* myBuffer, A
         return IMREAD_ERR_HEADER;
     }
 
-	switch (header.version)
+	if (theStats)
+		theStats->t_open += IM7_Lap(&t);
+
+	if (IM7_IsIMX(header))
 	{
-	    case IMAGE_IMG:
-		case IMAGE_IMX:
-		case IMAGE_FLOAT:
-		case IMAGE_SPARSE_WORD:
-		case IMAGE_SPARSE_FLOAT:
-		case IMAGE_PACKED_WORD:
-			fclose(theFile);
-			return ReadIMX(theFileName,myBuffer,myList);
+		fclose(theFile);
+		int imxret = ReadIMXInto(theFileName,myBuffer,myList,theArray,theArraySize);
+		if (theStats && imxret==IMREAD_ERR_NO)
+		{
+			theStats->t_data += IM7_Lap(&t);
+			theStats->bytes_decoded += Buffer_GetSize(myBuffer);
+			if (myList!=NULL)
+				theStats->nattributes += IM7_CountAttributes(*myList);
+		}
+		return imxret;
 	}
 
 	if (header.isSparse)
@@ -245,19 +421,14 @@ extern "C" int EXPORT ReadIM7 ( const char* theFileName, BufferType* myBuffer, A
         return IMREAD_ERR_FORMAT;
 	}
 
-	theNX = header.sizeX;
-	theNY = header.sizeY;
-	theNZ = header.sizeZ;
-	theNF = header.sizeF;
-	if (header.buffer_format > 0)
-	{	// vector
-		const int compN[] = { 1, 9, 2, 10, 3, 14 };
-		theNY *= compN[header.buffer_format];
+	IM7_SetBufferInfo(header,myBuffer);
+	ImReadError_t errret = AllocBuffer(myBuffer,theArray,theArraySize);
+	if (errret!=IMREAD_ERR_NO)
+	{
+		fclose(theFile);
+		return errret;
 	}
-	bool bFloat = header.buffer_format!=BUFFER_FORMAT_WORD && header.buffer_format!=BUFFER_FORMAT_MEMPACKWORD;
-	CreateBuffer(myBuffer,theNX,theNY,theNZ,theNF,bFloat,header.vector_grid,(BufferFormat_t)header.buffer_format);
 
-	ImReadError_t errret = IMREAD_ERR_NO;
 	//fprintf(stderr,"format=%i pack=%i\n",header.buffer_format,header.pack_type);
 	switch (header.pack_type)
 	{
@@ -268,7 +439,7 @@ extern "C" int EXPORT ReadIM7 ( const char* theFileName, BufferType* myBuffer, A
 			errret = SCPackOldIMX_Read(theFile,myBuffer);
 			break;
 		case IM7_PACKTYPE_ZLIB:
-			errret = SCPackZlib_Read(theFile,myBuffer);
+			errret = SCPackZlib_Read(theFile,myBuffer,theStats);
 			break;
 		case IM7_PACKTYPE_FIXED_12_0:
 			errret = SCPackFixedBits_Read( theFile, myBuffer, 12 );
@@ -279,44 +450,181 @@ extern "C" int EXPORT ReadIM7 ( const char* theFileName, BufferType* myBuffer, A
 
 	if (errret==IMREAD_ERR_NO)
 	{
-		AttributeList* tmpAttrList = NULL;
-		AttributeList** useList = (myList!=NULL ? myList : &tmpAttrList);
-        ReadImgAttributes(theFile, useList);
-		AttributeList* ptr = *useList;
-		/*while (ptr!=NULL)*/
-		while (ptr->name!='\x00')
+		if (theStats)
 		{
-			//fprintf(stderr,"%s: %s\n",ptr->name,ptr->value);
-			if (strncmp(ptr->name,"_SCALE_",7)==0)
-			{
-				switch (ptr->name[7])
-				{
-					case 'X':	Scale_Read( ptr->value, &myBuffer->scaleX );	break;
-					case 'Y':	Scale_Read( ptr->value, &myBuffer->scaleY );	break;
-					case 'I':	Scale_Read( ptr->value, &myBuffer->scaleI );	break;
-				}
-			}
-			ptr = ptr->next;
+			theStats->t_data += IM7_Lap(&t);
+			theStats->bytes_decoded += Buffer_GetSize(myBuffer);
 		}
-   }
+		IM7_ReadAttributes(theFile, myBuffer, myList);
+		if (theStats)
+		{
+			theStats->t_attributes += IM7_Lap(&t);
+			if (myList!=NULL)
+				theStats->nattributes += IM7_CountAttributes(*myList);
+			long pos = ftell(theFile);
+			if (pos>0)
+				theStats->bytes_read += pos;
+		}
+	}
 
 	fclose(theFile);
 	return errret;
 }
 
 
+extern "C" int EXPORT ScanIM7 ( const char* theFileName, BufferType* myBuffer, AttributeList** myList )
+{
+	FILE* theFile = fopen(theFileName, "rb");
+	// open for binary read
+	if (theFile==NULL)
+	    return IMREAD_ERR_FILEOPEN;
+
+	Image_Header_7 header;
+	if (!fread ((char*)&header, sizeof(header), 1, theFile))
+	{
+        fclose(theFile);
+        return IMREAD_ERR_HEADER;
+    }
+
+	if (IM7_IsIMX(header))
+	{
+		fclose(theFile);
+		return ScanIMX(theFileName,myBuffer,myList);
+	}
+
+	if (header.isSparse)
+	{
+        fclose(theFile);
+        return IMREAD_ERR_FORMAT;
+	}
+
+	IM7_SetBufferInfo(header,myBuffer);
+
+	// skip the data
+	ImReadError_t errret = IMREAD_ERR_NO;
+	long skip = 0;
+	int sourceLen = 0;
+	switch (header.pack_type)
+	{
+		case IM7_PACKTYPE_IMG:
+			skip = (long)Buffer_GetSize(myBuffer);
+			if (header.buffer_format==BUFFER_FORMAT_MEMPACKWORD)
+				skip /= 2;
+			break;
+		case IM7_PACKTYPE_ZLIB:
+			if (!fread( &sourceLen, sizeof(sourceLen), 1, theFile ))
+				errret = IMREAD_ERR_DATA;
+			skip = sourceLen;
+			break;
+		case IM7_PACKTYPE_FIXED_12_0:
+			// 3 words for every 4 pixels, remaining pixels of a row as words
+			skip = (long)sizeof(Word) * myBuffer->totalLines * ((myBuffer->nx/4)*3 + myBuffer->nx%4);
+			break;
+		case IM7_PACKTYPE_IMX:
+			// size of the compressed data is unknown: decode and forget
+			errret = AllocBuffer(myBuffer,NULL,0);
+			if (errret==IMREAD_ERR_NO)
+				errret = SCPackOldIMX_Read(theFile,myBuffer);
+			free(myBuffer->floatArray);
+			myBuffer->floatArray = NULL;
+			break;
+		default:
+			errret = IMREAD_ERR_FORMAT;
+	}
+	if (errret==IMREAD_ERR_NO && fseek(theFile, skip, SEEK_CUR))
+		errret = IMREAD_ERR_DATA;
+
+	if (errret==IMREAD_ERR_NO)
+		IM7_ReadAttributes(theFile, myBuffer, myList);
+
+	fclose(theFile);
+	return errret;
+}
+
+
+// Write the data of myBuffer packed by zlib (compression theLevel), through a fixed size window
+ImReadError_t SCPackZlib_Write( FILE* theFile, BufferType* myBuffer, int theLevel )
+{
+	Bytef dest[IM7_ZLIB_WINDOW];
+	uLongf sourceLen = 0;
+	Bytef *source = Buffer_GetRowAddrAndSize(myBuffer,0,sourceLen);
+	sourceLen *= myBuffer->totalLines;
+
+	// the packed size precedes the data, it is written once known
+	long pos = ftell(theFile);
+	int destLen = 0;
+	if (fwrite( &destLen, sizeof(destLen), 1, theFile )!=1)
+		return IMREAD_ERR_DATA;
+
+	z_stream stream;
+	stream.zalloc = Z_NULL;
+	stream.zfree = Z_NULL;
+	stream.opaque = Z_NULL;
+	if (deflateInit(&stream,theLevel)!=Z_OK)
+		return IMREAD_ERR_MEMORY;
+	stream.next_in = source;
+	stream.avail_in = (uInt)sourceLen;
+
+	int err;
+	do
+	{
+		stream.next_out = dest;
+		stream.avail_out = IM7_ZLIB_WINDOW;
+		err = deflate( &stream, Z_FINISH );
+		size_t n = IM7_ZLIB_WINDOW - stream.avail_out;
+		if (err==Z_STREAM_ERROR || fwrite( dest, 1, n, theFile )!=n)
+		{
+			err = Z_ERRNO;
+			break;
+		}
+	} while (stream.avail_out==0);
+	destLen = (int)stream.total_out;
+	deflateEnd(&stream);
+	if (err!=Z_STREAM_END)
+		return IMREAD_ERR_DATA;
+
+	if (fseek( theFile, pos, SEEK_SET )
+	 || fwrite( &destLen, sizeof(destLen), 1, theFile )!=1
+	 || fseek( theFile, 0, SEEK_END ))
+		return IMREAD_ERR_DATA;
+	return IMREAD_ERR_NO;
+}
+
+
 extern "C" int EXPORT WriteIM7 ( const char* theFileName, bool isPackedIMX, BufferType* myBuffer )
+{
+	return WriteIM7Attr( theFileName, (isPackedIMX ? IM7_PACKTYPE_IMX : IM7_PACKTYPE_IMG), Z_DEFAULT_COMPRESSION, myBuffer, NULL );
+}
+
+
+extern "C" int EXPORT WriteIM7Attr ( const char* theFileName, int thePackType, int theLevel, BufferType* myBuffer, AttributeList* myList )
 {
 	int theNX = myBuffer->nx,
 	    theNY = myBuffer->ny,
 		 theNZ = myBuffer->nz,
 		 theNF = myBuffer->nf;
 
+	int theFormat = myBuffer->image_sub_type;
+	if (theFormat > 0)
+	{	// vector: the rows of all the components are counted in ny
+		const int compN[] = { 1, 9, 2, 10, 3, 14 };
+		if (theFormat > BUFFER_FORMAT_VECTOR_3D_EXTENDED_PEAK || !myBuffer->isFloat)
+			return IMREAD_ERR_FORMAT;
+		theNY /= compN[theFormat];
+	}
+	else
+		theFormat = (myBuffer->isFloat ? BUFFER_FORMAT_FLOAT : BUFFER_FORMAT_WORD);
+	if (myBuffer->isFloat && thePackType==IM7_PACKTYPE_IMX)
+		thePackType = IM7_PACKTYPE_IMG;
+	if (thePackType!=IM7_PACKTYPE_IMG && thePackType!=IM7_PACKTYPE_IMX && thePackType!=IM7_PACKTYPE_ZLIB)
+		return IMREAD_ERR_FORMAT;
+
 	FILE* theFile = fopen(theFileName, "wb");				// open for binary write
 	if (theFile==NULL)
 	   return IMREAD_ERR_FILEOPEN;
 
 	Image_Header_7 header;
+	memset( &header, 0, sizeof(header) );
 	header.version				= 0;
 	header.isSparse			= 0;
 	header.sizeX				= theNX;
@@ -324,12 +632,10 @@ extern "C" int EXPORT WriteIM7 ( const char* theFileName, bool isPackedIMX, Buff
 	header.sizeZ				= theNZ;
 	header.sizeF				= theNF;
 	header.scalarN				= 0;
-	header.vector_grid	 	= 1;
+	header.vector_grid	 	= (theFormat > 0 ? myBuffer->vectorGrid : 1);
 	header.extraFlags			= 0;
-	header.buffer_format 	= (myBuffer->isFloat ? -3 : -4 );
-	if (myBuffer->isFloat)
-		isPackedIMX = false;
-	header.pack_type			= (isPackedIMX ? IM7_PACKTYPE_IMX : IM7_PACKTYPE_IMG);
+	header.buffer_format 	= theFormat;
+	header.pack_type			= thePackType;
 	if (fwrite( &header, sizeof(header), 1, theFile )!=1)
 	{
 		fclose(theFile);
@@ -337,31 +643,38 @@ extern "C" int EXPORT WriteIM7 ( const char* theFileName, bool isPackedIMX, Buff
 	}
 
 	// write data
-	if (isPackedIMX)
-	{
-		int err = WriteIMX( theFile, myBuffer );
-		if (err)
-		{
-			fclose(theFile);
-			return IMREAD_ERR_DATA;
-		}
-	}
-	else
+	ImReadError_t errret = IMREAD_ERR_NO;
+	switch (thePackType)
 	{
-		for (int row=0; row<theNY*theNZ*theNF; row++)
+		case IM7_PACKTYPE_IMX:
+			if (WriteIMX( theFile, myBuffer ))
+				errret = IMREAD_ERR_DATA;
+			break;
+		case IM7_PACKTYPE_ZLIB:
+			errret = SCPackZlib_Write( theFile, myBuffer, theLevel );
+			break;
+		default:
 		{
-			if (myBuffer->isFloat)
-				fwrite( &myBuffer->floatArray[row*theNX], sizeof(float), theNX, theFile );
-			else
-				fwrite( &myBuffer->wordArray[row*theNX], sizeof(Word), theNX, theFile );
+			unsigned long rowLen = 0;
+			for (int row=0; row<myBuffer->totalLines; row++)
+			{
+				Byte *src = Buffer_GetRowAddrAndSize(myBuffer,row,rowLen);
+				if (fwrite( src, 1, rowLen, theFile )!=rowLen)
+				{
+					errret = IMREAD_ERR_DATA;
+					break;
+				}
+			}
 		}
 	}
 
 	// write attributes
-	WriteAttribute_END(theFile);
-	
-	fclose(theFile);
-	return 0;
+	if (errret==IMREAD_ERR_NO)
+		WriteImgAttributes( theFile, false, myList );
+
+	if (fclose(theFile) && errret==IMREAD_ERR_NO)
+		errret = IMREAD_ERR_DATA;
+	return errret;
 }
 
 
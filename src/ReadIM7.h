@@ -59,9 +59,39 @@ typedef struct		// image file header (256 Bytes) for DaVis 7
 #endif
 
 
+// Time spent (s) and bytes handled by the stages of a read, added to by ReadIM7Stats
+typedef struct
+{
+	double	t_open;			// opening of the file and reading of its header
+	double	t_data;			// reading and decoding of the data (and attributes for IMX, IMG and VEC files)
+	double	t_inflate;		// part of t_data spent inflating zlib packed data
+	double	t_attributes;	// reading of the attributes and of the scales
+	size_t	bytes_read;		// bytes read from the file (IM7 and VC7 files)
+	size_t	bytes_packed;	// zlib packed bytes inflated
+	size_t	bytes_decoded;	// bytes of decoded data
+	int		nattributes;	// number of attributes read
+} IM7Stats;
+
+
 // Returns error code ImReadError_t, can read IM7, VC7 and IMX, IMG, VEC
 extern "C" int EXPORT ReadIM7 ( const char* theFileName, BufferType* myBuffer, AttributeList** myList );
+// Same as ReadIM7, but decodes into theArray (theArraySize bytes, not freed by DestroyBuffer) when not NULL.
+// Safe to call concurrently from several threads on different files.
+extern "C" int EXPORT ReadIM7Into ( const char* theFileName, BufferType* myBuffer, AttributeList** myList, void* theArray, size_t theArraySize );
+// Same as ReadIM7Into, adding the timings and counters of the read to theStats (ignored if NULL).
+extern "C" int EXPORT ReadIM7Stats ( const char* theFileName, BufferType* myBuffer, AttributeList** myList, void* theArray, size_t theArraySize, IM7Stats* theStats );
+// Read only the header: fill in size, type and format of myBuffer without allocating its data
+extern "C" int EXPORT ProbeIM7 ( const char* theFileName, BufferType* myBuffer );
+// Same as ProbeIM7, from a header already read (IMREAD_ERR_HEADER for IMX, IMG and VEC headers)
+extern "C" int EXPORT ProbeIM7Header ( const Image_Header_7* theHeader, BufferType* myBuffer );
+// Read header and attributes, skipping the data (decoded then freed for IMX packing).
+// myBuffer is described as by ProbeIM7, with the scales found in the attributes.
+extern "C" int EXPORT ScanIM7 ( const char* theFileName, BufferType* myBuffer, AttributeList** myList );
 extern "C" int EXPORT WriteIM7 ( const char* theFileName, bool isPackedIMX, BufferType* myBuffer );
+// Write an image or a vector field (image_sub_type>0) with thePackType (IMG, IMX or ZLIB, zlib compression
+// theLevel) and the attributes of myList (may be NULL). Returns error code ImReadError_t.
+// Safe to call concurrently from several threads on different files.
+extern "C" int EXPORT WriteIM7Attr ( const char* theFileName, int thePackType, int theLevel, BufferType* myBuffer, AttributeList* myList );
 
 
 #endif //__READIM7_H
@@ -27,6 +27,11 @@
 */
 
 #include "ReadIMX.h"
+#include <locale.h>
+#ifdef __APPLE__
+#include <xlocale.h>
+#endif
+#include <stdlib.h>
 
 #ifdef _LINUX
 #	define max(v1,v2)	(v1 > v2 ? v1 : v2)
@@ -129,10 +134,10 @@ extern "C" void EXPORT SetBufferScale( BufferScaleType* theScale, float theFacto
 }
 
 
-int CreateBuffer( BufferType* myBuffer, int theNX, int theNY, int theNZ, int theNF, int isFloat, int vectorGrid, BufferFormat_t imageSubType )
+void SetBufferInfo( BufferType* myBuffer, int theNX, int theNY, int theNZ, int theNF, int isFloat, int vectorGrid, BufferFormat_t imageSubType )
 {
 	if (myBuffer==NULL)
-		return 0;
+		return;
    myBuffer->isFloat = isFloat;
    myBuffer->nx = theNX;
    myBuffer->ny = theNY;
@@ -141,19 +146,40 @@ int CreateBuffer( BufferType* myBuffer, int theNX, int theNY, int theNZ, int the
    myBuffer->totalLines = theNY*theNZ*theNF;
 	myBuffer->vectorGrid = vectorGrid;
 	myBuffer->image_sub_type = imageSubType;
-   int size = theNX * myBuffer->totalLines;
-   if (isFloat)
-	{
-      myBuffer->floatArray = (float*)malloc(sizeof(float)*size);
-   }
-	else
-	{
-      myBuffer->wordArray = (Word*)malloc(sizeof(Word)*size);
-   }
+	myBuffer->floatArray = NULL;
 	SetBufferScale( &myBuffer->scaleX, 1, 0, "", "pixel" );
 	SetBufferScale( &myBuffer->scaleY, 1, 0, "", "pixel" );
 	SetBufferScale( &myBuffer->scaleI, 1, 0, "", "counts" );
-   return (myBuffer->floatArray!=NULL || myBuffer->wordArray!=NULL);
+}
+
+
+size_t Buffer_GetSize( BufferType* myBuffer )
+{
+	return (size_t)myBuffer->nx * myBuffer->totalLines * (myBuffer->isFloat?sizeof(float):sizeof(Word));
+}
+
+
+int CreateBuffer( BufferType* myBuffer, int theNX, int theNY, int theNZ, int theNF, int isFloat, int vectorGrid, BufferFormat_t imageSubType )
+{
+	if (myBuffer==NULL)
+		return 0;
+	SetBufferInfo( myBuffer, theNX, theNY, theNZ, theNF, isFloat, vectorGrid, imageSubType );
+   return (AllocBuffer(myBuffer,NULL,0)==IMREAD_ERR_NO);
+}
+
+
+ImReadError_t AllocBuffer( BufferType* myBuffer, void* theArray, size_t theArraySize )
+{
+	if (theArray==NULL)
+	{
+		myBuffer->floatArray = (float*)malloc(Buffer_GetSize(myBuffer));
+		return (myBuffer->floatArray!=NULL ? IMREAD_ERR_NO : IMREAD_ERR_MEMORY);
+	}
+	// decode into the caller's memory, which must have exactly the size of the data
+	if (Buffer_GetSize(myBuffer)!=theArraySize)
+		return IMREAD_ERR_SIZE;
+	myBuffer->floatArray = (float*)theArray;
+	return IMREAD_ERR_NO;
 }
 
 
@@ -183,8 +209,8 @@ extern "C" void EXPORT DestroyAttributeList( AttributeList** myList )
 {
 	AttributeList* item = *myList;
 //	while (*myList)
-	while (item->name!='\x00')
-	{
+	while (item->name!=NULL)
+	{
 	    //fprintf(stderr,"%s: %s\n",item->name,item->value);
 		free(item->name);
 		free(item->value);
@@ -210,13 +236,6 @@ Byte* Buffer_GetRowAddrAndSize( BufferType* myBuffer, int theRow, unsigned long
 /*****************************************************************************/
 
 
-typedef enum 
-{
-	BIT8,		// compressed as 8 bit
-	BIT4L,		// compressed to 4 bit left nibble
-	BIT4R,		// compressed to 4 bit right nibble
-	BIT16		// n-uncompressed 2-byte pixels
-} CompressionMode_t;		// compression mode
 /* compression syntax:
 		BIT8: - At start lastvalue = 0 and cmode = BIT8, i.e. it is assumed
 		        that the following bytes are coded with 1 pixel per byte
@@ -233,178 +252,122 @@ typedef enum
 */
 
 
-const size_t PAGESIZE = 0x800;		// Words !  size must not be too big!
+// Value of the 4 bit differences (0x08 is -8, or the end of BIT4 mode in a right nibble)
+static const signed char IMX_nibble[16] = { 0, 1, 2, 3, 4, 5, 6, 7, -8, -7, -6, -5, -4, -3, -2, -1 };
 
-long IMX_pagepos = 0;   // TL 16.12.1999
-
-// read data from the image file to the buffer, reset 2 variables
-// called by SCBuffer:Read
-Word ReadNextPage (FILE* file, Word* page, signed char** bpageadr, Word* count)
+// Decode the pixels of myBuffer from the theSize bytes of packed data at theData
+// (preview excluded). Returns the number of bytes used, 0 if the data is truncated.
+static size_t IMX_Decode( const Byte* theData, size_t theSize, BufferType* myBuffer )
 {
-	IMX_pagepos = ftell(file);
-	if (fread(page, 1, PAGESIZE, file)==0)
-		return 0;			// read error? (not TRUE if EOF)
-	else
-	{	*count = 0;
-		*bpageadr = (signed char*) page;
-		return (Word)(ftell(file) - IMX_pagepos);
+	const Byte* ptr = theData;
+	const Byte* end = theData + theSize;
+	Word* dest = myBuffer->wordArray;
+	const size_t npixels = (size_t)myBuffer->nx * myBuffer->totalLines;
+	size_t n = 0;
+	Word lastvalue = 0;                         // assuming a previous 0
+
+	while (n < npixels)
+	{
+		if (ptr >= end)
+			return 0;
+		const signed char bvalue = (signed char)*ptr++;
+		if (bvalue == -128)                     // exception: one 16-bit pixel
+		{
+			if (end - ptr < 2)
+				return 0;
+			lastvalue = (Word)(ptr[0] | (ptr[1] << 8));
+			dest[n++] = lastvalue;
+			ptr += 2;
+		}
+		else if (bvalue == 127)                 // exception: n 16-bit pixels, n follows
+		{
+			if (ptr >= end)
+				return 0;
+			size_t nbytes = *ptr++;
+			if (nbytes == 0)                    // byte counter wrapping around
+				nbytes = 256;
+			if (nbytes > npixels - n)
+				nbytes = npixels - n;
+			if ((size_t)(end - ptr) < 2*nbytes)
+				return 0;
+			for (size_t k = 0; k < nbytes; k++, ptr += 2)
+				dest[n++] = (Word)(ptr[0] | (ptr[1] << 8));
+			lastvalue = dest[n-1];
+		}
+		else if (bvalue == -127)                // BIT4 mode: 2 pixels per byte
+		{
+			while (n < npixels)
+			{
+				if (ptr >= end)
+					return 0;
+				const Byte nibbles = *ptr++;
+				lastvalue = (Word)(lastvalue + IMX_nibble[nibbles >> 4]);
+				dest[n++] = lastvalue;
+				if (n == npixels || (nibbles & 0x0F) == 0x08)
+					break;                      // 0x08 in right nibble: back to BIT8 mode
+				lastvalue = (Word)(lastvalue + IMX_nibble[nibbles & 0x0F]);
+				dest[n++] = lastvalue;
+			}
+		}
+		else                                    // BIT8 mode: 8 bit difference
+		{
+			lastvalue = (Word)(lastvalue + bvalue);
+			dest[n++] = lastvalue;
+		}
 	}
+	return ptr - theData;
 }
 
 
+// The packed data has no stored length: the rest of the file is read at once,
+// and the file is positioned just after the bytes used.
+// Reentrant, so that several files can be decoded concurrently.
 ImReadError_t SCPackOldIMX_Read( FILE* theFile, BufferType* myBuffer )
 {
-	// Yes. Skip the preview image stored after the header
-	Word bytecount, count, lastvalue, newvalue = 0;
-	signed char *bpageadr, bvalue = 0, newnibble;
-	Byte nx, ny, nbytes = 0;
-	int bline;
-	Word  poge [PAGESIZE];							// input buffer to increase performance
-	Word* page = (Word*)&poge;						// by reducing the # of read operations
-	CompressionMode_t cmode = BIT8;                               // start with BIT8 mode
-
-	if (!fread(&nx,1,1,theFile)) 	goto errexit;	   // read x-size of preview
-	if (!fread(&ny,1,1,theFile))  goto errexit;		// read y-size of preview
-	// Preview: The preview includes the upper 8 bit of a restricted number of pixel.
-	//		int steps = max( myBuffer->nx / 100 + 1, myBuffer->ny / 100 + 1 );
-	//		Byte ny = (myBuffer->ny-1) / steps + 1;
-	//		Byte nx = (myBuffer->nx-1) / steps + 1;
-	//		Byte *myPreview = malloc(sizeof(Byte)*ny*nx);
-	//		for (int y=0; y<ny; y++)
-	//			for (int x=0; x<nx; x++)
-	//				fread(&myPreview[nx*y+x],1,1,theFile);
-	if (fseek( theFile, nx*ny, SEEK_CUR))  goto errexit;	// skip preview
-
-	lastvalue = 0;                              // and assuming a previous 0
-	if ( (bytecount = ReadNextPage(theFile, page, &bpageadr, &count)) == 0 )  goto errexit;
-
-	for (bline = 0; bline < myBuffer->totalLines; bline++ )
+	long start = ftell(theFile);
+	if (start < 0 || fseek(theFile, 0, SEEK_END))
+		return IMREAD_ERR_DATA;
+	long size = ftell(theFile) - start;
+	if (size < 2 || fseek(theFile, start, SEEK_SET))
+		return IMREAD_ERR_DATA;
+	Byte* data = (Byte*)malloc(size);
+	if (data == NULL)
+		return IMREAD_ERR_MEMORY;
+	if (fread(data, 1, size, theFile) != (size_t)size)
 	{
-		Word* rowW = &myBuffer->wordArray[myBuffer->nx * bline];
-		for (int i = 0; i < myBuffer->nx; i++ )
-		{
-			if ( count == bytecount )               // no more bytes left?
-				if ( (bytecount = ReadNextPage(theFile, page, &bpageadr, &count)) == 0 )
-					goto errexit;	// error 5
-			if ( cmode == BIT4L || cmode == BIT8 )  // need new byte
-			{
-				bvalue = *bpageadr++;                 // new value
-				count++;                              // 1 byte processed
-			}
-
-			if ( cmode == BIT4R )                   // process right nibble next
-			{
-				newnibble = bvalue & 0x0F;            // get right nibble
-				cmode = BIT4L;                        // next: left nibble
-				if ( newnibble == 0x08 )              // change back to BIT8
-				{
-					cmode = BIT8;
-					if ( count == bytecount )           // no more bytes left?
-						if ( (bytecount = ReadNextPage(theFile, page, &bpageadr, &count)) == 0 )
-							goto errexit;
-					bvalue = *bpageadr++;               // new value BIT8-mode
-					count++;                            // 1 byte processed
-				}
-				else
-				{
-					if ( newnibble & 0x08 ) newnibble |= 0xF0;  // -1 to -7
-					newvalue = lastvalue + (long)newnibble;
-				}
-			}
-			else if ( cmode == BIT4L )              // process left nibble next
-			{
-				newnibble = bvalue >> 4;
-				if ( newnibble & 0x08 ) newnibble |= 0xF0;    // -1 to -7
-				newvalue = lastvalue + (long)newnibble;       // get left nibble
-				cmode = BIT4R;                        // next: right nibble
-			}
-
-			if ( cmode == BIT8 )                    // BIT8 compression mode
-			{
-				switch ( bvalue )
-				{
-				case -128:                     // exception?
-					cmode = BIT16;              // change to BIT16
-					nbytes = 1;                 // read only 1 pixel
-					break;
-				case 127:                      // exception? n-16-bit values; number of bytes follows
-					if ( count == bytecount )         // no more bytes left?
-						if ( (bytecount = ReadNextPage(theFile, page, &bpageadr, &count)) == 0 )
-							goto errexit;
-					cmode = BIT16;                    // set cmode correctly
-					nbytes = *( (Byte*)bpageadr++ );  // number of bytes
-					count++;                          // 1 byte read
-					break;
-				case -127:                          // change to BIT4 mode
-					if ( count == bytecount )         // no more bytes left?
-						if ( (bytecount = ReadNextPage(theFile, page, &bpageadr, &count)) == 0 )
-							goto errexit;
-					bvalue = *bpageadr++;             // get new byte
-					count++;
-					newnibble = bvalue >> 4;
-					if ( newnibble & 0x08 ) newnibble |= 0xF0; // -1 to -7
-					newvalue = lastvalue + (long)newnibble;    // get left nibble
-					cmode = BIT4R;                    // process right nibble next
-					break;
-				default:
-					newvalue = lastvalue + (long)bvalue;  // get new value, normal mode
-				}
-			}			// if cmode = BIT8
-
-			if ( cmode == BIT16 )                   // nbytes 16-bit pixels
-			{
-				if ( count == bytecount )             // no more bytes left?
-					if ( (bytecount = ReadNextPage(theFile, page, &bpageadr,	&count)) == 0 )
-						goto errexit;		// error 5
-				if ( count == bytecount-1 )           // only one byte left?
-				{                                     // ---> trouble!
-					newvalue = (Word)*(Byte*)bpageadr;  // get low byte first from old page
-					if ( (bytecount = ReadNextPage(theFile, page, &bpageadr,	&count)) == 0 )
-						goto errexit;		// error 5
-					newvalue += ((Word)*(Byte*)bpageadr++) << 8; // get high byte from new page
-					count = 1;                          // one byte used already
-				}
-				else
-				{
-					newvalue = *( (Word*)bpageadr );    // get new value, Word pointer!
-					bpageadr += 2;                      // increment byte pointer
-					count += 2;                         // 2 bytes processed
-				}
-				if ( --nbytes == 0 ) cmode = BIT8;    // decrement counter, change mode
-			}
-
-			if ( i < myBuffer->nx )                     // maybe skip right part
-				rowW[i] = newvalue;
-				//pixbuf.W[bline][i] = newvalue;			// store in pixbuf
-			lastvalue = newvalue;                  // update last value
-
-		} 	// for i
-	}	// for bline
+		free(data);
+		return IMREAD_ERR_DATA;
+	}
 
-	fseek( theFile, IMX_pagepos + ((char*)bpageadr - (char*)page), SEEK_SET );
+	// Skip the preview image: 1 byte nx and ny, then nx*ny bytes holding the
+	// upper 8 bits of a restricted number of pixels
+	size_t preview = 2 + (size_t)data[0] * data[1];
+	size_t used = 0;
+	if (preview <= (size_t)size)
+		used = IMX_Decode(data + preview, size - preview, myBuffer);
+	free(data);
+	if (used == 0 && myBuffer->nx * myBuffer->totalLines > 0)
+		return IMREAD_ERR_DATA;
+
+	fseek( theFile, start + preview + used, SEEK_SET );
 	return IMREAD_ERR_NO;
-
-errexit:
-	return IMREAD_ERR_DATA;
 }
 
 
 extern "C" int EXPORT ReadIMX ( const char* theFileName, BufferType* myBuffer, AttributeList** myList )
 {
-	image_header header;
+	return ReadIMXInto( theFileName, myBuffer, myList, NULL, 0 );
+}
 
-	FILE* theFile = fopen(theFileName, "rb");				// open for binary read
-	if (theFile==NULL)
-	   return IMREAD_ERR_FILEOPEN;
 
+// Read the header and describe the buffer accordingly, without allocating memory
+static ImReadError_t IMX_ReadHeader( FILE* theFile, image_header& header, BufferType* myBuffer )
+{
 	// Read an image in our own IMX or IMG or VEC or VOL format
 	int theNX,theNY,theNZ,theNF;
 	// read and store file header contents
 	if (!fread ((char*)&header, sizeof(header), 1, theFile))
-	{
-      fclose(theFile);
       return IMREAD_ERR_HEADER;
-   }
    
 	int itsVersion	= header.version;
 	//itsDate		= header.date;
@@ -450,10 +413,7 @@ extern "C" int EXPORT ReadIMX ( const char* theFileName, BufferType* myBuffer, A
 	// set new size and type and allocate pixbuf memory
 	//Resize (header.columns, header.rows, IsFloat(), FALSE);
    if (header.imagetype==40)
-	{
-      fclose(theFile);
       return IMREAD_ERR_FORMAT;
-   }
       
    theNF = ((itsVersion>=VER_EXTHEADER && itsVersion<100) ? header.f_dim : 1);
    theNY = (header.rows==-1 ? header.longRows : header.rows);
@@ -461,24 +421,80 @@ extern "C" int EXPORT ReadIMX ( const char* theFileName, BufferType* myBuffer, A
 	theNZ = ((itsVersion>=VER_VOLUME_BUFFER && itsVersion<100) ? header.longZDim : 1);
 
 	if ( header.imagetype == IMAGE_SPARSE_WORD || header.imagetype == IMAGE_SPARSE_FLOAT )
-	{
-      fclose(theFile);
       return IMREAD_ERR_FORMAT;
-   }
 
 	if (itsVersion<VER_VOLUME_BUFFER || itsVersion>=100)
-	{
 		theNY /= theNF;
-		CreateBuffer( myBuffer, theNX, theNY, theNZ, theNF, header.imagetype==IMAGE_FLOAT, header.vector_grid, (BufferFormat_t)header.image_sub_type );
+	SetBufferInfo( myBuffer, theNX, theNY, theNZ, theNF, header.imagetype==IMAGE_FLOAT, header.vector_grid, (BufferFormat_t)header.image_sub_type );
+	return IMREAD_ERR_NO;
+}
+
+
+extern "C" int EXPORT ProbeIMX ( const char* theFileName, BufferType* myBuffer )
+{
+	image_header header;
+
+	FILE* theFile = fopen(theFileName, "rb");				// open for binary read
+	if (theFile==NULL)
+	   return IMREAD_ERR_FILEOPEN;
+	ImReadError_t err = IMX_ReadHeader( theFile, header, myBuffer );
+	fclose(theFile);
+	return err;
+}
+
+
+extern "C" int EXPORT ScanIMX ( const char* theFileName, BufferType* myBuffer, AttributeList** myList )
+{
+	image_header header;
+	ImReadError_t err;
+
+	FILE* theFile = fopen(theFileName, "rb");				// open for binary read
+	if (theFile==NULL)
+	   return IMREAD_ERR_FILEOPEN;
+
+	err = IMX_ReadHeader( theFile, header, myBuffer );
+	if (err==IMREAD_ERR_NO)
+	{
+		if (header.imagetype == IMAGE_IMX)
+		{	// size of the compressed data is unknown: decode and forget
+			err = AllocBuffer( myBuffer, NULL, 0 );
+			if (err==IMREAD_ERR_NO)
+				err = SCPackOldIMX_Read(theFile,myBuffer);
+			free(myBuffer->floatArray);
+			myBuffer->floatArray = NULL;
+		}
+		else if (fseek( theFile, (long)Buffer_GetSize(myBuffer), SEEK_CUR ))
+			err = IMREAD_ERR_DATA;
 	}
-	else
+	if (err==IMREAD_ERR_NO && myList)
+		ReadImgAttributes(theFile,myList);
+
+	fclose(theFile);
+	return err;
+}
+
+
+extern "C" int EXPORT ReadIMXInto ( const char* theFileName, BufferType* myBuffer, AttributeList** myList, void* theArray, size_t theArraySize )
+{
+	image_header header;
+	ImReadError_t err;
+
+	FILE* theFile = fopen(theFileName, "rb");				// open for binary read
+	if (theFile==NULL)
+	   return IMREAD_ERR_FILEOPEN;
+
+	err = IMX_ReadHeader( theFile, header, myBuffer );
+	if (err==IMREAD_ERR_NO)
+		err = AllocBuffer( myBuffer, theArray, theArraySize );
+	if (err!=IMREAD_ERR_NO)
 	{
-		CreateBuffer( myBuffer, theNX,theNY,theNZ,theNF, header.imagetype==IMAGE_FLOAT, header.vector_grid, (BufferFormat_t)header.image_sub_type );
+		fclose(theFile);
+		return err;
 	}
 
 	if (header.imagetype == IMAGE_IMX)				// compressed (IMX) file ?
 	{
-		ImReadError_t err = SCPackOldIMX_Read(theFile,myBuffer);
+		err = SCPackOldIMX_Read(theFile,myBuffer);
 		if (err!=IMREAD_ERR_NO)
 		{
 			fclose(theFile);
@@ -581,6 +597,57 @@ void Attribute_BreakToNull( char* data, int size )
 }
 
 
+// Store the attribute of an item of type theType (theSize bytes of data, null terminated)
+static void Attribute_SetItem( AttributeList** myList, int theType, char* data, int theSize )
+{
+	switch (theType) {
+	case IEH_END:
+		break;
+	case IEH_SCALE_X:
+		Attribute_NullToBreak(data,theSize);
+		SetAttribute(myList,"_SCALE_X",data);
+		break;
+	case IEH_SCALE_Y:
+		Attribute_NullToBreak(data,theSize);
+		SetAttribute(myList,"_SCALE_Y",data);
+		break;
+	case IEH_SCALE_Z:
+		Attribute_NullToBreak(data,theSize);
+		SetAttribute(myList,"_SCALE_Z",data);
+		break;
+	case IEH_SCALE_I:
+		Attribute_NullToBreak(data,theSize);
+		SetAttribute(myList,"_SCALE_I",data);
+		break;
+	case IEH_SCALE_F:
+		Attribute_NullToBreak(data,theSize);
+		SetAttribute(myList,"_SCALE_F",data);
+		break;
+	case IEH_COMMENT:
+		SetAttribute(myList,"_COMMENT",data);
+		break;
+	case IEH_TIME:
+		SetAttribute(myList,"_TIME",data);
+		break;
+	case IEH_DATE:
+		SetAttribute(myList,"_DATE",data);
+		break;
+	case IEH_ATTRIBUTE:
+	{
+		char* value_pos = strchr(data,'=');
+		if (value_pos)
+		{
+			*value_pos = '\0';
+			SetAttribute( myList, data, value_pos+1 );
+		}
+		break;
+	}
+	default:
+		break;
+	}
+}
+
+
 int ReadImgAttributes( FILE* theFile, AttributeList** myList )
 {
     image_extheader item;
@@ -599,53 +666,7 @@ int ReadImgAttributes( FILE* theFile, AttributeList** myList )
         }
 		if (data)
 		{
-			switch (item.type) {
-			case IEH_END:
-				break;
-			case IEH_SCALE_X:
-				Attribute_NullToBreak(data,item.size);
-				SetAttribute(myList,"_SCALE_X",data);
-				break;
-			case IEH_SCALE_Y:
-				Attribute_NullToBreak(data,item.size);
-				SetAttribute(myList,"_SCALE_Y",data);
-				break;
-			case IEH_SCALE_Z:
-				Attribute_NullToBreak(data,item.size);
-				SetAttribute(myList,"_SCALE_Z",data);
-				break;
-			case IEH_SCALE_I:
-				Attribute_NullToBreak(data,item.size);
-				SetAttribute(myList,"_SCALE_I",data);
-				break;
-			case IEH_SCALE_F:
-				Attribute_NullToBreak(data,item.size);
-				SetAttribute(myList,"_SCALE_F",data);
-				break;
-			case IEH_COMMENT:
-				SetAttribute(myList,"_COMMENT",data);
-				break;
-			case IEH_TIME:
-				SetAttribute(myList,"_TIME",data);
-				break;
-			case IEH_DATE:
-				SetAttribute(myList,"_DATE",data);
-				break;
-			case IEH_ATTRIBUTE:
-            {
-                char* value_pos = strchr(data,'=');
-                if (value_pos)
-				{
-                    *value_pos = '\0';
-                    SetAttribute( myList, data, value_pos+1 );
-                }
-                break;
-            }
-            default:
-            {
-                break;
-            }
-            }
+			Attribute_SetItem(myList,item.type,data,item.size);
 		    free(data);
 		}
    }
@@ -653,6 +674,192 @@ int ReadImgAttributes( FILE* theFile, AttributeList** myList )
 }
 
 
+extern "C" int EXPORT ParseImgAttributes( const char* theData, size_t theSize, AttributeList** myList )
+{
+	image_extheader item;
+	size_t pos = 0;
+	while (pos+sizeof(item)<=theSize)
+	{
+		memcpy(&item,theData+pos,sizeof(item));
+		pos += sizeof(item);
+		if (item.size>0)
+		{
+			if ((size_t)item.size>theSize-pos)
+				return -1;  // "extended header: no tag data"
+			char* data = (char*)malloc(item.size+1);
+			memcpy(data,theData+pos,item.size);
+			data[item.size] = 0; // final 0-byte for strings
+			pos += item.size;
+			Attribute_SetItem(myList,item.type,data,item.size);
+			free(data);
+		}
+	}
+	return 0;
+}
+
+
+static bool Attribute_Matches( const char* theName, const char* theNames )
+{
+	if (theNames==NULL)
+		return true;
+	for (const char* p=theNames; *p!='\0'; p+=strlen(p)+1)
+	{
+		size_t len = strlen(p);
+		if (p[len-1]=='*' ? strncmp(theName,p,len-1)==0 : strcmp(theName,p)==0)
+			return true;
+	}
+	return false;
+}
+
+
+extern "C" size_t EXPORT SerializeAttributeList( const AttributeList* myList, const char* theNames, char* theData, size_t theSize )
+{
+	size_t total = 0;
+	const AttributeList* ptr;
+	for (ptr=myList; ptr!=NULL && ptr->name!=NULL; ptr=ptr->next)
+		if (Attribute_Matches(ptr->name,theNames))
+			total += strlen(ptr->name) + strlen(ptr->value) + 2;
+	if (theData==NULL || total>theSize)
+		return total;
+	for (ptr=myList; ptr!=NULL && ptr->name!=NULL; ptr=ptr->next)
+	{
+		if (!Attribute_Matches(ptr->name,theNames))
+			continue;
+		size_t len = strlen(ptr->name) + 1;
+		memcpy(theData,ptr->name,len);
+		theData += len;
+		len = strlen(ptr->value) + 1;
+		memcpy(theData,ptr->value,len);
+		theData += len;
+	}
+	return total;
+}
+
+
+static bool Text_IsBlank( char c )
+{
+	return c==' ' || c=='\t' || c=='\r' || c=='\v' || c=='\f';
+}
+
+// Locale "C" of strtod, independent of the locale of the process
+#ifdef _WIN32
+static _locale_t Text_Locale = _create_locale(LC_NUMERIC, "C");
+#define Text_strtod(theText,theEnd) _strtod_l(theText,theEnd,Text_Locale)
+#else
+static locale_t Text_Locale = newlocale(LC_NUMERIC_MASK, "C", (locale_t)0);
+#define Text_strtod(theText,theEnd) strtod_l(theText,theEnd,Text_Locale)
+#endif
+
+// Number of the token [theStart,theEnd[ by strtod, the decimal separator theDecimal being the
+// only one accepted
+static bool Text_ParseStrtod( const char* theStart, const char* theEnd, char theDecimal, double* theValue )
+{
+	char buffer[64];
+	size_t len = theEnd - theStart;
+	for (size_t i=0; i<len; i++)
+		if ((theStart[i]=='.' || theStart[i]==',') && theStart[i]!=theDecimal)
+			return false;
+	char* token = (len<sizeof(buffer) ? buffer : (char*)malloc(len+1));
+	if (token==NULL)
+		return false;
+	for (size_t i=0; i<len; i++)
+		token[i] = (theStart[i]==theDecimal ? '.' : theStart[i]);
+	token[len] = '\0';
+	char* end;
+	*theValue = Text_strtod(token,&end);
+	bool valid = (end==token+len);
+	if (token!=buffer)
+		free(token);
+	return valid;
+}
+
+// Number of the token [theStart,theEnd[, exact in double precision: the significant digits (at
+// most 15) are gathered in an integer scaled by a single product or quotient by a power of 10
+// (at most 22), both exact, or read by strtod otherwise.
+static bool Text_ParseNumber( const char* theStart, const char* theEnd, char theDecimal, double* theValue )
+{
+	static const double powers[23] = { 1e0, 1e1, 1e2, 1e3, 1e4, 1e5, 1e6, 1e7, 1e8, 1e9, 1e10,
+		1e11, 1e12, 1e13, 1e14, 1e15, 1e16, 1e17, 1e18, 1e19, 1e20, 1e21, 1e22 };
+	const char* ptr = theStart;
+	bool negative = false;
+	if (ptr<theEnd && (*ptr=='-' || *ptr=='+'))
+		negative = (*ptr++=='-');
+	double mantissa = 0;
+	int digits = 0, significant = 0, exponent = 0;
+	for (; ptr<theEnd && *ptr>='0' && *ptr<='9'; ptr++, digits++)
+		if (significant || *ptr!='0')
+		{
+			mantissa = mantissa*10 + (*ptr-'0');
+			significant++;
+		}
+	if (ptr<theEnd && *ptr==theDecimal)
+		for (ptr++; ptr<theEnd && *ptr>='0' && *ptr<='9'; ptr++, digits++)
+		{
+			if (significant || *ptr!='0')
+			{
+				mantissa = mantissa*10 + (*ptr-'0');
+				significant++;
+			}
+			exponent--;
+		}
+	if (ptr<theEnd && digits && (*ptr=='e' || *ptr=='E'))
+	{
+		const char* start = ++ptr;
+		bool negexp = false;
+		int value = 0;
+		if (ptr<theEnd && (*ptr=='-' || *ptr=='+'))
+			negexp = (*ptr++=='-');
+		for (; ptr<theEnd && *ptr>='0' && *ptr<='9' && value<10000; ptr++)
+			value = value*10 + (*ptr-'0');
+		if (ptr==start || (ptr==start+1 && (*start=='-' || *start=='+')))
+			return false;
+		exponent += (negexp ? -value : value);
+	}
+	if (ptr!=theEnd || !digits || significant>15 || exponent<-22 || exponent>22)
+		return Text_ParseStrtod(theStart,theEnd,theDecimal,theValue);
+	mantissa = (exponent<0 ? mantissa/powers[-exponent] : mantissa*powers[exponent]);
+	*theValue = (negative ? -mantissa : mantissa);
+	return true;
+}
+
+extern "C" int EXPORT ParseDecimalText( const char* theText, size_t theSize, char theDecimal, int theColumns, double* theValues, size_t theCount, size_t* theParsed )
+{
+	const char* ptr = theText;
+	const char* end = theText + theSize;
+	size_t count = 0;
+	int column = 0;
+	*theParsed = 0;
+	while (ptr<end)
+	{
+		if (Text_IsBlank(*ptr))
+		{
+			ptr++;
+			continue;
+		}
+		if (*ptr=='\n')
+		{
+			if (column!=0 && column!=theColumns)
+				return IMREAD_ERR_SIZE;
+			column = 0;
+			ptr++;
+			continue;
+		}
+		const char* start = ptr;
+		while (ptr<end && *ptr!='\n' && !Text_IsBlank(*ptr))
+			ptr++;
+		if (count==theCount || column==theColumns)
+			return IMREAD_ERR_SIZE;
+		if (!Text_ParseNumber(start,ptr,theDecimal,theValues+count))
+			return IMREAD_ERR_DATA;
+		*theParsed = ++count;
+		column++;
+	}
+	if (column!=0 && column!=theColumns)
+		return IMREAD_ERR_SIZE;
+	return IMREAD_ERR_NO;
+}
+
+
 void WriteAttribute_ITEM( FILE* theFile, type_extheader t, int l, const char* d )
 {   
    image_extheader item;
@@ -667,11 +874,14 @@ void WriteAttribute_ITEM( FILE* theFile, type_extheader t, int l, const char* d
 	*/
 }
 
-void WriteAttribute_SCALE( FILE* theFile, type_extheader t, char* value )
+void WriteAttribute_SCALE( FILE* theFile, type_extheader t, const char* value )
 {   
 	int len = strlen(value);
-	Attribute_BreakToNull( value, len );
-	WriteAttribute_ITEM( theFile, IEH_SCALE_X, len, value );
+	char* data = (char*)malloc(len+1);
+	strcpy(data,value);
+	Attribute_BreakToNull( data, len );
+	WriteAttribute_ITEM( theFile, t, len, data );
+	free(data);
 }
 
 void WriteAttribute_END( FILE *theFile )
@@ -30,7 +30,8 @@ typedef enum
 	IMREAD_ERR_HEADER,	// error while reading the header
 	IMREAD_ERR_FORMAT,	// file format not read by this DLL
 	IMREAD_ERR_DATA,	// data reading error
-	IMREAD_ERR_MEMORY	// out of memory
+	IMREAD_ERR_MEMORY,	// out of memory
+	IMREAD_ERR_SIZE		// destination array does not match the data size
 } ImReadError_t;
 
 
@@ -99,7 +100,12 @@ enum	Image_t	// type in header of IMX files
 };
 
 Byte* Buffer_GetRowAddrAndSize( BufferType* myBuffer, int theRow, unsigned long &theRowLength );
+size_t Buffer_GetSize( BufferType* myBuffer );
+void SetBufferInfo( BufferType* myBuffer, int theNX, int theNY, int theNZ, int theNF, int isFloat, int vectorGrid, BufferFormat_t imageSubType );
 int  CreateBuffer( BufferType* myBuffer, int theNX, int theNY, int theNZ, int theNF, int isFloat, int vectorGrid, BufferFormat_t imageSubType );
+// Allocate the data memory of a buffer described by SetBufferInfo, or use theArray
+// (of theArraySize bytes) when not NULL
+ImReadError_t AllocBuffer( BufferType* myBuffer, void* theArray, size_t theArraySize );
 extern "C" void EXPORT SetBufferScale( BufferScaleType* theScale, float theFactor, float theOffset, const char* theDesc, const char* theUnit );
 
 //! Destroy the data structure creacted by ReadIMX().
@@ -109,6 +115,18 @@ extern "C" void EXPORT DestroyAttributeList( AttributeList** myList );
 void WriteAttribute_END( FILE *theFile );
 
 int ReadImgAttributes( FILE* theFile, AttributeList** myList );
+// Same as ReadImgAttributes, from the theSize bytes of theData
+extern "C" int EXPORT ParseImgAttributes( const char* theData, size_t theSize, AttributeList** myList );
+// Copy the names and values of the attributes of myList (in the order of the list) into theData as
+// name\0value\0 pairs, keeping only the names listed in theNames if not NULL (names terminated by \0,
+// the list by an empty name, a final '*' matching any suffix). Returns the number of bytes needed:
+// nothing is copied if theData is NULL or theSize is smaller.
+extern "C" size_t EXPORT SerializeAttributeList( const AttributeList* myList, const char* theNames, char* theData, size_t theSize );
+// Parse the numbers separated by blanks of the theSize bytes of theText (decimal separator
+// theDecimal) into theValues, by lines of theColumns numbers, the empty lines being skipped.
+// *theParsed returns the number of values parsed. Returns IMREAD_ERR_DATA on an incorrect number,
+// IMREAD_ERR_SIZE on a line of another number of columns or on more than theCount values.
+extern "C" int EXPORT ParseDecimalText( const char* theText, size_t theSize, char theDecimal, int theColumns, double* theValues, size_t theCount, size_t* theParsed );
 int WriteImgAttributes( FILE* theFile, bool isIM6, AttributeList* myList );
 
 ImReadError_t SCPackOldIMX_Read( FILE* theFile, BufferType* myBuffer );
@@ -118,6 +136,12 @@ int WriteIMX( FILE *theFile, BufferType* myBuffer );
 
 // Read file of type IMG/IMX/VEC, returns error code ImReadError_t
 extern "C" int EXPORT ReadIMX ( const char* theFileName, BufferType* myBuffer, AttributeList** myList );
+// Same as ReadIMX, but decodes into theArray (not freed by DestroyBuffer) when not NULL
+extern "C" int EXPORT ReadIMXInto ( const char* theFileName, BufferType* myBuffer, AttributeList** myList, void* theArray, size_t theArraySize );
+// Read only the header: fill in size, type and format of myBuffer without allocating its data
+extern "C" int EXPORT ProbeIMX ( const char* theFileName, BufferType* myBuffer );
+// Read header and attributes, skipping the data (decoded then freed for IMX files)
+extern "C" int EXPORT ScanIMX ( const char* theFileName, BufferType* myBuffer, AttributeList** myList );
 
 // Write file of type IMG or IMX, returns error code ImReadError_t
 extern "C" int EXPORT WriteIMG( const char* theFileName, BufferType* myBuffer );
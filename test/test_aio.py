@@ -0,0 +1,52 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+#Copyright (C) 2010 Fabricio Silva
+
+"""
+Reading files from asyncio coroutines.
+"""
+
+import os, sys, asyncio
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import numpy as np
+import libim7 as im7
+
+here = os.path.dirname(os.path.abspath(__file__))
+lFiles = [os.path.join(here, tmp) for tmp in \
+    ('test_IMX.IM7', 'test_IMX.imx', 'PTV_B00013.VC7', 'SOV2_01_100_davis.VC7')]
+
+def test_areadim7():
+    async def main():
+        return await asyncio.gather(*[im7.areadim7(el, step=2) for el in lFiles])
+    for fname, (buf, att) in zip(lFiles, asyncio.run(main())):
+        ref, att_ref = im7.readim7(fname)
+        assert np.array_equal(buf.blocks, ref.blocks[:,::2,::2])
+
+def test_aiter():
+    missing = os.path.join(here, 'missing.VC7')
+
+    async def notifications():
+        # Paths coming slowly, as from a file watcher
+        for fname in lFiles*2+[missing]:
+            await asyncio.sleep(.001)
+            yield fname
+
+    async def main(paths, **kwargs):
+        return [el async for el in im7.aiter_im7(paths, **kwargs)]
+    for paths in (lFiles*2, notifications()):
+        results = asyncio.run(main(paths, concurrency=3, return_exceptions=True))
+        assert [el[0] for el in results[:8]] == lFiles*2
+        for path, buf, att in results[:8]:
+            assert np.array_equal(buf.blocks, im7.readim7(path)[0].blocks)
+    assert results[8][0] == missing and isinstance(results[8][1], IOError)
+    try:
+        asyncio.run(main([missing]+lFiles))
+    except IOError:
+        pass
+    else:
+        raise AssertionError("Missing file read.")
+
+if __name__=='__main__':
+    test_areadim7()
+    test_aiter()
@@ -0,0 +1,90 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+#Copyright (C) 2010 Fabricio Silva
+
+"""
+Reading of the text exports of Davis (.txt and Tecplot .dat), compared to
+the VC7 file.
+"""
+
+import os, sys, io, shutil, tempfile
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import numpy as np
+import libim7 as im7
+
+here = os.path.dirname(os.path.abspath(__file__))
+
+def test_txt_dat():
+    buf, att = im7.readim7(os.path.join(here, 'SOV2_01_100_davis.VC7'))
+    txt, att_txt = im7.read_davis_txt(os.path.join(here, 'SOV2_01_100_davis.txt'))
+    dat, att_dat = im7.read_davis_dat(os.path.join(here, 'SOV2_01_100_davis.dat'))
+    assert att_txt['type']=='3D-vector'
+    assert txt.units['x']=='mm' and txt.vectorGrid==16
+    assert att_dat['VARIABLES'][:2]==['x', 'y']
+    for field in (txt, dat):
+        assert field.vx.shape==buf.vx.shape
+        assert np.allclose(field.x, buf.x, atol=1e-3)
+        assert np.allclose(field.y, buf.y, atol=1e-3)
+        for key in ('vx', 'vy', 'vz'):
+            assert np.allclose(getattr(field, key), getattr(buf, key), atol=1e-4)
+    assert np.allclose(txt.vmag, dat.vmag, atol=1e-4)
+
+def test_decimal():
+    tmp = tempfile.mkdtemp()
+    try:
+        with open(os.path.join(here, 'SOV2_01_100_davis.txt'), 'rb') as f:
+            header = f.readline()
+            data = f.read()
+        comma = os.path.join(tmp, 'comma.txt')
+        with open(comma, 'wb') as f:
+            f.write(header+data.replace(b'.', b','))
+        ref, att = im7.read_davis_txt(os.path.join(here, 'SOV2_01_100_davis.txt'))
+        for decimal in (None, ','):
+            field, att = im7.read_davis_txt(comma, decimal=decimal)
+            assert np.array_equal(field.vx, ref.vx)
+        # Truncated file
+        with open(comma, 'wb') as f:
+            f.write(header+data[:len(data)//2].rsplit(b'\n', 1)[0]+b'\n')
+        try:
+            im7.read_davis_txt(comma)
+        except ValueError:
+            pass
+        else:
+            raise AssertionError("Truncated file read.")
+    finally:
+        shutil.rmtree(tmp)
+
+def test_loadtxt():
+    from libim7.ascii import _parse
+    fname = os.path.join(here, 'SOV2_01_100_davis.dat')
+    ref = np.loadtxt(fname, skiprows=3)
+    dat, att = im7.read_davis_dat(fname)
+    assert np.array_equal(dat.vx, ref[:,3].reshape((78, 118))[::-1].T)
+    # Values read as by np.loadtxt, whatever the lines cut by the chunks
+    values = np.array([[0., -0., 1e300, 5e-324], [-1.25e-7, 123456789012345678.,
+        .1, 2/3.], [float('nan'), 1e-30, -42., 3.14159e+12]])
+    text = '\n'.join('\t'.join(fmt % v for v in row) \
+        for fmt in ('%g', '%f', '%.17g', '%.6e') for row in values)+'\n'
+    ref = np.loadtxt(text.splitlines())
+    for chunk in (7, 64, 1<<22):
+        out = _parse(io.BytesIO(text.encode()), (12, 1, 4), '.', np.float64,
+            chunk)
+        assert np.array_equal(out.reshape(ref.shape), ref, equal_nan=True)
+    # Only the decimal separator given, also for the numbers read by strtod
+    for text, decimal in ((b'1,5 2.25\n', ','), (b'1.5 2,25\n', '.'),
+                          (b'1,5 1.2345678901234567\n', ',')):
+        try:
+            _parse(io.BytesIO(text), (1, 1, 2), decimal, np.float64)
+        except ValueError:
+            pass
+        else:
+            raise AssertionError("Mixed decimal separators accepted.")
+    out = _parse(io.BytesIO(b'1,5 1,2345678901234567\n'), (1, 1, 2), ',',
+        np.float64)
+    assert np.array_equal(out.ravel(), [1.5, 1.2345678901234567])
+
+if __name__=='__main__':
+    test_txt_dat()
+    test_decimal()
+    test_loadtxt()
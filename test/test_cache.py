@@ -0,0 +1,100 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+#Copyright (C) 2010 Fabricio Silva
+
+"""
+Cache of decoded buffers: eviction within the memory budget, reloading of
+modified files and prefetching.
+"""
+
+import os, sys, shutil, tempfile
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import numpy as np
+import libim7 as im7
+
+here = os.path.dirname(os.path.abspath(__file__))
+
+def make_series(directory, n=4):
+    paths = [os.path.join(directory, 'B%05d.vc7' % ind) for ind in range(n)]
+    for path in paths:
+        shutil.copy(os.path.join(here, 'SOV2_01_100_davis.VC7'), path)
+    return paths
+
+def test_cache():
+    directory = tempfile.mkdtemp()
+    try:
+        paths = make_series(directory)
+        size = im7.readim7(paths[0])[0].get_array().nbytes
+        cache = im7.BufferCache(max_bytes=2*size)
+        buf0, att = cache.get(paths[0])
+        assert cache.get(paths[0])[0] is buf0
+        cache.get(paths[1])
+        assert cache.stats()['bytes'] == 2*size
+        # Components computed meanwhile are accounted for at the next access:
+        # the least recently used entry is evicted and released
+        buf1 = cache.get(paths[1])[0]
+        vx = buf1.vx
+        cache.get(paths[1])
+        assert size+vx.nbytes <= cache.stats()['bytes'] <= 2*size
+        assert paths[0] not in cache and buf0.blocks is None
+        cache.get(paths[2])
+        assert paths[1] not in cache and paths[2] in cache
+        stats = cache.stats()
+        assert (stats['hits'], stats['misses'], stats['evictions']) == (3, 3, 2)
+        # Modified file read again
+        buf2 = cache.get(paths[2])[0]
+        os.utime(paths[2], (0, 0))
+        assert cache.get(paths[2])[0] is not buf2 and buf2.blocks is None
+        assert cache.stats()['misses'] == 4
+        cache.close()
+        assert len(cache) == 0 and cache.stats()['bytes'] == 0
+        # Prefetching of the following files of the directory
+        with im7.BufferCache(max_bytes=10*size, prefetch=2) as cache:
+            cache.get(paths[0])
+            for path in paths[1:]:
+                buf, att = cache.get(path)
+                assert np.array_equal(buf.blocks, im7.readim7(path)[0].blocks)
+            stats = cache.stats()
+            assert (stats['misses'], stats['prefetched']) == (1, 3)
+    finally:
+        shutil.rmtree(directory)
+
+def test_concurrent_insert():
+    " File read by two threads: the entry returned first is kept alive."
+    directory = tempfile.mkdtemp()
+    try:
+        paths = make_series(directory, 1)
+        with im7.BufferCache() as cache:
+            buf, att = cache.get(paths[0])
+            stamp = cache._entries[paths[0]][0]
+            other = im7.readim7(paths[0])
+            entry = cache._insert(paths[0], stamp, other)
+            assert entry[1][0] is buf and buf.blocks is not None
+            assert other[0].blocks is None
+            assert len(cache) == 1 and cache.get(paths[0])[0] is buf
+    finally:
+        shutil.rmtree(directory)
+
+def test_nbytes():
+    directory = tempfile.mkdtemp()
+    try:
+        for name in ('SOV2_01_100_davis.VC7', 'PTV_B00013.VC7'):
+            path = os.path.join(directory, name)
+            shutil.copy(os.path.join(here, name), path)
+            with im7.BufferCache() as cache:
+                buf, att = cache.get(path)
+                buf.get_components()
+                cache.get(path)
+                # Views (vx, vy, vz, peak) and constant vz are not charged
+                expected = buf.get_array().nbytes+buf.components.nbytes
+                if '_choice' in buf.__dict__:
+                    expected += buf._choice.nbytes
+                assert cache.stats()['bytes'] == expected
+    finally:
+        shutil.rmtree(directory)
+
+if __name__=='__main__':
+    test_cache()
+    test_concurrent_insert()
+    test_nbytes()
@@ -0,0 +1,88 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+#Copyright (C) 2010 Fabricio Silva
+
+"""
+Velocity components extracted from extended vector formats.
+"""
+
+import os, sys, shutil, tempfile
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import numpy as np
+import libim7 as im7
+
+here = os.path.dirname(os.path.abspath(__file__))
+
+def test_choice():
+    buf, att = im7.readim7(os.path.join(here, 'SOV2_01_100_davis.VC7'))
+    b = buf.blocks
+    choice = b[0].astype(int)
+    # Reference: selection of the blocks vector by vector
+    ref = np.zeros((3,)+choice.shape)
+    for (iy, ix), c in np.ndenumerate(choice):
+        if 1 <= c <= 5:
+            c = min(c, 4)
+            ref[:, iy, ix] = b[3*c-2:3*c+1, iy, ix]
+    ref[1] *= -1 # reversed y-axis
+    ref = buf.scaleI.offset + ref*buf.scaleI.factor
+    for ind, key in enumerate(('vx', 'vy', 'vz')):
+        assert np.allclose(getattr(buf, key), ref[ind].T[:, ::-1])
+    assert np.allclose(buf.vmag, np.sqrt((ref**2).sum(0)).T[:, ::-1])
+    assert np.array_equal(buf.peak, b[13].T[:, ::-1])
+
+def test_lazy():
+    buf, att = im7.readim7(os.path.join(here, 'PTV_B00013.VC7'))
+    buf.components_dtype = np.float32
+    assert buf.vx.dtype == np.float32
+    assert 'vmag' not in buf.__dict__ and 'vy' not in buf.__dict__
+
+def test_compact():
+    for fname, ncomp in (('PTV_B00013.VC7', 2), ('SOV2_01_100_davis.VC7', 3)):
+        ref, att = im7.readim7(os.path.join(here, fname))
+        buf, att = im7.readim7(os.path.join(here, fname), dtype=np.float16)
+        stack = buf.components
+        assert stack.shape == (ncomp,)+ref.vx.shape
+        assert stack.dtype == np.float16
+        for ind, key in enumerate(('vx', 'vy', 'vz')[:ncomp]):
+            assert np.shares_memory(getattr(buf, key), stack)
+            assert np.allclose(getattr(buf, key), getattr(ref, key), rtol=1e-3,
+                atol=1e-3*abs(getattr(ref, key)).max())
+        if ncomp==2:
+            # Constant vz, with no memory of its own
+            assert not buf.vz.flags.writeable and buf.vz.strides == (0, 0)
+            assert np.array_equal(buf.vz, ref.vz) and buf.vz.shape == ref.vx.shape
+        assert np.allclose(ref.vmag, np.sqrt(ref.vx**2+ref.vy**2+ref.vz**2))
+        buf, att = im7.readim7(os.path.join(here, fname))
+        buf.get_components()
+        assert 'vmag' not in buf.__dict__ and buf.components.dtype == np.float64
+
+def test_peak():
+    " peak has the orientation of the components, (nx, ny)."
+    for fname in ('PTV_B00013.VC7', 'SOV2_01_100_davis.VC7'):
+        buf, att = im7.readim7(os.path.join(here, fname))
+        block = im7.libim7._PeakBlock[buf.header.buffer_format]
+        assert buf.scaleY.factor < 0
+        assert buf.peak.shape == buf.vx.shape
+        assert np.array_equal(buf.peak, buf._orient(buf.blocks[block]))
+        assert np.array_equal(buf.peak, buf.blocks[block].T[:, ::-1])
+    # Positive scale of y: transposed only
+    tmp = tempfile.mkdtemp()
+    try:
+        scaleY = im7.libim7.BufferScale(-buf.scaleY.factor, buf.scaleY.offset,
+            b'', b'[mm]')
+        fname = os.path.join(tmp, 'B00001.VC7')
+        im7.writeim7(fname, np.array(buf.blocks), (buf.scaleX, scaleY,
+            buf.scaleI), buffer_format=buf.header.buffer_format,
+            vector_grid=buf.vectorGrid)
+        new, att = im7.readim7(fname)
+        assert np.array_equal(new.peak, new._orient(new.blocks[block]))
+        assert np.array_equal(new.peak, new.blocks[block].T)
+    finally:
+        shutil.rmtree(tmp)
+
+if __name__=='__main__':
+    test_choice()
+    test_lazy()
+    test_compact()
+    test_peak()
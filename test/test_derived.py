@@ -0,0 +1,73 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+#Copyright (C) 2010 Fabricio Silva
+
+"""
+Quantities derived from the velocity gradients of vector fields.
+"""
+
+import os, sys, shutil, tempfile
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import numpy as np
+import libim7 as im7
+
+here = os.path.dirname(os.path.abspath(__file__))
+
+def test_arrays():
+    x, y = np.mgrid[0:20, 0:30]*.5
+    # Solid body rotation
+    fields = im7.DerivedFields(np.array([-.3*y, .3*x]), spacing=(.5, .5))
+    assert fields.vorticity.dtype==np.float32
+    assert np.allclose(fields.vorticity, .6) and np.allclose(fields.divergence, 0)
+    assert np.allclose(fields.Q, .09) and np.allclose(fields.lambda2, -.09)
+    assert np.allclose(fields.swirling_strength, .3)
+    assert fields.units('Q') is None
+    # Pure strain, in stacks
+    comps = np.stack([np.array([x, -y]), np.array([2*x, -2*y])], axis=1)
+    res = im7.derived_fields(comps, ('Q', 'lambda2', 'strain_rate'),
+        spacing=(.5, .5), dtype=np.float64)
+    assert res['Q'].shape==(2, 20, 30) and res['Q'].dtype==np.float64
+    assert np.allclose(res['Q'][1], -4) and np.allclose(res['lambda2'][0], 1)
+    assert np.allclose(res['strain_rate'][0], 2)
+
+def test_buffers():
+    ref, att = im7.readim7(os.path.join(here, 'SOV2_01_100_davis.VC7'))
+    tmp = tempfile.mkdtemp()
+    try:
+        for sign in (1, -1):
+            scaleX = im7.libim7.BufferScale(sign*ref.scaleX.factor,
+                ref.scaleX.offset, b'', b'[mm]')
+            fname = os.path.join(tmp, 'B%05d.VC7' % (sign+2))
+            blocks = np.zeros((2, 40, 50), dtype=np.float32)
+            im7.writeim7(fname, blocks, (scaleX, ref.scaleY, ref.scaleI),
+                buffer_format=2, vector_grid=8)
+            buf, att = im7.readim7(fname)
+            # Solid body rotation of 2 rad/s about (0, 0), in m/s
+            x, y = np.meshgrid(buf.x*1e-3, buf.y*1e-3, indexing='ij')
+            vx, vy = -2*y, 2*x
+            factor = buf.scaleI.factor
+            blocks[0] = vx[:, ::-1].T/factor
+            blocks[1] = -vy[:, ::-1].T/factor
+            im7.writeim7(fname, blocks, (scaleX, ref.scaleY, ref.scaleI),
+                buffer_format=2, vector_grid=8)
+            buf, att = im7.readim7(fname)
+            assert np.allclose(buf.vx, vx, atol=1e-6)
+            fields = buf.derived
+            assert fields.units('vorticity')=='1/s' and fields.units('Q')=='1/s^2'
+            assert np.allclose(fields.vorticity, 4, rtol=1e-3)
+            assert np.allclose(fields.Q, 4, rtol=1e-3)
+            assert np.allclose(fields.divergence, 0, atol=1e-3)
+            # Replaced components
+            other = im7.DerivedFields(buf, components=2*buf.components)
+            assert np.allclose(other.vorticity, 8, rtol=1e-3)
+            buf.delete()
+        stack = im7.derived_fields([ref, ref], ('vorticity',))['vorticity']
+        assert stack.shape==(2,)+ref.vx.shape
+        assert np.array_equal(stack[0], ref.derived.vorticity)
+    finally:
+        shutil.rmtree(tmp)
+
+if __name__=='__main__':
+    test_arrays()
+    test_buffers()
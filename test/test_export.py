@@ -0,0 +1,88 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+#Copyright (C) 2010 Fabricio Silva
+
+"""
+Export of a series of vector fields to HDF5 and Zarr stores.
+"""
+
+import os, sys, json, shutil, tempfile
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import numpy as np
+import libim7 as im7
+
+here = os.path.dirname(os.path.abspath(__file__))
+
+def make_series(directory, n=5):
+    " Copies of SOV2_01_100_davis.VC7 with scaled blocks."
+    ref, att = im7.readim7(os.path.join(here, 'SOV2_01_100_davis.VC7'))
+    paths = [os.path.join(directory, 'B%05d.vc7' % ind) for ind in range(n)]
+    for ind, path in enumerate(paths):
+        blocks = ref.blocks.copy()
+        blocks[1:] *= ind+1
+        att['_TIME'] = '10:00:%02d.5' % ind
+        im7.writeim7(path, blocks, att=att, buffer_format=5,
+            vector_grid=ref.vectorGrid)
+    return paths
+
+def check_store(group, paths):
+    assert group['vx'].shape[0] == len(paths)
+    for ind, path in enumerate(paths):
+        buf, att = im7.readim7(path)
+        for key in ('vx', 'vy', 'vz', 'peak'):
+            assert np.allclose(group[key][ind], getattr(buf, key))
+        assert np.array_equal(group['choice'][ind], buf._orient(buf.blocks[0]))
+        value = group['attributes'][ind:ind+1][0]
+        assert json.loads(value)['_TIME'] == att['_TIME']
+    assert np.allclose(group['x'][...], buf.x)
+    assert np.allclose(group['y'][...], buf.y)
+    assert np.allclose(group['time'][...], 36000.5+np.arange(len(paths)))
+
+def test_hdf5():
+    try:
+        import h5py
+    except ImportError:
+        return
+    directory = tempfile.mkdtemp()
+    store = os.path.join(directory, 'series.h5')
+    try:
+        paths = make_series(directory)
+        assert im7.export_series(directory, store, chunk_time=2) == 5
+        with h5py.File(store, 'r') as f:
+            check_store(f, paths)
+            assert f['vx'].chunks[0] == 2
+        # Resuming after an interruption during the second chunk
+        with h5py.File(store, 'a') as f:
+            f['vx'][2:4] = 0
+            f['done'][2:4] = 0
+        assert im7.export_series(paths, store, chunk_time=2) == 2
+        with h5py.File(store, 'r') as f:
+            check_store(f, paths)
+        assert im7.export_series(paths, store, chunk_time=2) == 0
+        try:
+            im7.export_series(paths[1:], store)
+        except ValueError:
+            pass
+        else:
+            raise AssertionError("Store of another series accepted.")
+    finally:
+        shutil.rmtree(directory)
+
+def test_zarr():
+    try:
+        import zarr
+    except ImportError:
+        return
+    directory = tempfile.mkdtemp()
+    store = os.path.join(directory, 'series.zarr')
+    try:
+        paths = make_series(directory)
+        assert im7.export_series(paths, store, format='zarr', chunk_time=3) == 5
+        check_store(zarr.open_group(store, mode='r'), paths)
+    finally:
+        shutil.rmtree(directory)
+
+if __name__=='__main__':
+    test_hdf5()
+    test_zarr()
@@ -0,0 +1,134 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+#Copyright (C) 2010 Fabricio Silva
+
+"""
+Frame by frame reading of multi-frame image files.
+"""
+
+import os, sys, io, struct, zlib, tempfile
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import numpy as np
+import libim7 as im7
+
+here = os.path.dirname(os.path.abspath(__file__))
+
+def pack12(frames):
+    " FIXED_12 packing of the rows of frames (the inverse of the reader)."
+    rows = frames.reshape((-1, frames.shape[-1])).astype(np.uint16)
+    nx = rows.shape[1]
+    n4 = nx//4
+    p = [rows[:,ind:4*n4:4] for ind in range(4)]
+    words = np.empty((rows.shape[0], 3*n4+nx%4), dtype='<u2')
+    words[:,0:3*n4:3] = p[0] | (p[1] << 12)
+    words[:,1:3*n4:3] = (p[1] >> 4) | (p[2] << 8)
+    words[:,2:3*n4:3] = (p[2] >> 8) | (p[3] << 4)
+    words[:,3*n4:] = rows[:,4*n4:]
+    return words.tobytes()
+
+def multiframe_copy(frames, dest, pack):
+    " Write frames in an IM7 file with the header of test_IMX.IM7."
+    with open(os.path.join(here, 'test_IMX.IM7'), 'rb') as f:
+        header = bytearray(f.read(256))
+    struct.pack_into('<h', header, 2, im7.libim7.PackTypes[pack])
+    struct.pack_into('<i', header, 8, frames.shape[2])
+    struct.pack_into('<i', header, 12, frames.shape[1])
+    struct.pack_into('<i', header, 20, frames.shape[0])
+    if pack=='IM7_PACKTYPE_ZLIB':
+        data = zlib.compress(frames.astype('<u2').tobytes())
+        data = struct.pack('<i', len(data)) + data
+    elif pack=='IM7_PACKTYPE_FIXED_12_0':
+        data = pack12(frames)
+    else:
+        data = frames.astype('<u2').tobytes()
+    with open(dest, 'wb') as f:
+        f.write(bytes(header) + data)
+
+def test_frames():
+    buf, att = im7.readim7(os.path.join(here, 'test_IMX.IM7'))
+    img = buf.blocks[0] & 0x0FFF
+    # Odd width for the remaining pixels of FIXED_12 rows
+    frames = np.array([img[:100,:203], img[100:200,:203]//2, img[200:300,:203]])
+    fd, dest = tempfile.mkstemp(suffix='.IM7')
+    os.close(fd)
+    try:
+        for pack in ('IM7_PACKTYPE_IMG', 'IM7_PACKTYPE_ZLIB',
+                     'IM7_PACKTYPE_FIXED_12_0'):
+            multiframe_copy(frames, dest, pack)
+            lFrames = list(im7.iter_frames(dest))
+            assert len(lFrames) == 3
+            for ind in range(3):
+                assert np.array_equal(lFrames[ind], frames[ind])
+                assert np.array_equal(im7.read_frame(dest, ind), frames[ind])
+            ref, att = im7.readim7(dest)
+            assert np.array_equal(ref.blocks, frames)
+            if pack=='IM7_PACKTYPE_FIXED_12_0':
+                assert np.array_equal(im7.unpack12(pack12(frames), 203),
+                    frames.reshape((-1, 203)))
+            try:
+                im7.read_frame(dest, 3)
+            except ValueError:
+                pass
+            else:
+                raise AssertionError("Missing frame read.")
+    finally:
+        os.remove(dest)
+    # Single frame files, including IMX packed data
+    for fname in ('test_IMX.IM7', 'test_IMX.imx'):
+        buf, att = im7.readim7(os.path.join(here, fname))
+        assert np.array_equal(im7.read_frame(os.path.join(here, fname)),
+            buf.get_frame(0))
+
+def test_selection():
+    buf, att = im7.readim7(os.path.join(here, 'test_IMX.IM7'))
+    img = buf.blocks[0] & 0x0FFF
+    frames = np.array([img[:100,:203], img[100:200,:203]//2, img[200:300,:203]])
+    fd, dest = tempfile.mkstemp(suffix='.IM7')
+    os.close(fd)
+    try:
+        for pack in ('IM7_PACKTYPE_IMG', 'IM7_PACKTYPE_ZLIB',
+                     'IM7_PACKTYPE_FIXED_12_0', 'IM7_PACKTYPE_IMX'):
+            if pack=='IM7_PACKTYPE_IMX':
+                im7.writeim7(dest, frames, pack='imx')
+            else:
+                multiframe_copy(frames, dest, pack)
+            ref, att = im7.readim7(dest)
+            for roi, step, sel in (((10, 150, 5, None), (3, 2), [2, 0]),
+                                   (None, 4, slice(1, None)),
+                                   ((None, None, 99, 100), None, 1)):
+                buf, att = im7.readim7(dest, roi=roi, step=step, frames=sel)
+                x0, x1, y0, y1 = roi or (None,)*4
+                sx, sy = step if isinstance(step, tuple) else (step, step)
+                expected = frames[sel][..., y0:y1:sy, x0:x1:sx]
+                assert np.array_equal(buf.blocks, expected.reshape(
+                    (-1,)+expected.shape[-2:]))
+                assert buf.nf == buf.blocks.shape[0]
+                assert np.allclose(buf.x, ref.x[x0:x1:sx])
+                assert np.allclose(buf.scaleY(buf.ny, 1),
+                    ref.scaleY(ref.ny, 1)[y0:y1:sy])
+    finally:
+        os.remove(dest)
+    # Vector fields: every other vector of a part of the field
+    for fname in ('PTV_B00013.VC7', 'SOV2_01_100_davis.VC7'):
+        ref, att_ref = im7.readim7(os.path.join(here, fname))
+        with open(os.path.join(here, fname), 'rb') as f:
+            data = f.read()
+        for source in (os.path.join(here, fname), io.BytesIO(data)):
+            buf, att = im7.readim7(source, roi=(2, None, 1, 20), step=2)
+            assert np.array_equal(buf.blocks, ref.blocks[:,1:20:2,2::2])
+            assert np.allclose(buf.x, ref.x[2::2])
+            tmp = buf.scaleY(buf.ny, buf.vectorGrid)
+            assert np.allclose(tmp, ref.scaleY(ref.ny, ref.vectorGrid)[1:20:2])
+            assert att['_SCALE_X'] != att_ref['_SCALE_X']
+            assert buf.vx.shape == (len(buf.x), len(buf.y))
+        try:
+            im7.readim7(os.path.join(here, fname), frames=0)
+        except TypeError:
+            pass
+        else:
+            raise AssertionError("Frames of a vector field read.")
+
+if __name__=='__main__':
+    test_frames()
+    test_selection()
@@ -0,0 +1,68 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+#Copyright (C) 2010 Fabricio Silva
+
+"""
+Decoding of the old IMX compression, checked against the data decoded by the
+former (page by page) decoder.
+"""
+
+import os, sys, hashlib, tempfile
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import numpy as np
+import libim7 as im7
+
+here = os.path.dirname(os.path.abspath(__file__))
+lFiles = [os.path.join(here, tmp) for tmp in ('test_IMX.IM7', 'test_IMX.imx')]
+# MD5 of the little endian words decoded by the former decoder
+checksum = 'b2b15eeb1ee99cc7c9b1379c1315678f'
+
+def test_checksum():
+    for fname in lFiles:
+        buf, att = im7.readim7(fname)
+        assert buf.blocks.shape == (1, 1024, 1376)
+        data = buf.blocks.astype('<u2').tobytes()
+        assert hashlib.md5(data).hexdigest() == checksum
+        # The attributes following the data are found
+        assert 'BufferName' in att
+
+def test_truncated():
+    with open(lFiles[0], 'rb') as f:
+        data = f.read(100000)
+    fd, dest = tempfile.mkstemp(suffix='.IM7')
+    os.write(fd, data)
+    os.close(fd)
+    try:
+        im7.readim7(dest)
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("Truncated data accepted.")
+    finally:
+        os.remove(dest)
+
+def test_preview():
+    preview = im7.read_preview(lFiles[0])
+    assert preview.shape == (74, 99) and preview.dtype == np.uint8
+    buf, att = im7.readim7(lFiles[0])
+    assert np.array_equal(preview, buf.blocks[0,::14,::14] >> 4)
+    # Same preview computed from the image when not stored
+    fd, dest = tempfile.mkstemp(suffix='.IM7')
+    os.close(fd)
+    try:
+        im7.writeim7(dest, buf, pack='zlib')
+        assert np.array_equal(im7.read_preview(dest), preview)
+        sheet = im7.contact_sheet(lFiles+[dest, os.path.join(here, 'missing.IM7'),
+            os.path.join(here, 'PTV_B00013.VC7')], columns=2)
+        assert sheet.shape == (3*74, 2*99)
+        assert np.array_equal(sheet[74:148,:99], preview)
+        assert not sheet[74:148,99:].any()
+        assert sheet[148:180,:32].any() and not sheet[180:,:].any()
+    finally:
+        os.remove(dest)
+
+if __name__=='__main__':
+    test_checksum()
+    test_truncated()
+    test_preview()
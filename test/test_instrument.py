@@ -0,0 +1,50 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+#Copyright (C) 2010 Fabricio Silva
+
+"""
+Statistics of the stages of the reads.
+"""
+
+import os, sys
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import libim7 as im7
+
+here = os.path.dirname(os.path.abspath(__file__))
+
+def test_stats():
+    filename = os.path.join(here, 'SOV2_01_100_davis.VC7')
+    records = []
+    callback = lambda stage, seconds, counters: records.append(stage)
+    im7.reset_stats()
+    im7.enable_stats(callback)
+    try:
+        buf, att = im7.readim7(filename)
+        buf.get_components()
+        s = im7.stats()
+        for stage in ('open', 'data', 'inflate', 'attributes', 'attribute_list',
+                      'scales', 'readim7', 'get_components'):
+            assert s[stage]['count']==1, stage
+            assert stage in records
+        assert s['data']['bytes_decoded']==buf.get_array().nbytes
+        assert s['data']['bytes_read']==os.path.getsize(filename)
+        assert s['inflate']['bytes_packed']>0
+        assert s['attributes']['attributes']==len(att)
+        assert s['readim7']['seconds']>=s['data']['seconds']
+        buf.vmag
+        assert im7.stats()['lazy.vmag']['count']==1
+        # Disabled: nothing recorded
+        im7.disable_stats()
+        n = len(records)
+        im7.readim7(filename)
+        assert len(records)==n and im7.stats()['readim7']['count']==1
+        im7.reset_stats()
+        assert im7.stats()=={}
+    finally:
+        im7.disable_stats(callback)
+        im7.disable_stats()
+        im7.reset_stats()
+
+if __name__=='__main__':
+    test_stats()
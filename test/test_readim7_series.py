@@ -0,0 +1,47 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+#Copyright (C) 2010 Fabricio Silva
+
+"""
+Parallel reading of series of files into one array with readim7_series.
+"""
+
+import os, sys, shutil, tempfile
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import numpy as np
+import libim7 as im7
+
+here = os.path.dirname(os.path.abspath(__file__))
+lFiles = [os.path.join(here, tmp) for tmp in \
+    ('test_IMX.IM7', 'test_IMX.imx', 'PTV_B00013.VC7', 'SOV2_01_100_davis.VC7')]
+
+def test_series():
+    for fname in lFiles:
+        ref, att_ref = im7.readim7(fname)
+        stack, scales, atts = im7.readim7_series([fname]*5, workers=3)
+        assert stack.shape == (5,)+ref.blocks.shape
+        for ind in range(5):
+            assert np.array_equal(stack[ind], ref.blocks)
+            assert atts[ind] == att_ref
+            assert scales[ind][0].factor == ref.scaleX.factor
+
+def test_order():
+    directory = tempfile.mkdtemp()
+    try:
+        paths = []
+        for ind in range(7):
+            paths.append(os.path.join(directory, 'B%05d.im7' % ind))
+            frame = np.full((16, 24), ind, dtype=np.uint16)
+            im7.writeim7(paths[-1], frame, att={'Index':str(ind)})
+        stack, scales, atts = im7.readim7_series(paths, workers=3)
+        assert stack.shape == (7, 1, 16, 24)
+        for ind in range(7):
+            assert (stack[ind] == ind).all()
+            assert atts[ind]['Index'] == str(ind)
+    finally:
+        shutil.rmtree(directory)
+
+if __name__=='__main__':
+    test_series()
+    test_order()
@@ -0,0 +1,100 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+#Copyright (C) 2010 Fabricio Silva
+
+"""
+Header and attributes scanning, without decoding the data.
+"""
+
+import os, sys, shutil, tempfile
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import libim7 as im7
+
+here = os.path.dirname(os.path.abspath(__file__))
+lFiles = [os.path.join(here, tmp) for tmp in \
+    ('test_IMX.IM7', 'test_IMX.imx', 'PTV_B00013.VC7', 'SOV2_01_100_davis.VC7')]
+
+def test_scan():
+    for fname in lFiles:
+        buf, att = im7.readim7(fname)
+        scan, scan_att = im7.scan_im7(fname)
+        assert scan_att == att
+        assert scan.get_shape() == buf.blocks.shape
+        for el in 'XYI':
+            s0, s1 = getattr(buf, 'scale%s' % el), getattr(scan, 'scale%s' % el)
+            assert (s0.factor, s0.offset, s0.unit) == (s1.factor, s1.offset, s1.unit)
+
+def test_attributes():
+    fname = os.path.join(here, 'SOV2_01_100_davis.VC7')
+    buf, att = im7.readim7(fname)
+    assert isinstance(att, im7.Attributes) and len(att) == 56
+    assert att['_DATE'] == '04.01.10'
+    assert att['AcqTime0'] == b'431.6 \xb5s'
+    assert att.value('PivCalculationTime') == 38972.6
+    assert att.value('FrameDt0') == '3 us'
+    factor, offset, unit, description = att.value('_SCALE_I')
+    assert (unit, description) == ('m/s', 'velocity')
+    assert abs(factor-buf.scaleI.factor) < 1e-6
+    # Restricted to some names, with the scales
+    tmp, part = im7.readim7(fname, attributes=['Frame*', '_DATE'])
+    assert set(part) == set(key for key in att if key.startswith('Frame') \
+        or key.startswith('_SCALE_') or key == '_DATE')
+    assert all(part[key] == att[key] for key in part)
+    part['_DATE'] = 'now'
+    assert part.value('_DATE') == 'now' and att['_DATE'] == '04.01.10'
+
+def test_scan_many():
+    lScan = im7.scan_many(lFiles, workers=2)
+    assert [el[0].file for el in lScan] == lFiles
+
+def test_index():
+    directory = tempfile.mkdtemp()
+    try:
+        for fname in lFiles:
+            shutil.copy(fname, directory)
+        with open(lFiles[-1], 'rb') as f:
+            data = f.read()
+        with im7.ArchiveIndex(directory) as index:
+            assert len(index) == len(lFiles)
+            fmt = im7.libim7.Formats['FormatsVECTOR_3D_EXTENDED_PEAK']
+            assert [os.path.basename(el) for el in index.query(buffer_format=fmt)] \
+                == ['SOV2_01_100_davis.VC7']
+            entry = index.entry('PTV_B00013.VC7')
+            assert entry['nx'] == 32 and entry['attributes']
+            entry = index.entry('test_IMX.imx')
+            assert entry['pack_type'] is None
+            assert entry['image_type'] == im7.libim7.ImageTypes['IMAGE_IMX']
+            assert index.query(where='pack_type=?',
+                params=(entry['image_type'],)) == []
+        # Reopening only scans modified files
+        os.remove(os.path.join(directory, 'test_IMX.imx'))
+        os.utime(os.path.join(directory, 'PTV_B00013.VC7'), (0, 0))
+        with im7.ArchiveIndex(directory, update=False) as index:
+            assert index.update() == ['PTV_B00013.VC7']
+            assert len(index) == len(lFiles)-1
+        # Truncated and corrupt files are skipped, the others indexed
+        with open(os.path.join(directory, 'B00001.vc7'), 'wb') as f:
+            f.write(data[:100])
+        with open(os.path.join(directory, 'PTV_B00013.VC7'), 'wb') as f:
+            f.write(b'garbage!'*200)
+        shutil.copy(lFiles[0], os.path.join(directory, 'B00002.im7'))
+        with im7.ArchiveIndex(directory) as index:
+            assert sorted(index.failed) == ['B00001.vc7', 'PTV_B00013.VC7']
+            assert len(index) == len(lFiles)-1
+            assert index.entry('B00002.im7')['nx'] == index.entry(
+                os.path.basename(lFiles[0]))['nx']
+            try:
+                index.entry('PTV_B00013.VC7')
+            except KeyError:
+                pass
+            else:
+                raise AssertionError("Corrupt file indexed.")
+    finally:
+        shutil.rmtree(directory)
+
+if __name__=='__main__':
+    test_scan()
+    test_attributes()
+    test_scan_many()
+    test_index()
@@ -0,0 +1,161 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+#Copyright (C) 2010 Fabricio Silva
+
+"""
+Reading into numpy arrays: readim7_into, probe_im7, memory mapping and
+reading from file-like objects.
+"""
+
+import os, sys, io, struct, zlib, tempfile
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import numpy as np
+import libim7 as im7
+
+here = os.path.dirname(os.path.abspath(__file__))
+lFiles = [os.path.join(here, tmp) for tmp in \
+    ('test_IMX.IM7', 'test_IMX.imx', 'PTV_B00013.VC7', 'SOV2_01_100_davis.VC7')]
+
+def test_probe():
+    for fname in lFiles:
+        probe = im7.probe_im7(fname)
+        buf, att = im7.readim7(fname)
+        assert probe.get_shape() == buf.blocks.shape
+        assert probe.get_dtype() == buf.blocks.dtype
+
+def test_into():
+    fname = lFiles[-1]
+    ref, att_ref = im7.readim7(fname)
+    probe = im7.probe_im7(fname)
+    out = np.zeros(probe.get_shape(), dtype=probe.get_dtype())
+    buf, att = im7.readim7_into(fname, out)
+    assert np.shares_memory(buf.blocks, out)
+    assert np.array_equal(out, ref.blocks)
+    assert att == att_ref
+    # Wrong size or type
+    for tmp in (np.zeros(10, dtype=np.float32), out.astype(np.float64)):
+        try:
+            im7.readim7_into(fname, tmp)
+        except ValueError:
+            pass
+        else:
+            raise AssertionError("Wrong destination array accepted.")
+    # Same size in bytes, but another type: left untouched
+    tmp = np.zeros(out.shape, dtype=np.int32)
+    try:
+        im7.readim7_into(fname, tmp)
+    except ValueError:
+        assert not tmp.any()
+    else:
+        raise AssertionError("Wrong destination array accepted.")
+
+def uncompressed_copy(fname, dest):
+    " Write a copy of the zlib packed file fname with uncompressed data."
+    with open(fname, 'rb') as f:
+        header = bytearray(f.read(256))
+        size, = struct.unpack('<i', f.read(4))
+        data = zlib.decompress(f.read(size))
+        trailer = f.read()
+    assert struct.unpack_from('<h', header, 2)[0] == 2
+    struct.pack_into('<h', header, 2, 0)
+    with open(dest, 'wb') as f:
+        f.write(bytes(header) + data + trailer)
+
+def test_mmap():
+    fname = lFiles[-1]
+    ref, att_ref = im7.readim7(fname)
+    fd, dest = tempfile.mkstemp(suffix='.VC7')
+    os.close(fd)
+    try:
+        uncompressed_copy(fname, dest)
+        buf, att = im7.readim7(dest, mmap=True)
+        assert isinstance(buf.blocks, np.memmap)
+        assert np.array_equal(buf.blocks, ref.blocks)
+        assert np.array_equal(buf.vx, ref.vx)
+        assert att == att_ref
+        del buf
+    finally:
+        os.remove(dest)
+    # Packed files are decoded
+    buf, att = im7.readim7(fname, mmap=True)
+    assert not isinstance(buf.blocks, np.memmap)
+
+def test_fileobj():
+    for fname in lFiles:
+        ref, att_ref = im7.readim7(fname)
+        with open(fname, 'rb') as f:
+            buf, att = im7.readim7(io.BytesIO(f.read()))
+        assert np.array_equal(buf.blocks, ref.blocks)
+        assert att == att_ref
+        assert buf.scaleI.factor == ref.scaleI.factor
+    # Truncated data, from a file or a file-like object
+    with open(lFiles[-1], 'rb') as f:
+        data = f.read(5000)
+    fd, dest = tempfile.mkstemp(suffix='.VC7')
+    os.write(fd, data)
+    os.close(fd)
+    try:
+        for tmp in (dest, io.BytesIO(data)):
+            try:
+                im7.readim7(tmp)
+            except ValueError:
+                pass
+            else:
+                raise AssertionError("Truncated data accepted.")
+    finally:
+        os.remove(dest)
+
+def test_short_zlib():
+    " Zlib stream complete but shorter than the data."
+    with open(lFiles[-1], 'rb') as f:
+        header = f.read(256)
+        size, = struct.unpack('<i', f.read(4))
+        data = zlib.decompress(f.read(size))
+        trailer = f.read()
+    packed = zlib.compress(data[:len(data)//2])
+    content = header+struct.pack('<i', len(packed))+packed+trailer
+    try:
+        im7.readim7(io.BytesIO(content))
+    except IOError:
+        pass
+    else:
+        raise AssertionError("Short packed data accepted.")
+    fd, dest = tempfile.mkstemp(suffix='.VC7')
+    os.write(fd, content)
+    os.close(fd)
+    try:
+        im7.readim7(dest)
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("Short packed data accepted.")
+    finally:
+        os.remove(dest)
+
+def test_fileobj_errors():
+    " Truncated attributes and packed data too long, from file-like objects."
+    with open(lFiles[-1], 'rb') as f:
+        content = f.read()
+        f.seek(0)
+        header = f.read(256)
+        size, = struct.unpack('<i', f.read(4))
+        data = zlib.decompress(f.read(size))
+        trailer = f.read()
+    packed = zlib.compress(data+b'\0'*100)
+    for tmp in (content[:-500],
+                header+struct.pack('<i', len(packed))+packed+trailer):
+        try:
+            im7.readim7(io.BytesIO(tmp))
+        except ValueError:
+            pass
+        else:
+            raise AssertionError("Incorrect file-like object read.")
+
+if __name__=='__main__':
+    test_probe()
+    test_into()
+    test_mmap()
+    test_fileobj()
+    test_short_zlib()
+    test_fileobj_errors()
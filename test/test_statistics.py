@@ -0,0 +1,57 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+#Copyright (C) 2010 Fabricio Silva
+
+"""
+One pass statistics of series of vector fields, checked against numpy
+statistics of the stacked fields.
+"""
+
+import os, sys, shutil, tempfile
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import numpy as np
+import libim7 as im7
+
+here = os.path.dirname(os.path.abspath(__file__))
+
+def test_statistics():
+    ref, att = im7.readim7(os.path.join(here, 'SOV2_01_100_davis.VC7'))
+    directory = tempfile.mkdtemp()
+    rng = np.random.RandomState(0)
+    try:
+        paths, fields, valid = [], [], []
+        for ind in range(7):
+            blocks = ref.blocks.copy()
+            blocks[1:] *= rng.rand(*blocks[1:].shape).astype(np.float32)
+            # Some vectors removed in every field, all of them at (0, 0)
+            blocks[0][rng.rand(*blocks.shape[1:])<.2] = 0
+            blocks[0, 0, 0] = 0
+            paths.append(os.path.join(directory, 'B%05d.vc7' % ind))
+            im7.writeim7(paths[-1], blocks, att=att, buffer_format=5,
+                vector_grid=ref.vectorGrid)
+            buf, tmp = im7.readim7(paths[-1])
+            fields.append([buf.vx, buf.vy, buf.vz])
+            valid.append(buf._orient(buf.blocks[0])!=0)
+        fields = np.array(fields)
+        fields = np.ma.array(fields, mask=np.broadcast_to(
+            ~np.array(valid)[:,np.newaxis], fields.shape))
+        stats = im7.FieldStatistics().update(paths)
+        merged = im7.field_statistics(paths, workers=3)
+        assert np.array_equal(stats.count, np.sum(valid, axis=0))
+        assert stats.nfields == merged.nfields == 7
+        ok = stats.count>0
+        assert (~ok).any() and np.isnan(stats.mean('vx')[~ok]).all()
+        mean = fields.mean(axis=0)
+        for ind, key in enumerate(('vx', 'vy', 'vz')):
+            for res in (stats, merged):
+                assert np.allclose(res.mean(key)[ok], mean[ind][ok])
+                assert np.allclose(res.std(key)[ok], fields[:,ind].std(axis=0)[ok])
+        uv = ((fields[:,0]-mean[0])*(fields[:,1]-mean[1])).mean(axis=0)
+        for res in (stats, merged):
+            assert np.allclose(res.covariance('vy', 'vx')[ok], uv[ok])
+    finally:
+        shutil.rmtree(directory)
+
+if __name__=='__main__':
+    test_statistics()
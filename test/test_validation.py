@@ -0,0 +1,91 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+#Copyright (C) 2010 Fabricio Silva
+
+"""
+Normalized median test of vector fields and replacement of the outliers.
+"""
+
+import os, sys, shutil, tempfile
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import numpy as np
+import libim7 as im7
+
+here = os.path.dirname(os.path.abspath(__file__))
+
+def median_test(comps, valid, threshold=2., epsilon=.1, radius=1):
+    " Vector by vector normalized median test."
+    nx, ny = valid.shape
+    mask = ~valid
+    for i in range(nx):
+        for j in range(ny):
+            if not valid[i,j]:
+                continue
+            residual = 0.
+            for comp in comps:
+                values = np.array([comp[k,l] \
+                    for k in range(max(i-radius, 0), min(i+radius+1, nx)) \
+                    for l in range(max(j-radius, 0), min(j+radius+1, ny)) \
+                    if (k, l)!=(i, j) and valid[k,l]])
+                if not len(values):
+                    residual = np.nan
+                    break
+                median = np.median(values)
+                fluctuation = np.median(np.abs(values-median))
+                residual += ((comp[i,j]-median)/(fluctuation+epsilon))**2
+            mask[i,j] = residual>threshold**2
+    return mask
+
+def test_median_test():
+    rng = np.random.RandomState(0)
+    comps = rng.standard_normal((2, 30, 20))
+    valid = rng.uniform(size=(30, 20))>.1
+    for radius in (1, 2):
+        mask, out = im7.validate_vectors(comps, valid=valid, radius=radius,
+            replace=False)
+        assert np.array_equal(mask, median_test(comps, valid, radius=radius))
+        assert np.isnan(out[:,mask]).all()
+        assert np.array_equal(out[:,~mask], comps[:,~mask])
+
+def test_replace():
+    rng = np.random.RandomState(1)
+    x, y = np.mgrid[0:40, 0:30]/40.
+    comps = np.array([1+x, .5*y])
+    spikes = rng.uniform(size=x.shape)<.03
+    noisy = comps.copy()
+    noisy[0][spikes] += 5
+    mask, out = im7.validate_vectors(noisy)
+    assert np.array_equal(mask, spikes)
+    assert np.allclose(out, comps, atol=.05)
+    # Stacks, by chunks and workers
+    stack = np.stack([noisy, comps, noisy], axis=1)
+    smask, sout = im7.validate_vectors(stack, chunk=2, workers=2)
+    assert smask.shape==(3, 40, 30) and sout.shape==(2, 3, 40, 30)
+    assert np.array_equal(smask[2], mask) and not smask[1].any()
+    assert np.array_equal(sout[:,2], out)
+
+def test_buffers():
+    buf, att = im7.readim7(os.path.join(here, 'SOV2_01_100_davis.VC7'))
+    tmp = tempfile.mkdtemp()
+    try:
+        blocks = np.array(buf.blocks)
+        blocks[0,10:12,20:22] = 0
+        fname = os.path.join(tmp, 'B00001.VC7')
+        im7.writeim7(fname, blocks, (buf.scaleX, buf.scaleY, buf.scaleI),
+            buffer_format=5, vector_grid=buf.vectorGrid)
+        new, att = im7.readim7(fname)
+        invalid = new._orient(new._get_choice())==0
+        mask, out = im7.validate_vectors(new)
+        assert out.shape==new.components.shape
+        assert mask[invalid].all() and not np.isnan(out).any()
+        smask, sout = im7.validate_vectors([buf, new])
+        assert np.array_equal(smask[1], mask)
+        assert np.array_equal(sout[:,1], out)
+    finally:
+        shutil.rmtree(tmp)
+
+if __name__=='__main__':
+    test_median_test()
+    test_replace()
+    test_buffers()
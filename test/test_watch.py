@@ -0,0 +1,66 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+#Copyright (C) 2010 Fabricio Silva
+
+"""
+Watching a directory where files are being written.
+"""
+
+import os, sys, time, queue, shutil, tempfile
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import numpy as np
+import libim7 as im7
+
+here = os.path.dirname(os.path.abspath(__file__))
+
+def test_watch():
+    with open(os.path.join(here, 'SOV2_01_100_davis.VC7'), 'rb') as f:
+        data = f.read()
+    directory = tempfile.mkdtemp()
+    paths = [os.path.join(directory, 'B%05d.vc7' % ind) for ind in range(1, 5)]
+    try:
+        with open(paths[0], 'wb') as f:
+            f.write(data)
+        seen, results = [], queue.Queue()
+        stats = im7.FieldStatistics()
+        watcher = im7.DirectoryWatcher(directory, settle=.05, queue=results,
+            callbacks=[lambda path, buf, att: seen.append(path)],
+            aggregates=[stats])
+        # Files written at once, and one still being written
+        for path in paths[1:3]:
+            with open(path, 'wb') as f:
+                f.write(data)
+        with open(paths[3], 'wb') as f:
+            f.write(data[:1000])
+        assert watcher.poll() == []
+        time.sleep(.1)
+        with open(paths[3], 'ab') as f:
+            f.write(data[1000:])
+        assert watcher.poll(wait=True) == paths[:3]
+        time.sleep(.1)
+        assert watcher.poll(wait=True) == paths[3:]
+        assert watcher.poll(wait=True) == []
+        assert seen == paths and stats.nfields == 4
+        ref, att = im7.readim7(paths[0])
+        for path in paths:
+            tmp, buf, att = results.get_nowait()
+            assert tmp == path and np.array_equal(buf.blocks, ref.blocks)
+        assert list(watcher.latency) == paths
+        assert watcher.stats()['handled'] == 4
+        watcher.close()
+        # Background polling of the new files only
+        with im7.DirectoryWatcher(directory, settle=.02, interval=.01,
+                                  existing=False) as watcher:
+            shutil.copy(paths[0], os.path.join(directory, 'B00005.vc7'))
+            for ind in range(200):
+                if watcher.latency:
+                    break
+                time.sleep(.01)
+        assert list(watcher.latency) == [os.path.join(directory, 'B00005.vc7')]
+        watcher.close()
+    finally:
+        shutil.rmtree(directory)
+
+if __name__=='__main__':
+    test_watch()
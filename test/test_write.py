@@ -0,0 +1,65 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+#Copyright (C) 2010 Fabricio Silva
+
+"""
+Writing images and vector fields: writeim7 and writeim7_many.
+"""
+
+import os, sys, shutil, tempfile
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import numpy as np
+import libim7 as im7
+
+here = os.path.dirname(os.path.abspath(__file__))
+lFiles = [os.path.join(here, tmp) for tmp in \
+    ('test_IMX.IM7', 'test_IMX.imx', 'PTV_B00013.VC7', 'SOV2_01_100_davis.VC7')]
+
+def test_roundtrip():
+    directory = tempfile.mkdtemp()
+    dest = os.path.join(directory, 'tmp.im7')
+    try:
+        for fname in lFiles:
+            ref, att_ref = im7.readim7(fname)
+            for pack in ('zlib', 'img', 'imx'):
+                im7.writeim7(dest, ref, att=att_ref, pack=pack)
+                buf, att = im7.readim7(dest)
+                assert np.array_equal(buf.blocks, ref.blocks)
+                for el in 'XYI':
+                    s0, s1 = getattr(ref, 'scale%s' % el), getattr(buf, 'scale%s' % el)
+                    assert (s0.factor, s0.offset, s0.unit) == (s1.factor, s1.offset, s1.unit)
+                for key in att_ref:
+                    if not key.startswith('_SCALE'):
+                        assert att[key] == att_ref[key]
+                if ref.reader=='ReadIM7' and ref.header.buffer_format>0:
+                    assert buf.header.buffer_format == ref.header.buffer_format
+                    assert buf.vectorGrid == ref.vectorGrid
+                    assert np.array_equal(buf.vx, ref.vx)
+    finally:
+        shutil.rmtree(directory)
+
+def test_arrays():
+    directory = tempfile.mkdtemp()
+    dest = os.path.join(directory, 'tmp.im7')
+    try:
+        frames = np.random.rand(3, 20, 31)
+        im7.writeim7(dest, frames, scales=[(.5, 1, 'mm', 'X'), (2, 0, 'mm', 'Y'),
+            (1, 0, 'counts', '')], att={'Camera':'cam1'}, level=9)
+        buf, att = im7.readim7(dest)
+        assert buf.blocks.dtype == np.float32
+        assert np.array_equal(buf.blocks, frames.astype(np.float32))
+        assert buf.scaleX.factor == .5 and buf.scaleX.unit == b'mm'
+        assert att['Camera'] == 'cam1'
+        # Series written concurrently
+        stack = (np.random.rand(6, 40, 50)*4000).astype(np.uint16)
+        paths = [os.path.join(directory, 'B%05d.im7' % ind) for ind in range(6)]
+        im7.writeim7_many(paths, stack, workers=3, pack='imx')
+        tmp, scales, atts = im7.readim7_series(paths)
+        assert np.array_equal(tmp[:,0], stack)
+    finally:
+        shutil.rmtree(directory)
+
+if __name__=='__main__':
+    test_roundtrip()
+    test_arrays()